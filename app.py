@@ -2,53 +2,54 @@
 
 # === Librerie Standard ===
 import sys
-import json
-import time
 from pathlib import Path
 from collections import Counter
+from contextlib import contextmanager
 
 # === Librerie Esterne ===
 import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
-from fpdf import FPDF
 
 # === Configurazione dei percorsi ===
 project_root = Path(__file__).resolve().parent
 sys.path.append(str(project_root / "src"))  # Aggiunge 'src' ai path per importazioni
 
 # === Import locali (da src.agents.*) ===
-from agents.utils import expand_autocomplete_terms, filter_by_year_range
-from agents.planner import build_pubmed_query
 from agents.aggregator import aggregate_patients, aggregate_endpoint_counts
-from agents.filter import RelevanceFilter
-from agents.miner import DataMiner
-from agents.synthesizer import Synthesizer
-from agents.retriever_custom import Retriever
-from tools.europepmc_wrapper import EuropePMCWrapper
+from agents.pipeline import ResearchEngine, normalize_spec, stage_fingerprints
+from tools.job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from tools.metrics import MetricsRegistry, use_metrics
+from tools.tracing import Tracer, use_tracer
 
 # --- Configurazioni generali ---
-project_root = Path(__file__).resolve().parent
 output_dir = project_root / "data" / "processed"
 report_dir = project_root / "data" / "reports"
 output_dir.mkdir(parents=True, exist_ok=True)
 report_dir.mkdir(parents=True, exist_ok=True)
 
-# Caricamento chiavi API
-with open(project_root / "config" / "api_keys.json") as f:
-    api_keys = json.load(f)
 
-openai_key = api_keys.get("openai_api_key")
+# --- Inizializzazione agenti (chiavi da config/api_keys.json) ---
+# Streamlit riesegue lo script a ogni interazione: agenti, archivi, cache e sessioni HTTP
+# vengono creati una sola volta per processo e condivisi tra i rerun.
+@st.cache_resource
+def get_engine():
+    return ResearchEngine.from_project(project_root)
+
+
+# Coda dei job eseguiti in background dai processi di worker.py
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(project_root / "data" / "jobs.db")
 
-# --- Inizializzazione agenti ---
-retriever = Retriever(api_key=api_keys.get("ncbi_api_key"))
-europepmc = EuropePMCWrapper(page_size=10)
-filter_agent = RelevanceFilter(api_key=openai_key)
-data_miner = DataMiner(api_key=openai_key)
-synthesizer = Synthesizer(api_key=openai_key)
 
 # --- UI Streamlit ---
+# set_page_config deve essere il primo comando Streamlit del rerun, prima delle risorse in cache
 st.set_page_config(page_title="DrChicco AI", layout="wide")
+
+engine = get_engine()
+job_queue = get_job_queue()
+
 st.title("🔬 DrChicco AI – Ricerca Scientifica Intelligente")
 
 # Layout 3 colonne: sinistra, centrale, destra
@@ -72,84 +73,240 @@ with col_left:
     population = st.text_input("Popolazione", "humans")
     outcome = st.text_input("Outcome", "insulin sensitivity")
     study_types = st.multiselect("Tipo studio", ["Randomized Controlled Trial", "Meta-Analysis", "Review", "Cohort"], default=["Randomized Controlled Trial"])
+
+    # Pre-ranking lessicale locale (BM25) prima del filtro AI
+    col3, col4 = st.columns(2)
+    with col3:
+        prerank_top_k = st.number_input("Max articoli al filtro AI", min_value=0, value=0, step=50,
+                                        help="Solo i primi K per punteggio BM25 vanno al modello (0 = tutti)")
+    with col4:
+        prerank_min_score = st.number_input("Punteggio BM25 minimo", min_value=0.0, value=0.0, step=0.5,
+                                            help="Scarta gli articoli sotto la soglia prima del filtro AI")
+    federated = st.checkbox("Ricerca federata (PubMed + Europe PMC)", value=False,
+                            help="Interroga entrambe le fonti in parallelo e unisce i risultati eliminando i duplicati")
+    local_search = st.checkbox("Ricerca locale (offline)", value=False,
+                               help="Cerca solo tra gli articoli già scaricati (indice full-text locale), "
+                                    "senza interrogare PubMed; da disattivare per l'aggiornamento definitivo")
+    fulltext = st.checkbox("Testo completo (open access)", value=False,
+                           help="Scarica PDF/XML open access e passa metodi e risultati all'estrazione dati")
+    living_review = st.checkbox("Aggiornamento incrementale (living review)", value=False,
+                                help="Per le query già eseguite analizza solo gli articoli nuovi dall'ultima esecuzione")
+    tracing = st.checkbox("Tracing esecuzione", value=False,
+                          help="Salva un trace (chrome://tracing, Perfetto) con le fasi, i batch EFetch e le chiamate LLM")
+    trace_sample_rate = st.slider("Campionamento span per articolo", 0.0, 1.0, 1.0, step=0.05,
+                                  disabled=not tracing,
+                                  help="Frazione delle chiamate per singolo articolo registrate nel trace")
     run = st.button("🚀 Avvia ricerca")
+    reset = st.button("🔄 Riesegui da zero", help="Dimentica i risultati in memoria e riesegue tutte le fasi")
+    submit_job = st.button("⏳ Esegui in background",
+                           help="Accoda la ricerca ai worker (python worker.py): si può chiudere la pagina e tornare dopo")
 
 # Placeholder per log
 log_box = col_right.empty()
 
+
+def form_spec():
+    """Spec di ricerca dai valori correnti del form."""
+    return normalize_spec({
+        "goal": user_goal,
+        "include_terms": include_terms,
+        "exclude_terms": exclude_terms,
+        "population": population,
+        "outcome": outcome,
+        "start_year": start_year,
+        "end_year": end_year,
+        "study_types": study_types,
+        "use_mesh": use_mesh,
+        "broad_mode": broad_mode,
+        "prerank_top_k": prerank_top_k,
+        "prerank_min_score": prerank_min_score,
+        "living_review": living_review,
+        "federated": federated,
+        "fulltext": fulltext,
+        "local_search": local_search,
+    })
+
+
+# --- Esplorazione dell'indice locale: risposte immediate, senza rete ---
+with col_left:
+    with st.expander("🗂️ Esplora l'indice locale"):
+        local_query = st.text_input("Query (sintassi PubMed)", key="local_query",
+                                    help='Es. "vitamin D"[Title/Abstract] AND diabetes AND (2015:2024[dp])')
+        if local_query:
+            local_results = engine.search_local(local_query, limit=20)
+            st.caption(f"{len(local_results)} articoli (i 20 più pertinenti) su {len(engine.local_index)} indicizzati")
+            for art in local_results:
+                st.markdown(f"- [{art.title}]({art.link}) ({art.year})" if art.link else f"- {art.title} ({art.year})")
+
+
+# --- Job in background ---
+if submit_job:
+    job_id = job_queue.submit(form_spec())
+    st.session_state.setdefault("jobs", []).append(job_id)
+
+# Aggiornamento automatico del pannello dei job mentre ce ne sono in coda o in esecuzione
+JOB_REFRESH_SECONDS = 5
+
+
+def render_jobs(job_ids):
+    for job in job_queue.list_jobs(job_ids):
+        label = f"#{job['id']} {job['spec']['goal']}"
+        if job["status"] == QUEUED:
+            st.caption(f"{label}: in coda ({job_queue.position(job['id'])} prima)")
+        elif job["status"] == RUNNING:
+            st.progress(min(job["progress"], 1.0), text=f"{label}: {job['stage'] or 'avvio'} {job['message'] or ''}")
+        elif job["status"] == DONE:
+            result = job["result"]
+            st.caption(f"✅ {label}: {result['n_relevant']} rilevanti su {result['n_retrieved']}")
+            with open(result["outputs"]["report_md"], "rb") as f_job:
+                st.download_button("Scarica Report (.md)", f_job, file_name=f"report-{job['id']}.md",
+                                   key=f"job-{job['id']}")
+        elif job["status"] == FAILED:
+            st.caption(f"❌ {label}: {(job['error'] or 'errore').splitlines()[0]}")
+        else:
+            st.caption(f"{label}: annullato")
+
+
+if st.session_state.get("jobs"):
+    active = any(job["status"] in (QUEUED, RUNNING) for job in job_queue.list_jobs(st.session_state["jobs"]))
+    with col_left:
+        st.markdown("#### ⏳ Ricerche in background")
+        # Solo il frammento viene rieseguito a intervalli, non l'intero script
+        st.fragment(run_every=JOB_REFRESH_SECONDS if active else None)(render_jobs)(st.session_state["jobs"])
+
+# --- Stato della pipeline tra i rerun ---
+# I risultati di ogni fase restano in session_state insieme all'impronta dei parametri da cui
+# dipendono: i rerun senza modifiche sono istantanei e, se cambia un'opzione a valle,
+# vengono rieseguite solo le fasi interessate.
+if reset:
+    st.session_state.pop("pipeline", None)
+
+if run or reset:
+    st.session_state["active_spec"] = form_spec()
+    st.session_state["tracer"] = Tracer()
+    if tracing:
+        st.session_state["tracer"].start(sample_rate=trace_sample_rate)
+
+executed = []  # fasi rieseguite in questo rerun
+
+
+@contextmanager
+def session_scope():
+    """
+    Metriche e tracer di questa sessione: il motore è condiviso tra le sessioni, ma ognuna
+    registra le proprie esecuzioni senza vedere né azzerare quelle delle altre.
+    """
+    with use_metrics(st.session_state.setdefault("metrics", MetricsRegistry())), \
+            use_tracer(st.session_state.setdefault("tracer", Tracer())):
+        yield
+
+
+def run_stage(name, fingerprint, compute):
+    """Risultato della fase dalla sessione se l'impronta coincide, altrimenti lo ricalcola."""
+    stages = st.session_state.setdefault("pipeline", {})
+    cached = stages.get(name)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    if not executed:
+        # nuovo registro per questa esecuzione: metriche e hit di archivio e cache LLM sono per
+        # sessione, il motore condiviso non ha contatori da azzerare
+        st.session_state["metrics"] = MetricsRegistry()
+    executed.append(name)
+    with session_scope():
+        result = compute()
+    stages[name] = (fingerprint, result)
+    return result
+
+
 # --- Fase di ricerca ---
-if run:
-   # Espansione iniziale
-    expanded_input = expand_autocomplete_terms(user_goal)
-
-    # Genera la query completa
-    query = build_pubmed_query(
-        main_topic=expanded_input,
-        include_terms=include_terms.split(",") if include_terms else None,
-        exclude_terms=exclude_terms.split(",") if exclude_terms else None,
-        population=population,
-        outcome=outcome,
-        date_range=(start_year, end_year),
-        study_types=study_types,
-        use_mesh=use_mesh,
-        strict_title_abstract=not use_mesh,  # forza la ricerca Title/Abstract se MeSH è off
-        broad_mode=broad_mode  # aggiungi il nuovo parametro
-    )
- 
+spec = st.session_state.get("active_spec")
+if spec:
+    fingerprints = stage_fingerprints(spec)
+
+    # Espansione iniziale e query completa
+    plan = run_stage("plan", fingerprints["plan"], lambda: engine.plan(spec))
+    expanded_input, query = plan["expanded"], plan["query"]
+
     # Log visuale
     col_left.markdown("#### 🔍 Query generata")
     col_left.code(query)
 
     # Info su tipo di query
-    if broad_mode:
+    if spec["broad_mode"]:
         col_right.markdown("📊 **Modalità ampia attiva**: query semplificata per massimi risultati")
-    elif use_mesh:
+    elif spec["use_mesh"]:
         col_right.markdown("✅ Query generata con filtri MeSH")
     else:
         col_right.markdown("📘 Query manuale (senza MeSH), con autocomplete attivo")
 
     # Mostra anche la versione espansa dei termini (solo se cambia)
-    if expanded_input != user_goal:
+    if expanded_input != spec["goal"]:
         col_right.markdown("📚 **Espansione autocomplete:**")
         col_right.code(expanded_input)
 
     # RICERCA ARTICOLI
     log_box.info("🔎 Ricerca articoli in corso...")
-    raw_results = retriever.search(query, date_range=(start_year, end_year))
-    if not raw_results:
-        log_box.warning("⚠️ Nessun risultato da PubMed, passo a EuropePMC...")
-        raw_results = europepmc.search(user_goal)
+    retrieved = run_stage("retrieve", fingerprints["retrieve"], lambda: engine.retrieve(spec, query))
+    raw_results, saved_run = retrieved["raw_results"], retrieved["saved_run"]
+    if saved_run:
+        col_right.markdown(
+            f"🗂️ **Living review:** ultima esecuzione {saved_run['last_run']} "
+            f"({saved_run['n_relevant']} rilevanti salvati), {len(raw_results)} articoli da analizzare "
+            f"({retrieved.get('pending', 0)} in sospeso dalle esecuzioni precedenti)"
+        )
+    store_stats = retrieved["store_stats"]
+    if store_stats["hits"] or store_stats["misses"]:
+        col_right.markdown(
+            f"💾 **Archivio locale:** {store_stats['hits']} già presenti, "
+            f"{store_stats['misses']} scaricati da PubMed"
+        )
+    if retrieved.get("dedup"):
+        dedup = retrieved["dedup"]
+        col_right.markdown(
+            f"🔗 **Ricerca federata:** {dedup['pubmed']} da PubMed, {dedup['europepmc']} da Europe PMC → "
+            f"{dedup['unique']} articoli unici ({dedup['duplicates']} duplicati rimossi)"
+        )
+    if retrieved["source"] == "europepmc":
+        log_box.warning("⚠️ Nessun risultato da PubMed, risultati da EuropePMC")
+    elif retrieved["source"] == "local":
+        log_box.info(f"🗂️ Ricerca locale: {len(raw_results)} articoli dall'indice (nessuna richiesta a PubMed)")
+    else:
+        log_box.success(f"✅ Articoli totali trovati: {len(raw_results)}")
 
-    log_box.success(f"✅ Articoli totali trovati: {len(raw_results)}")
+    # --- PRE-RANKING BM25 ---
+    to_screen = run_stage("prerank", fingerprints["prerank"], lambda: engine.prerank(spec, raw_results))
+    if len(to_screen) != len(raw_results):
+        col_right.markdown(f"📊 **Pre-ranking BM25:** {len(to_screen)}/{len(raw_results)} articoli inviati al filtro AI")
 
     # --- FILTRO AI ---
-    filtered = []
-    debug_log = []
     status_msg = col_right.empty()
-
     with st.spinner("🧠 Filtro AI in corso..."):
-        for idx, article in enumerate(raw_results, 1):
-            status_msg.info(f"🧠 Filtraggio {idx}/{len(raw_results)}")
-            title = article.get("title", "N/D")
-            abstract = article.get("abstract") or article.get("abstractText", "N/D")
-            pub_year_raw = article.get("pubYear") or article.get("year") or article.get("publicationYear") or article.get("pubdate")
-
-            try:
-                pub_year = int(pub_year_raw.strip()[:4]) if isinstance(pub_year_raw, str) else int(pub_year_raw)
-            except:
-                pub_year = 0
-
-            if filter_agent.is_relevant(title, abstract):
-                filtered.append({
-                    "pmid": article.get("pmid", article.get("id", "N/A")),
-                    "title": title,
-                    "abstract": abstract,
-                    "year": pub_year,
-                    "journal": article.get("journal", "N/A"),
-                    "authors": article.get("authors", [])
-                })
-
-    status_msg.success(f"✅ Articoli filtrati: {len(filtered)}")
+        new_filtered = run_stage("screen", fingerprints["screen"], lambda: engine.screen(
+            spec, to_screen,
+            on_progress=lambda done, total: status_msg.info(f"🧠 Filtraggio {done}/{total}"),
+        ))
+    status_msg.success(f"✅ Articoli filtrati: {len(new_filtered)}")
+
+    # --- ESECUZIONE ESTRAZIONE DATI ---
+    # Living review: ai nuovi risultati si aggiungono quelli delle esecuzioni precedenti
+    # --- TESTO COMPLETO (opzionale) ---
+    with st.spinner("📥 Download e lettura dei testi completi..."):
+        fulltexts = run_stage("fulltext", fingerprints["fulltext"], lambda: engine.fetch_fulltext(spec, new_filtered))
+    if spec["fulltext"]:
+        col_right.markdown(f"📄 **Testo completo:** {sum(1 for t in fulltexts if t)}/{len(new_filtered)} articoli")
+
+    def mine_and_merge():
+        new_mined = engine.mine(
+            new_filtered, fulltexts,
+            on_progress=lambda done, total: status_msg.info(f"🧬 Estrazione {done}/{total}"),
+        )
+        filtered, mined_data = engine.merge_saved(spec, query, retrieved, to_screen, new_filtered, new_mined)
+        return filtered, mined_data, engine.evidence(mined_data)
+
+    status_msg = col_right.empty()
+    with st.spinner("🔬 Estrazione dati dagli abstract..."):
+        filtered, mined_data, evidence = run_stage("mine", fingerprints["mine"], mine_and_merge)
+    status_msg.success("📦 Dati estratti da tutti gli articoli.")
 
     # --- COLONNA CENTRALE: visualizza articoli e abstract ---
     with col_center:
@@ -161,21 +318,13 @@ if run:
                 st.markdown(f"**Autori**: {', '.join(art['authors'])}")
                 st.markdown(f"**PMID**: `{art['pmid']}`")
 
-    # --- ESECUZIONE ESTRAZIONE DATI ---
-    mined_data = []
-    status_msg = col_right.empty()
-
-    with st.spinner("🔬 Estrazione dati dagli abstract..."):
-        for idx, art in enumerate(filtered, 1):
-            status_msg.info(f"🧬 Estrazione {idx}/{len(filtered)}")
-            extracted = data_miner.extract_data(art["abstract"])
-            mined_data.append({
-                "pmid": art["pmid"],
-                "year": art["year"],
-                "extracted": extracted
-            })
-
-    status_msg.success("📦 Dati estratti da tutti gli articoli.")
+    with col_right:
+        if evidence.num_rows:
+            st.markdown("### 🧾 Evidenze aggregate")
+            st.metric("Pazienti totali", aggregate_patients(evidence))
+            endpoint_counts = aggregate_endpoint_counts(evidence)
+            if endpoint_counts:
+                st.table(pd.DataFrame(list(endpoint_counts.items())[:10], columns=["Endpoint", "Studi"]))
 
     # --- GRAFICO distribuzione articoli ---
     with col_right:
@@ -191,28 +340,44 @@ if run:
 
     # --- REPORT FINALE ---
     with st.spinner("📘 Generazione report finale..."):
-        report = synthesizer.generate_report(user_goal, mined_data)
+        report = run_stage("synthesize", fingerprints["synthesize"], lambda: engine.synthesize(spec, evidence))
         st.subheader("📘 Report")
         st.markdown(report)
 
-    # --- Salvataggi ---
-    with open(output_dir / "filtered.json", "w", encoding="utf-8") as f:
-        json.dump(filtered, f, indent=2)
-    with open(output_dir / "mined.json", "w", encoding="utf-8") as f:
-        json.dump(mined_data, f, indent=2)
-    with open(report_dir / "report.md", "w", encoding="utf-8") as f:
-        f.write(report)
-
-    # PDF
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    for line in report.splitlines():
-        pdf.multi_cell(0, 10, line)
-    pdf.output(str(report_dir / "report.pdf"))
-
-    st.success("✅ Report salvato e pronto al download.")
-    with open(report_dir / "report.md", "rb") as f_md:
-        st.download_button("Scarica Report (.md)", f_md, file_name="report.md")
-    with open(report_dir / "report.pdf", "rb") as f_pdf:
-        st.download_button("Scarica Report (.pdf)", f_pdf, file_name="report.pdf")
+    # --- Salvataggi (JSON, Parquet, metriche, report .md e .pdf): solo se qualcosa è cambiato ---
+    if executed:
+        with session_scope():
+            st.session_state["paths"] = engine.save(output_dir, filtered, mined_data, evidence, report,
+                                                    report_dir=report_dir)
+            st.session_state["run_stats"] = {"cache": engine.llm_cache.stats(),
+                                             "metrics": st.session_state["metrics"].table(), "executed": executed}
+
+    run_stats = st.session_state.get("run_stats", {})
+    with col_right:
+        if executed:
+            st.caption(f"Fasi rieseguite: {', '.join(executed)}")
+        else:
+            st.caption("Risultati dell'ultima esecuzione (nessuna fase rieseguita)")
+        if run_stats.get("cache"):
+            st.markdown("### 🗃️ Cache LLM")
+            st.table(pd.DataFrame(run_stats["cache"]).T)
+        if run_stats.get("metrics"):
+            st.markdown("### ⏱️ Metriche per fase")
+            st.dataframe(pd.DataFrame(run_stats["metrics"]).set_index("fase"))
+
+    paths = st.session_state.get("paths")
+    if paths:
+        st.success("✅ Report salvato e pronto al download.")
+        with open(paths["report_md"], "rb") as f_md:
+            st.download_button("Scarica Report (.md)", f_md, file_name="report.md")
+        with open(paths["report_pdf"], "rb") as f_pdf:
+            st.download_button("Scarica Report (.pdf)", f_pdf, file_name="report.pdf")
+    else:
+        st.info("ℹ️ Report non ancora salvato in questa sessione: avvia di nuovo la ricerca per scaricarlo.")
+
+    tracer = st.session_state.get("tracer")
+    if tracer and tracer.enabled:
+        tracer.stop(output_dir / "trace.json")
+    if (output_dir / "trace.json").exists() and tracing:
+        with open(output_dir / "trace.json", "rb") as f_trace:
+            st.download_button("Scarica trace (chrome://tracing, Perfetto)", f_trace, file_name="trace.json")
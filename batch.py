@@ -0,0 +1,135 @@
+# batch.py
+"""
+Esecuzione headless di molte ricerche, senza browser.
+
+Legge un file JSONL con una spec per riga (stessi campi dell'interfaccia Streamlit):
+    {"id": "vitd-t2d", "goal": "vitamin D AND diabetes", "include_terms": "glucose metabolism",
+     "exclude_terms": "rat", "population": "humans", "outcome": "insulin sensitivity",
+     "start_year": 2015, "end_year": 2024, "study_types": ["Randomized Controlled Trial"],
+     "use_mesh": true, "broad_mode": false}
+
+ed esegue le ricerche su un pool di processi. I limiti di NCBI e del provider LLM sono
+condivisi da tutti i processi (SharedTokenBucket); archivio articoli e cache LLM sono
+su disco e vengono riusati tra le ricerche. Ogni ricerca scrive i propri output in
+<out>/<n>-<id o obiettivo>/ e una riga in <out>/batch_summary.jsonl.
+
+Esempio:
+    python batch.py specs.jsonl --out data/batch --workers 4
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+import traceback
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+project_root = Path(__file__).resolve().parent
+sys.path.append(str(project_root / "src"))
+
+from agents.pipeline import (
+    ResearchEngine, normalize_spec, slugify, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+)
+from tools.rate_limiter import SharedTokenBucket
+
+logger = logging.getLogger("Batch")
+
+_engine = None  # un motore per processo worker
+
+
+def _init_worker(ncbi_bucket, llm_request_bucket, llm_token_bucket, llm_workers):
+    global _engine
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(process)d] %(message)s")
+    _engine = ResearchEngine.from_project(
+        project_root,
+        retriever_limiter=ncbi_bucket,
+        llm_request_bucket=llm_request_bucket,
+        llm_token_bucket=llm_token_bucket,
+        llm_max_workers=llm_workers,
+    )
+
+
+def _run_spec(spec, output_dir):
+    try:
+        return {"status": "ok", "id": spec.get("id"), **_engine.run(spec, output_dir)}
+    except Exception as e:
+        return {"status": "error", "id": spec.get("id"), "goal": spec.get("goal"),
+                "error": str(e), "traceback": traceback.format_exc()}
+
+
+def load_specs(path):
+    """Legge le spec dal file JSONL (righe vuote e commenti '#' ignorati)."""
+    specs = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                specs.append(normalize_spec(json.loads(line)))
+            except (json.JSONDecodeError, ValueError) as e:
+                logger.error(f"❌ [Batch] Riga {line_no} ignorata: {e}")
+    return specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Esegue in parallelo le ricerche di un file JSONL")
+    parser.add_argument("specs", type=Path, help="File JSONL con una spec di ricerca per riga")
+    parser.add_argument("--out", type=Path, default=project_root / "data" / "batch",
+                        help="Cartella degli output (una sottocartella per ricerca)")
+    parser.add_argument("--workers", type=int, default=4, help="Processi in parallelo")
+    parser.add_argument("--llm-workers", type=int, default=4, help="Chiamate LLM in volo per processo")
+    parser.add_argument("--ncbi-rate", type=float, default=None,
+                        help="Richieste NCBI al secondo per tutto il batch (default 10 con api_key, altrimenti 3)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Salta le ricerche che hanno già un summary.json nella cartella di output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with open(project_root / "config" / "api_keys.json") as f:
+        ncbi_key = json.load(f).get("ncbi_api_key")
+
+    specs = load_specs(args.specs)
+    args.out.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for idx, spec in enumerate(specs, 1):
+        output_dir = args.out / f"{idx:03d}-{slugify(str(spec.get('id') or spec['goal']))}"
+        if args.resume and (output_dir / "summary.json").exists():
+            logger.info(f"⏭️ [Batch] Già completata: {output_dir.name}")
+            continue
+        jobs.append((spec, output_dir))
+
+    # Limiti condivisi da tutti i processi
+    ncbi_bucket = SharedTokenBucket(args.ncbi_rate or (10 if ncbi_key else 3))
+    llm_request_bucket = SharedTokenBucket(LLM_REQUESTS_PER_MINUTE / 60)
+    llm_token_bucket = SharedTokenBucket(LLM_TOKENS_PER_MINUTE / 60, capacity=LLM_TOKENS_PER_MINUTE / 60)
+
+    logger.info(f"🚀 [Batch] {len(jobs)} ricerche su {args.workers} processi → {args.out}")
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(ncbi_bucket, llm_request_bucket, llm_token_bucket, args.llm_workers),
+    ) as executor, open(args.out / "batch_summary.jsonl", "a", encoding="utf-8") as summary_file:
+        futures = {executor.submit(_run_spec, spec, output_dir): spec for spec, output_dir in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            summary_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            summary_file.flush()
+            if result["status"] == "ok":
+                logger.info(f"✅ [Batch] {done}/{len(jobs)} '{result['goal']}': "
+                            f"{result['n_relevant']} rilevanti, {result['elapsed_s']}s")
+            else:
+                failed += 1
+                logger.error(f"❌ [Batch] {done}/{len(jobs)} '{result['goal']}': {result['error']}")
+
+    logger.info(f"🏁 [Batch] Completate {len(jobs) - failed}/{len(jobs)} ricerche "
+                f"in {time.perf_counter() - start:.1f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
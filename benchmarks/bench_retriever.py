@@ -0,0 +1,66 @@
+# benchmarks/bench_retriever.py
+"""
+Confronta le modalità di recupero del Retriever contro lo stub locale di E-utilities:
+    - ids      : ESearch paginata + EFetch per liste di PMID (percorso classico)
+    - history  : ESearch usehistory=y + EFetch da WebEnv/query_key
+ciascuna in versione sincrona e asincrona.
+
+Esempio:
+    python benchmarks/bench_retriever.py --n 5000 --latency 0.2 --rate 10
+"""
+
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from agents.retriever_custom import Retriever
+from eutils_stub import EUtilsStub
+
+MODES = {
+    "ids-sync": {"use_history": False, "async_mode": False},
+    "ids-async": {"use_history": False, "async_mode": True},
+    "history-sync": {"use_history": True, "async_mode": False},
+    "history-async": {"use_history": True, "async_mode": True},
+}
+
+
+def run_mode(name, options, args):
+    with EUtilsStub(n_results=args.n, latency=args.latency, history_ttl=args.history_ttl) as stub:
+        retriever = Retriever(rate_limit=args.rate, concurrency=args.concurrency,
+                              base_url=stub.base_url, **options)
+        start = time.perf_counter()
+        articles = retriever.search("vitamin D AND diabetes")
+        elapsed = time.perf_counter() - start
+        requests_made = len(stub.requests_log)
+
+    complete = len({a["pmid"] for a in articles}) == args.n
+    print(f"{name:<14} {elapsed:8.2f}s  {len(articles):>7} articoli  {requests_made:>5} richieste  "
+          f"{len(articles) / elapsed:8.1f} art/s  {'OK' if complete else 'INCOMPLETO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark modalità di recupero PubMed (stub locale)")
+    parser.add_argument("--n", type=int, default=2000, help="Numero di risultati della query")
+    parser.add_argument("--latency", type=float, default=0.1, help="Latenza simulata per richiesta (s)")
+    parser.add_argument("--rate", type=float, default=10, help="Richieste al secondo consentite")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batch EFetch in volo (modalità async)")
+    parser.add_argument("--history-ttl", type=int, default=None,
+                        help="Fa scadere la sessione WebEnv dopo N EFetch (prova il fallback)")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("agents.retriever_custom").setLevel(logging.WARNING)
+
+    print(f"📊 Benchmark Retriever: n={args.n}, latenza={args.latency}s, rate={args.rate} req/s")
+    for name in args.modes:
+        run_mode(name, MODES[name], args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# benchmarks/eutils_stub.py
+
+import json
+import calendar
+import threading
+import time
+import logging
+from datetime import date
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+from tools.dates import dp_ranges
+
+logger = logging.getLogger(__name__)
+
+# PubMed non restituisce PMID oltre questa posizione (retstart) né più di 10.000 per pagina
+ESEARCH_MAX_RETSTART = 9998
+ESEARCH_MAX_RETMAX = 10000
+# Finestra (s) in cui si contano le richieste E-utilities per il rate_limit simulato: più corta
+# di un secondo per tollerare il ritardo variabile con cui arrivano richieste equidistanziate
+RATE_WINDOW = 0.8
+
+
+def _pub_date(pmid):
+    """Data di pubblicazione dei record sintetici: anni 2000-2024, mesi e giorni distribuiti."""
+    pmid = int(pmid)
+    return date(2000 + pmid % 25, 1 + (pmid // 25) % 12, 1 + (pmid // 300) % 28)
+
+
+def _article_xml(pmid):
+    """Record <PubmedArticle> sintetico ma con la stessa struttura di EFetch."""
+    pub_date = _pub_date(pmid)
+    return (
+        "<PubmedArticle><MedlineCitation>"
+        f"<PMID Version=\"1\">{pmid}</PMID>"
+        "<Article>"
+        f"<Journal><Title>Journal of Stub Studies {int(pmid) % 7}</Title>"
+        f"<JournalIssue><PubDate><Year>{pub_date.year}</Year><Month>{calendar.month_abbr[pub_date.month]}</Month>"
+        f"<Day>{pub_date.day}</Day></PubDate></JournalIssue></Journal>"
+        f"<ArticleTitle>{escape(f'Vitamin D and glucose metabolism, study {pmid}')}</ArticleTitle>"
+        "<Abstract><AbstractText>"
+        f"{escape(f'Randomized trial {pmid} on vitamin D supplementation and insulin sensitivity in humans.')}"
+        "</AbstractText></Abstract>"
+        "<AuthorList><Author><LastName>Rossi</LastName><Initials>M</Initials></Author></AuthorList>"
+        f"<ELocationID EIdType=\"doi\" ValidYN=\"Y\">10.5555/stub.{pmid}</ELocationID>"
+        "</Article></MedlineCitation>"
+        "<PubmedData><ArticleIdList>"
+        f"<ArticleId IdType=\"pubmed\">{pmid}</ArticleId>"
+        f"<ArticleId IdType=\"doi\">10.5555/stub.{pmid}</ArticleId>"
+        + (f"<ArticleId IdType=\"pmc\">PMC{pmid}</ArticleId>" if _open_access(pmid) else "")
+        + "</ArticleIdList></PubmedData></PubmedArticle>"
+    )
+
+
+def _open_access(pmid):
+    """Metà degli articoli sintetici (PMID pari) ha il testo completo in PMC."""
+    return int(pmid) % 2 == 0
+
+
+def _fulltext_sections(pmid):
+    n = 40 + int(pmid) % 400
+    return [
+        ("Introduction", f"Vitamin D deficiency is common. Background for study {pmid}."),
+        ("Methods", f"We enrolled {n} adults with type 2 diabetes in a randomized controlled trial."),
+        ("Results", f"HbA1c decreased by 0.{int(pmid) % 9 + 1}% (95% CI 0.1 to 0.5) in the intervention group."),
+        ("Discussion", "These findings agree with previous meta-analyses."),
+        ("References", "1. Rossi M. Journal of Stub Studies. 2010."),
+    ]
+
+
+def _fulltext_jats(pmid):
+    """Testo completo JATS sintetico come /{PMCID}/fullTextXML di Europe PMC."""
+    body = "".join(
+        f"<sec><title>{title}</title><p>{escape(text)}</p></sec>"
+        for title, text in _fulltext_sections(pmid) if title != "References"
+    )
+    return (
+        "<?xml version=\"1.0\" ?><article><front><article-meta>"
+        f"<article-id pub-id-type=\"pmcid\">PMC{pmid}</article-id>"
+        "</article-meta></front>"
+        f"<body>{body}</body><back><ref-list><ref>Rossi M. 2010.</ref></ref-list></back></article>"
+    )
+
+
+def _fulltext_pdf(pmid):
+    """PDF sintetico con le stesse sezioni (richiede PyMuPDF)."""
+    import pymupdf
+
+    doc = pymupdf.open()
+    page = doc.new_page()
+    y = 72
+    for title, text in _fulltext_sections(pmid):
+        page.insert_text((72, y), title, fontsize=14)
+        page.insert_text((72, y + 20), text, fontsize=9)
+        y += 60
+    return doc.tobytes()
+
+
+def _europepmc_record(pmid):
+    """Record sintetico con i campi principali della REST API di Europe PMC."""
+    return {
+        "id": pmid,
+        "source": "MED",
+        "pmid": pmid,
+        "doi": f"10.5555/stub.{pmid}",
+        "title": f"Vitamin D and glucose metabolism, study {pmid}",
+        "authorString": "Rossi M.",
+        "journalTitle": f"Journal of Stub Studies {int(pmid) % 7}",
+        "pubYear": str(2000 + int(pmid) % 25),
+        "abstractText": f"Randomized trial {pmid} on vitamin D supplementation and insulin sensitivity in humans.",
+        "isOpenAccess": "N",
+    }
+
+
+def load_fixtures(fixtures_dir):
+    """
+    Carica le risposte modello (make_fixtures.py o record_fixtures.py):
+    - efetch.xml: un <PubmedArticleSet>, usato come modello per gli articoli
+    - europepmc.json: lista di record della ricerca Europe PMC
+    Restituisce (modelli XML con segnaposto __PMID__, record Europe PMC); liste vuote se assenti.
+    """
+    from lxml import etree
+
+    fixtures_dir = Path(fixtures_dir)
+    templates, records = [], []
+    efetch_path = fixtures_dir / "efetch.xml"
+    if efetch_path.exists():
+        for article in etree.parse(str(efetch_path)).iter("PubmedArticle"):
+            pmid = article.find("MedlineCitation/PMID")
+            if pmid is not None:
+                pmid.text = "__PMID__"
+            templates.append(etree.tostring(article, encoding="unicode"))
+    europepmc_path = fixtures_dir / "europepmc.json"
+    if europepmc_path.exists():
+        with open(europepmc_path, encoding="utf-8") as f:
+            records = json.load(f)
+    logger.info(f"🧪 [EUtilsStub] Fixture caricate: {len(templates)} articoli EFetch, {len(records)} record Europe PMC")
+    return templates, records
+
+
+class EUtilsStub:
+    """
+    Server HTTP locale che imita ESearch/EFetch di NCBI e la ricerca REST di Europe PMC
+    per test e benchmark offline.
+
+    - n_results: numero di PMID restituiti da qualsiasi query (prima dei filtri [dp])
+    - ESearch come PubMed: filtri [dp] nel term (sulle date dei record sintetici), rettype=count,
+      al massimo 10.000 PMID per pagina ed errore oltre retstart 9.998
+    - latency: ritardo (s) aggiunto a ogni risposta, per simulare la rete
+    - history_ttl: numero di EFetch servite per ogni sessione WebEnv prima di "scadere"
+      (None = mai), per provare il fallback della modalità History server
+    - fixtures_dir: cartella con risposte modello (make_fixtures.py, o reali da record_fixtures.py);
+      gli articoli vengono ripetuti a rotazione con i PMID della query (senza fixture si usano
+      record sintetici)
+    - requests_log: lista di (timestamp, endpoint) per verificare il rate effettivo
+    - rate_limit: come NCBI, le richieste E-utilities oltre rate_limit al secondo ricevono
+      HTTP 429 (None = nessun limite); rejected le conta
+    - testi completi: gli articoli sintetici con PMID pari hanno un PMCID, il JATS su
+      europepmc_rest_url/{PMCID}/fullTextXML e un PDF su pdf_url (pdf_requests li conta)
+
+    Uso:
+        with EUtilsStub(n_results=5000, latency=0.2) as stub:
+            retriever = Retriever(base_url=stub.base_url)
+            europepmc = EuropePMCWrapper(base_url=stub.europepmc_url)
+    """
+
+    def __init__(self, n_results=1000, latency=0.0, first_pmid=30000000, history_ttl=None, fixtures_dir=None,
+                 rate_limit=None):
+        self.n_results = n_results
+        self.latency = latency
+        self.first_pmid = first_pmid
+        self.history_ttl = history_ttl
+        self.templates, self.europepmc_records = load_fixtures(fixtures_dir) if fixtures_dir else ([], [])
+        self.requests_log = []
+        self.pdf_requests = 0
+        self.rate_limit = rate_limit
+        self.rejected = 0
+        self._eutils_times = []
+        self._sessions = {}
+        self._session_ids = {}
+        self._dates = None
+        self._sessions_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def pmids(self):
+        return self._slice(0, self.n_results)
+
+    def _slice(self, retstart, retmax):
+        stop = min(retstart + retmax, self.n_results)
+        return [str(self.first_pmid + i) for i in range(retstart, stop)]
+
+    def _over_limit(self, now):
+        """True se la richiesta E-utilities supera rate_limit nell'ultimo secondo."""
+        if self.rate_limit is None:
+            return False
+        with self._sessions_lock:
+            self._eutils_times = [t for t in self._eutils_times if t > now - RATE_WINDOW]
+            if len(self._eutils_times) >= self.rate_limit:
+                self.rejected += 1
+                return True
+            self._eutils_times.append(now)
+            return False
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _params(self):
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                if self.command == "POST":
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = self.rfile.read(length).decode()
+                    params.update({k: v[-1] for k, v in parse_qs(body).items()})
+                return parsed.path.rsplit("/", 1)[-1], params
+
+            def _send(self, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                endpoint, params = self._params()
+                now = time.monotonic()
+                stub.requests_log.append((now, endpoint))
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                if endpoint in ("esearch.fcgi", "efetch.fcgi") and stub._over_limit(now):
+                    self.send_error(429, "API rate limit exceeded")
+                elif endpoint == "esearch.fcgi":
+                    self._send(json.dumps(stub.esearch(params)), "application/json")
+                elif endpoint == "efetch.fcgi":
+                    self._send(stub.efetch(params), "text/xml")
+                elif endpoint == "search":
+                    self._send(json.dumps(stub.europepmc_search(params)), "application/json")
+                elif endpoint == "fullTextXML":
+                    pmid = urlparse(self.path).path.split("/")[-2].replace("PMC", "")
+                    self._send(_fulltext_jats(pmid), "application/xml")
+                elif endpoint.endswith(".pdf"):
+                    stub.pdf_requests += 1
+                    data = _fulltext_pdf(endpoint[3:-4])
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/pdf")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self.send_error(404)
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+        return Handler
+
+    def _matching(self, term):
+        """PMID che soddisfano i filtri [dp] del term (tutti se non ce ne sono)."""
+        ranges = dp_ranges(term or "")
+        if not ranges:
+            return self.pmids
+        if self._dates is None:
+            self._dates = [(pmid, _pub_date(pmid)) for pmid in self.pmids]
+        return [pmid for pmid, pub_date in self._dates if all(start <= pub_date <= end for start, end in ranges)]
+
+    def esearch(self, params):
+        matching = self._matching(params.get("term"))
+        if params.get("rettype") == "count":
+            return {"esearchresult": {"count": str(len(matching))}}
+        retstart = int(params.get("retstart", 0))
+        retmax = min(int(params.get("retmax", 20)), ESEARCH_MAX_RETMAX)
+        if retstart > ESEARCH_MAX_RETSTART:
+            return {"esearchresult": {
+                "count": str(len(matching)), "retstart": str(retstart), "retmax": "0", "idlist": [],
+                "ERROR": f"Search Backend failed: Exception:\n'retstart' cannot be larger than {ESEARCH_MAX_RETSTART}. "
+                         "For PubMed, ESearch can only retrieve the first 9,999 records matching the query.",
+            }}
+        ids = matching[retstart:retstart + retmax]
+        result = {"count": str(len(matching)), "retstart": str(retstart),
+                  "retmax": str(len(ids)), "idlist": ids}
+        if params.get("usehistory") == "y":
+            with self._sessions_lock:
+                webenv = f"MCID_STUB_{len(self._sessions) + 1}"
+                self._sessions[webenv] = 0
+                self._session_ids[webenv] = matching
+            result.update({"webenv": webenv, "querykey": "1"})
+        return {"esearchresult": result}
+
+    def efetch(self, params):
+        if "WebEnv" in params:
+            webenv = params["WebEnv"]
+            with self._sessions_lock:
+                served = self._sessions.get(webenv)
+                expired = served is None or (self.history_ttl is not None and served >= self.history_ttl)
+                if not expired:
+                    self._sessions[webenv] = served + 1
+            if expired:
+                return "<eFetchResult><ERROR>Unable to obtain query #1</ERROR></eFetchResult>"
+            retstart = int(params.get("retstart", 0))
+            ids = self._session_ids[webenv][retstart:retstart + int(params.get("retmax", 20))]
+        else:
+            ids = [i for i in params.get("id", "").split(",") if i]
+        body = "".join(self._article_xml(pmid) for pmid in ids)
+        return f"<?xml version=\"1.0\" ?><PubmedArticleSet>{body}</PubmedArticleSet>"
+
+    def _article_xml(self, pmid):
+        if not self.templates:
+            return _article_xml(pmid)
+        return self.templates[int(pmid) % len(self.templates)].replace("__PMID__", pmid)
+
+    def _europepmc_record(self, pmid):
+        if not self.europepmc_records:
+            record = _europepmc_record(pmid)
+            if _open_access(pmid):
+                record.update({"pmcid": f"PMC{pmid}", "isOpenAccess": "Y", "fullTextUrlList": {"fullTextUrl": [
+                    {"availability": "Open access", "availabilityCode": "OA", "documentStyle": "pdf",
+                     "site": "Europe_PMC", "url": f"{self.pdf_url}PMC{pmid}.pdf"},
+                ]}})
+            return record
+        record = dict(self.europepmc_records[int(pmid) % len(self.europepmc_records)])
+        record.update({"id": pmid, "pmid": pmid, "source": "MED"})
+        return record
+
+    def europepmc_search(self, params):
+        """Ricerca Europe PMC con paginazione a cursore (cursorMark) come la REST API reale."""
+        page_size = min(int(params.get("pageSize", 25)), 1000)
+        cursor = params.get("cursorMark", "*")
+        start = 0 if cursor == "*" else int(cursor.rsplit("_", 1)[-1])
+        ids = self._slice(start, page_size)
+        next_start = start + len(ids)
+        response = {
+            "version": "stub",
+            "hitCount": self.n_results,
+            "request": {"queryString": params.get("query", ""), "resultType": params.get("resultType", "lite"),
+                        "cursorMark": cursor, "pageSize": page_size},
+            "resultList": {"result": [self._europepmc_record(pmid) for pmid in ids]},
+        }
+        if next_start < self.n_results:
+            response["nextCursorMark"] = f"AoE_{next_start}"
+        return response
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/entrez/eutils/"
+
+    @property
+    def europepmc_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/europepmc/webservices/rest/search"
+
+    @property
+    def europepmc_rest_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/europepmc/webservices/rest"
+
+    @property
+    def pdf_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/pdf/"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"🧪 [EUtilsStub] In ascolto su {self.base_url}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
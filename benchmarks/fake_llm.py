@@ -0,0 +1,66 @@
+# benchmarks/fake_llm.py
+"""
+Backend LLM finto e deterministico per i benchmark: sostituisce gli AssistantAgent
+di autogen tramite ThreadLocalAgent.agent_factory. Le risposte dipendono solo dal
+prompt (crc32), così due esecuzioni producono gli stessi risultati.
+
+Uso:
+    ThreadLocalAgent.agent_factory = FakeLLM(latency=0.05)
+"""
+
+import re
+import json
+import time
+import zlib
+
+STUDY_TYPES = ("RCT", "coorte", "meta-analisi", "caso-controllo")
+ENDPOINTS = ("HbA1c", "glicemia a digiuno", "HOMA-IR", "insulino-resistenza", "peso corporeo")
+EFFECTS = ("positivo", "negativo", "neutro", "incerto")
+
+_PMID = re.compile(r"\bPMID: (\S+)")
+
+
+def _hash(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class FakeAgent:
+    def __init__(self, name, latency=0.0):
+        self.name = name
+        self.latency = latency
+        self.calls = 0
+
+    def _reply(self, content):
+        h = _hash(content)
+        if self.name == "Filter":
+            return "sì" if h % 2 else "no"
+        if self.name == "FilterBatch":
+            return json.dumps([
+                {"pmid": pmid, "rilevante": bool(_hash(pmid) % 2), "confidenza": round(_hash(pmid) % 100 / 100, 2)}
+                for pmid in _PMID.findall(content)
+            ])
+        if self.name == "Miner":
+            return json.dumps({
+                "numero_pazienti": 20 + h % 500,
+                "tipo_studio": STUDY_TYPES[h % len(STUDY_TYPES)],
+                "endpoint": [ENDPOINTS[h % len(ENDPOINTS)], ENDPOINTS[(h // 7) % len(ENDPOINTS)]],
+                "effetto": EFFECTS[h % len(EFFECTS)],
+            })
+        # Synth / SynthMap: testo di lunghezza fissa
+        return f"Sintesi {h:08x}: " + "risultati coerenti tra gli studi inclusi. " * 20
+
+    def generate_reply(self, messages):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(messages[-1]["content"])
+
+
+class FakeLLM:
+    """Fabbrica compatibile con ThreadLocalAgent.agent_factory(name, system_message, llm_config)."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def __call__(self, name, system_message, llm_config):
+        return FakeAgent(name, self.latency)
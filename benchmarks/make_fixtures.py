@@ -0,0 +1,177 @@
+# benchmarks/make_fixtures.py
+"""
+Genera fixture sintetiche e riproducibili per lo stub (EFetch XML e ricerca Europe PMC)
+in benchmarks/fixtures/: stesso seed → stessi file, byte per byte. Sono le fixture
+versionate su cui è misurata benchmarks/baseline.json; rispetto ai record sintetici
+dello stub variano lunghezza e struttura degli abstract, numero di autori, formati delle
+date e caratteri non ASCII, come le risposte reali.
+
+Per rigenerarle (e verificare che coincidano con quelle versionate):
+    python benchmarks/make_fixtures.py
+    git diff --stat benchmarks/fixtures
+
+Le risposte reali registrate con record_fixtures.py si usano con
+run_benchmarks.py --fixtures benchmarks/fixtures_recorded.
+"""
+
+import json
+import random
+import argparse
+import calendar
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+fixtures_dir = Path(__file__).resolve().parent / "fixtures"
+
+DEFAULT_SEED = 20240601
+DEFAULT_N = 60
+
+EXPOSURES = ("vitamin D3 supplementation", "cholecalciferol", "25-hydroxyvitamin D status", "calcitriol",
+             "high-dose vitamin D", "vitamin D and calcium co-supplementation")
+OUTCOMES = ("glycaemic control", "HbA1c", "insulin resistance (HOMA-IR)", "fasting plasma glucose",
+            "β-cell function", "incident type 2 diabetes", "body weight")
+POPULATIONS = ("adults with type 2 diabetes", "prediabetic women", "older adults", "obese adolescents",
+               "patients with gestational diabetes", "vitamin D–deficient patients")
+DESIGNS = ("a randomized controlled trial", "a double-blind placebo-controlled trial", "a prospective cohort study",
+           "a systematic review and meta-analysis", "a cross-sectional study", "a case-control study")
+SENTENCES = (
+    "Participants received {dose} IU/day for {weeks} weeks.",
+    "Serum 25(OH)D increased from {a}.{b} to {c}.{b} ng/mL.",
+    "{outcome} changed by {a}.{b}% (95% CI {b}.1 to {c}.{a}; p = 0.0{b}).",
+    "No serious adverse events were reported.",
+    "Adherence was {c}% in both arms.",
+    "Subgroup analyses by baseline {outcome} did not modify the effect.",
+    "Results were consistent after adjustment for BMI, age and season of sampling.",
+)
+LAST_NAMES = ("Rossi", "Müller", "García", "Nguyễn", "Søndergaard", "O'Brien", "Kowalczyk", "Zhang", "Öztürk",
+              "Silva", "Dubois", "Yamamoto", "Bianchi", "Łukasik")
+JOURNALS = ("Diabetes Care", "Nutrients", "The American Journal of Clinical Nutrition", "Diabetologia",
+            "Journal of Clinical Endocrinology & Metabolism", "BMJ Open", "Endocrine")
+STRUCTURED = ("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS")
+
+
+def _abstract(rng, exposure, outcome, population, design):
+    n = rng.randint(3, 14)
+    sentences = [f"We conducted {design} of {exposure} on {outcome} in {rng.randint(24, 4800)} {population}."]
+    for _ in range(n):
+        sentences.append(rng.choice(SENTENCES).format(
+            dose=rng.choice((400, 1000, 2000, 4000, 50000)), weeks=rng.randint(8, 104), outcome=outcome,
+            a=rng.randint(0, 9), b=rng.randint(1, 9), c=rng.randint(10, 99)))
+    if rng.random() < 0.1:
+        return []  # articolo senza abstract
+    if rng.random() < 0.5:
+        # abstract strutturato: le frasi divise nelle sezioni con Label
+        size = -(-len(sentences) // len(STRUCTURED))
+        return [(label, " ".join(sentences[i * size:(i + 1) * size])) for i, label in enumerate(STRUCTURED)
+                if sentences[i * size:(i + 1) * size]]
+    return [(None, " ".join(sentences))]
+
+
+def _article(rng, idx):
+    exposure, outcome = rng.choice(EXPOSURES), rng.choice(OUTCOMES)
+    population, design = rng.choice(POPULATIONS), rng.choice(DESIGNS)
+    title = f"Effect of {exposure} on {outcome} in {population}: {design}"
+    year, month = rng.randint(2005, 2024), rng.randint(1, 12)
+    authors = [(rng.choice(LAST_NAMES), "".join(rng.choices("ABCDEFGHJKLMNPRSTVW", k=rng.randint(1, 2))))
+               for _ in range(rng.choice((1, 2, 3, 4, 6, 8, 12, 25)))]
+    return {
+        "idx": idx,
+        "title": title,
+        "abstract": _abstract(rng, exposure, outcome, population, design),
+        "journal": rng.choice(JOURNALS),
+        "year": year,
+        "month": month,
+        # formati di data di PubMed: Year/Month, solo Year, MedlineDate ("2019 Nov-Dec")
+        "date_style": rng.choice(("month", "month", "year", "medline")),
+        "authors": authors,
+        "doi": f"10.5555/fixture.{year}.{idx:04d}",
+        "pmcid": f"PMC{8000000 + idx}" if rng.random() < 0.4 else "",
+    }
+
+
+def _pubmed_xml(record):
+    year, month = record["year"], record["month"]
+    if record["date_style"] == "month":
+        pub_date = f"<Year>{year}</Year><Month>{calendar.month_abbr[month]}</Month>"
+    elif record["date_style"] == "year":
+        pub_date = f"<Year>{year}</Year>"
+    else:
+        last = calendar.month_abbr[min(month + 1, 12)]
+        pub_date = f"<MedlineDate>{year} {calendar.month_abbr[month]}-{last}</MedlineDate>"
+    abstract = "".join(
+        f"<AbstractText Label=\"{label}\">{escape(text)}</AbstractText>" if label
+        else f"<AbstractText>{escape(text)}</AbstractText>"
+        for label, text in record["abstract"]
+    )
+    authors = "".join(f"<Author><LastName>{escape(last)}</LastName><Initials>{initials}</Initials></Author>"
+                      for last, initials in record["authors"])
+    return (
+        "<PubmedArticle><MedlineCitation>"
+        f"<PMID Version=\"1\">{39000000 + record['idx']}</PMID>"
+        "<Article>"
+        f"<Journal><Title>{escape(record['journal'])}</Title>"
+        f"<JournalIssue><PubDate>{pub_date}</PubDate></JournalIssue></Journal>"
+        f"<ArticleTitle>{escape(record['title'])}</ArticleTitle>"
+        + (f"<Abstract>{abstract}</Abstract>" if abstract else "")
+        + f"<AuthorList>{authors}</AuthorList>"
+        f"<ELocationID EIdType=\"doi\" ValidYN=\"Y\">{record['doi']}</ELocationID>"
+        "</Article></MedlineCitation>"
+        "<PubmedData><ArticleIdList>"
+        f"<ArticleId IdType=\"pubmed\">{39000000 + record['idx']}</ArticleId>"
+        f"<ArticleId IdType=\"doi\">{record['doi']}</ArticleId>"
+        + (f"<ArticleId IdType=\"pmc\">{record['pmcid']}</ArticleId>" if record["pmcid"] else "")
+        + "</ArticleIdList></PubmedData></PubmedArticle>"
+    )
+
+
+def _europepmc_record(record):
+    pmid = str(39000000 + record["idx"])
+    result = {
+        "id": pmid,
+        "source": "MED",
+        "pmid": pmid,
+        "doi": record["doi"],
+        "title": record["title"],
+        "authorString": ", ".join(f"{last} {initials}" for last, initials in record["authors"]) + ".",
+        "journalTitle": record["journal"],
+        "pubYear": str(record["year"]),
+        "firstPublicationDate": f"{record['year']}-{record['month']:02d}-01",
+        "isOpenAccess": "Y" if record["pmcid"] else "N",
+    }
+    if record["abstract"]:
+        result["abstractText"] = " ".join(f"{label}: {text}" if label else text for label, text in record["abstract"])
+    if record["pmcid"]:
+        result["pmcid"] = record["pmcid"]
+    return result
+
+
+def make_fixtures(out_dir, n=DEFAULT_N, seed=DEFAULT_SEED):
+    """Scrive efetch.xml ed europepmc.json in out_dir; restituisce i percorsi."""
+    rng = random.Random(seed)
+    records = [_article(rng, idx) for idx in range(n)]
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    efetch_path, europepmc_path = out_dir / "efetch.xml", out_dir / "europepmc.json"
+    with open(efetch_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("<?xml version=\"1.0\" ?>\n<PubmedArticleSet>\n")
+        f.writelines(_pubmed_xml(record) + "\n" for record in records)
+        f.write("</PubmedArticleSet>\n")
+    with open(europepmc_path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump([_europepmc_record(record) for record in records], f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    return efetch_path, europepmc_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera fixture sintetiche riproducibili per lo stub")
+    parser.add_argument("--n", type=int, default=DEFAULT_N, help="Numero di articoli modello")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", type=Path, default=fixtures_dir)
+    args = parser.parse_args()
+
+    for path in make_fixtures(args.out, args.n, args.seed):
+        print(f"💾 {path} ({path.stat().st_size / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/record_fixtures.py
+"""
+Registra un campione di risposte reali (EFetch XML e ricerca Europe PMC) in
+benchmarks/fixtures_recorded/ (non versionata), per provare lo stub locale su dati reali.
+Da eseguire una volta con accesso a internet; i benchmark non toccano più la rete.
+Le risposte reali cambiano nel tempo: la baseline usa le fixture generate da make_fixtures.py.
+
+Esempio:
+    python benchmarks/record_fixtures.py --query "vitamin D AND diabetes" --n 200
+    python benchmarks/run_benchmarks.py --fixtures benchmarks/fixtures_recorded
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import requests
+
+project_root = Path(__file__).resolve().parent.parent
+fixtures_dir = Path(__file__).resolve().parent / "fixtures_recorded"
+
+EUTILS = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+EUROPEPMC = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
+
+
+def record_pubmed(query, n, api_key=None):
+    params = {"db": "pubmed", "term": query, "retmax": n, "retmode": "json", "tool": "DrChiccoTool"}
+    if api_key:
+        params["api_key"] = api_key
+    response = requests.get(EUTILS + "esearch.fcgi", params=params, timeout=30)
+    response.raise_for_status()
+    pmids = response.json()["esearchresult"]["idlist"]
+
+    data = {"db": "pubmed", "id": ",".join(pmids), "retmode": "xml", "tool": "DrChiccoTool"}
+    if api_key:
+        data["api_key"] = api_key
+    response = requests.post(EUTILS + "efetch.fcgi", data=data, timeout=120)
+    response.raise_for_status()
+    with open(fixtures_dir / "efetch.xml", "wb") as f:
+        f.write(response.content)
+    print(f"💾 efetch.xml: {len(pmids)} articoli ({len(response.content) / 1024:.0f} KB)")
+
+
+def record_europepmc(query, n):
+    params = {"query": query, "format": "json", "resultType": "core", "pageSize": min(n, 1000)}
+    response = requests.get(EUROPEPMC, params=params, timeout=60)
+    response.raise_for_status()
+    results = response.json().get("resultList", {}).get("result", [])
+    with open(fixtures_dir / "europepmc.json", "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False)
+    print(f"💾 europepmc.json: {len(results)} record")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registra fixture reali per lo stub E-utilities/Europe PMC")
+    parser.add_argument("--query", default="vitamin D AND diabetes")
+    parser.add_argument("--n", type=int, default=200, help="Numero di record da registrare")
+    args = parser.parse_args()
+
+    api_key = None
+    keys_path = project_root / "config" / "api_keys.json"
+    if keys_path.exists():
+        with open(keys_path) as f:
+            api_key = json.load(f).get("ncbi_api_key")
+
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        record_pubmed(args.query, args.n, api_key)
+        record_europepmc(args.query, args.n)
+    except requests.RequestException as e:
+        print(f"❌ Registrazione fallita: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# benchmarks/run_benchmarks.py
+"""
+Suite di benchmark offline dell'intera pipeline: nessuna chiamata a NCBI, Europe PMC o OpenAI.
+
+    - retrieval    : ESearch + EFetch asincrona contro lo stub locale (latenza per richiesta EFetch)
+    - parsing      : parsing XML EFetch a batch da 100 (latenza per batch)
+    - autocomplete : espansione delle abbreviazioni (latenza per testo)
+    - screening    : filtro di rilevanza a batch con LLM finto (latenza per chiamata LLM)
+    - mining       : estrazione dati con LLM finto (latenza per chiamata LLM)
+    - aggregation  : tabella delle evidenze + aggregazioni (latenza per ripetizione)
+    - synthesis    : report map-reduce con LLM finto (latenza per chiamata LLM)
+
+Per ogni dimensione (default 100, 1k, 10k articoli) riporta throughput (articoli/s) e
+percentili p50/p95/p99. Ogni fase viene ripetuta almeno --rounds volte e per almeno
+--min-time secondi: il throughput è quello del round migliore (tempo minimo, il meno
+disturbato dal resto del sistema), accanto a quello mediano; i percentili usano le latenze
+di tutti i round. I risultati vengono confrontati con benchmarks/baseline.json:
+un calo di throughput oltre la tolleranza è segnalato come regressione (exit code 1).
+
+Lo stub serve gli articoli modellati sulle fixture versionate in benchmarks/fixtures/,
+generate in modo deterministico da make_fixtures.py (stesso seed, stessi file); la loro
+impronta è tra le impostazioni salvate, così un confronto con fixture diverse viene segnalato.
+
+Esempi:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 100 1000 --llm-latency 0.02 --net-latency 0.05
+    python benchmarks/run_benchmarks.py --rounds 10 --min-time 2
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/make_fixtures.py   # rigenera benchmarks/fixtures/ (identiche a quelle versionate)
+"""
+
+import io
+import sys
+import json
+import hashlib
+import time
+import argparse
+import logging
+import platform
+from pathlib import Path
+
+import numpy as np
+
+benchmarks_dir = Path(__file__).resolve().parent
+project_root = benchmarks_dir.parent
+sys.path.append(str(project_root / "src"))
+
+from agents.llm_agent import ThreadLocalAgent
+from agents.retriever_custom import Retriever
+from agents.filter import RelevanceFilter
+from agents.miner import DataMiner
+from agents.synthesizer import Synthesizer
+from agents.concurrency import LLMPool
+from agents.evidence import build_evidence_table
+from agents.aggregator import aggregate_patients, aggregate_endpoint_counts
+from agents.utils import expand_autocomplete_terms
+from tools.tracing import TRACER
+from eutils_stub import EUtilsStub
+from fake_llm import FakeLLM
+
+GOAL = "vitamin D AND diabetes"
+STAGES = ("retrieval", "parsing", "autocomplete", "screening", "mining", "aggregation", "synthesis")
+DICT_PATH = project_root / "data" / "autocomplete_dict.json"
+FIXTURES_DIR = benchmarks_dir / "fixtures"
+BASELINE_PATH = benchmarks_dir / "baseline.json"
+RESULTS_PATH = benchmarks_dir / "results" / "latest.json"
+
+
+def span_durations(events, name):
+    """Durate (s) degli span con il nome indicato, sia eventi "X" sia coppie asincrone "b"/"e"."""
+    durations, opened = [], {}
+    for event in events:
+        if event.get("name") != name:
+            continue
+        if event["ph"] == "X":
+            durations.append(event["dur"] / 1e6)
+        elif event["ph"] == "b":
+            opened[event["id"]] = event["ts"]
+        elif event["ph"] == "e" and event["id"] in opened:
+            durations.append((event["ts"] - opened.pop(event["id"])) / 1e6)
+    return durations
+
+
+def traced_run(func, span_name):
+    """Esegue func con il tracing attivo; restituisce (risultato, tempo totale, latenze degli span)."""
+    TRACER.start(sample_rate=1.0)
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    return result, elapsed, span_durations(TRACER.stop(), span_name)
+
+
+def timed_calls(func, items):
+    """Esegue func su ogni elemento; restituisce (tempo totale, latenze per elemento)."""
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - start, latencies
+
+
+# === Fasi ===
+
+def bench_retrieval(ctx, args):
+    retriever = Retriever(rate_limit=args.rate, concurrency=args.concurrency, async_mode=True,
+                          base_url=ctx["stub"].base_url)
+    articles, elapsed, latencies = traced_run(lambda: retriever.search(GOAL), "efetch batch")
+    ctx["articles"] = articles
+    return len(articles), elapsed, latencies
+
+
+def bench_parsing(ctx, args):
+    stub = ctx["stub"]
+    retriever = Retriever()
+    payloads = [
+        stub.efetch({"id": ",".join(stub.pmids[i:i + Retriever.fetch_batch])}).encode("utf-8")
+        for i in range(0, stub.n_results, Retriever.fetch_batch)
+    ]
+    parsed = []
+    elapsed, latencies = timed_calls(lambda data: parsed.extend(retriever._iter_parse(io.BytesIO(data))), payloads)
+    ctx.setdefault("articles", parsed)
+    return len(parsed), elapsed, latencies
+
+
+def bench_autocomplete(ctx, args):
+    texts = [f"{art['title']} {art['abstract']}" for art in ctx["articles"]]
+    expand_autocomplete_terms(texts[0], dict_path=DICT_PATH)  # carica il dizionario fuori dalla misura
+    elapsed, latencies = timed_calls(lambda text: expand_autocomplete_terms(text, dict_path=DICT_PATH), texts)
+    return len(texts), elapsed, latencies
+
+
+def bench_screening(ctx, args):
+    relevance_filter = RelevanceFilter()
+    articles = ctx["articles"]
+    decisions, elapsed, latencies = traced_run(
+        lambda: relevance_filter.is_relevant_batch(articles, GOAL, pool=ctx["pool"]), "llm call"
+    )
+    ctx["filtered"] = [
+        art for idx, art in enumerate(articles)
+        if decisions.get(relevance_filter.article_key(art, idx), {}).get("relevant")
+    ]
+    return len(articles), elapsed, latencies
+
+
+def bench_mining(ctx, args):
+    miner = DataMiner()
+    articles = ctx["articles"]
+    extractions, elapsed, latencies = traced_run(
+        lambda: ctx["pool"].map(lambda art: miner.extract_data(art["abstract"]), articles, default="{}"),
+        "llm call",
+    )
+    ctx["mined_data"] = [
+        {"pmid": art.pmid, "year": art.year, "extracted": extracted}
+        for art, extracted in zip(articles, extractions)
+    ]
+    return len(articles), elapsed, latencies
+
+
+def bench_aggregation(ctx, args):
+    mined_data = ctx["mined_data"]
+
+    def aggregate(_):
+        table = build_evidence_table(mined_data)
+        aggregate_patients(table)
+        aggregate_endpoint_counts(table)
+
+    aggregate(None)  # inizializzazione di pyarrow.compute fuori dalla misura
+    elapsed, latencies = timed_calls(aggregate, range(args.repeat))
+    return len(mined_data) * args.repeat, elapsed, latencies
+
+
+def bench_synthesis(ctx, args):
+    synthesizer = Synthesizer()
+    mined_data = ctx["mined_data"]
+    _, elapsed, latencies = traced_run(
+        lambda: synthesizer.generate_report(GOAL, mined_data, pool=ctx["pool"]), "llm call"
+    )
+    return len(mined_data), elapsed, latencies
+
+
+BENCHMARKS = {
+    "retrieval": bench_retrieval,
+    "parsing": bench_parsing,
+    "autocomplete": bench_autocomplete,
+    "screening": bench_screening,
+    "mining": bench_mining,
+    "aggregation": bench_aggregation,
+    "synthesis": bench_synthesis,
+}
+
+
+# === Esecuzione e confronto con la baseline ===
+
+def measure(bench, ctx, args):
+    """
+    Ripete la fase almeno args.rounds volte e finché il tempo misurato non raggiunge
+    args.min_time: una singola misura di pochi millisecondi è dominata dal rumore.
+    Restituisce (articoli per round, tempi dei round, latenze di tutti i round).
+    """
+    rounds, latencies = [], []
+    while len(rounds) < args.rounds or sum(rounds) < args.min_time:
+        items, elapsed, round_latencies = bench(ctx, args)
+        rounds.append(elapsed)
+        latencies.extend(round_latencies)
+    return items, rounds, latencies
+
+
+def summarize(items, rounds, latencies):
+    best, median = min(rounds), float(np.median(rounds))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        "items": items,
+        "rounds": len(rounds),
+        "elapsed_s": round(best, 4),
+        "median_s": round(median, 4),
+        "throughput": round(items / best, 1) if best else 0.0,
+        "throughput_median": round(items / median, 1) if median else 0.0,
+        "p50_ms": round(p50 * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "samples": len(latencies),
+    }
+
+
+def fixtures_digest(fixtures_dir):
+    """Impronta (sha256 abbreviato) dei file di fixture, salvata con le impostazioni."""
+    digest = hashlib.sha256()
+    for name in ("efetch.xml", "europepmc.json"):
+        path = Path(fixtures_dir) / name
+        if path.exists():
+            digest.update(name.encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def run_size(n, stages, args):
+    results = {}
+    with EUtilsStub(n_results=n, latency=args.net_latency, fixtures_dir=args.fixtures) as stub:
+        ctx = {"stub": stub, "pool": LLMPool(max_workers=args.workers)}
+        if "retrieval" not in stages:
+            bench_parsing(ctx, args)  # servono comunque gli articoli per le fasi successive
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            if stage in ("aggregation", "synthesis") and "mined_data" not in ctx:
+                bench_mining(ctx, args)
+            results[stage] = summarize(*measure(BENCHMARKS[stage], ctx, args))
+            row = results[stage]
+            print(f"{stage:<13} {n:>6}  {row['elapsed_s']:9.3f}s  {row['throughput']:>10.1f} art/s  "
+                  f"(mediana {row['throughput_median']:>10.1f}, {row['rounds']:>3} round)  "
+                  f"p50 {row['p50_ms']:9.2f}ms  p95 {row['p95_ms']:9.2f}ms  p99 {row['p99_ms']:9.2f}ms")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Elenco delle regressioni di throughput rispetto alla baseline."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, row in stages.items():
+            base = baseline.get("results", {}).get(size, {}).get(stage)
+            if not base or not base["throughput"]:
+                continue
+            ratio = row["throughput"] / base["throughput"]
+            if ratio < 1 - tolerance:
+                regressions.append(f"{stage}@{size}: {row['throughput']:.1f} art/s "
+                                   f"(baseline {base['throughput']:.1f}, {ratio:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline della pipeline DrChicco")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--net-latency", type=float, default=0.0, help="Latenza simulata per richiesta HTTP (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Latenza simulata per chiamata LLM (s)")
+    parser.add_argument("--rate", type=float, default=1000, help="Richieste E-utilities al secondo")
+    parser.add_argument("--concurrency", type=int, default=8, help="Batch EFetch in volo")
+    parser.add_argument("--workers", type=int, default=8, help="Chiamate LLM in parallelo")
+    parser.add_argument("--repeat", type=int, default=5, help="Ripetizioni della fase di aggregazione")
+    parser.add_argument("--rounds", type=int, default=5, help="Round minimi per fase e dimensione")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="Tempo minimo misurato per fase e dimensione (s): si aggiungono round fino a raggiungerlo")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR,
+                        help="Cartella con efetch.xml ed europepmc.json (default: fixture versionate)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Salva i risultati come nuova baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Calo di throughput tollerato rispetto alla baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.disable(logging.WARNING)
+    ThreadLocalAgent.agent_factory = FakeLLM(latency=args.llm_latency)
+
+    if not (args.fixtures / "efetch.xml").exists():
+        print(f"❌ Fixture assenti in {args.fixtures}: rigenerale con python benchmarks/make_fixtures.py")
+        sys.exit(2)
+    settings = {k: getattr(args, k) for k in ("net_latency", "llm_latency", "rate", "concurrency", "workers", "repeat",
+                                              "rounds", "min_time")}
+    settings["fixtures"] = fixtures_digest(args.fixtures)
+    print(f"📊 Benchmark pipeline: dimensioni={args.sizes}, impostazioni={settings}")
+    results = {str(n): run_size(n, args.stages, args) for n in args.sizes}
+
+    output = {"settings": settings, "python": platform.python_version(), "machine": platform.machine(),
+              "created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(RESULTS_PATH, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"💾 Baseline salvata in {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print("ℹ️ Nessuna baseline: esegui con --save-baseline per crearla.")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print(f"⚠️ Impostazioni diverse dalla baseline ({baseline.get('settings')}): confronto indicativo.")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ Regressioni rispetto alla baseline:")
+        for line in regressions:
+            print(f"   - {line}")
+        sys.exit(1)
+    print("✅ Nessuna regressione rispetto alla baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,7 @@ ncbi_key = api_keys.get("ncbi_api_key")
 
 # 2. Inizializza componenti (opzionale se usi solo interfaccia)
 retriever = APIRetriever(api_key=ncbi_key)
-europepmc = EuropePMCWrapper(page_size=5)
+europepmc = EuropePMCWrapper(max_results=5)
 filter_agent = RelevanceFilter(api_key=openai_key)
 data_miner = DataMiner(api_key=openai_key)
 synthesizer = Synthesizer(api_key=openai_key)
@@ -0,0 +1,124 @@
+# src/agents/autocomplete.py
+
+import re
+import json
+import threading
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DICT_PATH = Path("data") / "autocomplete_dict.json"
+
+# Parole eventualmente unite da trattini/apostrofi (es. "HOMA-IR", "T2DM-related", "AD's")
+_TOKEN = re.compile(r"\w+(?:[-'’]\w+)*")
+_WORD = re.compile(r"\w+")
+# Possibili espansioni già presenti nel testo: "... (ABBR)"
+_PAREN_ABBREV = re.compile(r"\(([^()\s]+)\)")
+
+
+class AutocompleteExpander:
+    """
+    Espansione delle abbreviazioni in un solo passaggio sul testo.
+
+    Il dizionario viene caricato una volta in una tabella hash; il testo viene scandito
+    token per token (lookup O(1) per token), quindi il costo non dipende dal numero di
+    voci del dizionario e regge anche 100k+ abbreviazioni.
+
+    L'espansione è idempotente: le forme già espanse "Termine Completo (ABBR)"
+    vengono riconosciute e lasciate invariate, quindi espandere due volte lo stesso
+    testo non produce "Type 2 Diabetes Mellitus (Type 2 Diabetes Mellitus (T2DM))".
+    """
+
+    def __init__(self, abbrev_map):
+        self.abbrev_map = dict(abbrev_map)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _protected_spans(self, text):
+        """Intervalli del testo che contengono già un'espansione 'Termine Completo (ABBR)'."""
+        spans = []
+        for match in _PAREN_ABBREV.finditer(text):
+            full_term = self.abbrev_map.get(match.group(1))
+            if full_term and text[:match.start()].endswith(full_term + " "):
+                spans.append((match.start() - len(full_term) - 1, match.end()))
+        return spans
+
+    def _lookup(self, token):
+        """
+        Cerca il token nel dizionario; se non c'è, prova le sotto-parti più lunghe
+        (es. "HOMA-IR-based" -> "HOMA-IR"). Restituisce (inizio, fine, abbreviazione) o None.
+        """
+        if token in self.abbrev_map:
+            return 0, len(token), token
+        words = [(m.start(), m.end()) for m in _WORD.finditer(token)]
+        if len(words) < 2:
+            return None
+        for size in range(len(words) - 1, 0, -1):
+            for i in range(len(words) - size + 1):
+                start, end = words[i][0], words[i + size - 1][1]
+                if token[start:end] in self.abbrev_map:
+                    return start, end, token[start:end]
+        return None
+
+    def expand(self, text):
+        """Restituisce (testo espanso, numero di sostituzioni)."""
+        if not text or not self.abbrev_map:
+            return text, 0
+
+        protected = self._protected_spans(text)
+        parts = []
+        last = 0
+        substitutions = 0
+        span_idx = 0
+
+        for match in _TOKEN.finditer(text):
+            start = match.start()
+            while span_idx < len(protected) and protected[span_idx][1] <= start:
+                span_idx += 1
+            if span_idx < len(protected) and protected[span_idx][0] <= start:
+                continue
+
+            found = self._lookup(match.group())
+            if found is None:
+                continue
+            rel_start, rel_end, abbrev = found
+            parts.append(text[last:start + rel_start])
+            parts.append(f"{self.abbrev_map[abbrev]} ({abbrev})")
+            last = start + rel_end
+            substitutions += 1
+
+        if not substitutions:
+            return text, 0
+        parts.append(text[last:])
+        return "".join(parts), substitutions
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_expander(path=DEFAULT_DICT_PATH):
+    """
+    Restituisce l'espansore per il dizionario indicato, caricandolo una sola volta.
+    Il file viene riletto solo se la sua data di modifica cambia.
+    Restituisce None se il dizionario non esiste.
+    """
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    key = str(path.resolve())
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        expander = AutocompleteExpander.from_file(path)
+        _cache[key] = (mtime, expander)
+        logger.info(f"🔤 Dizionario autocomplete caricato: {len(expander.abbrev_map)} abbreviazioni.")
+        return expander
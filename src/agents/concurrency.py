@@ -0,0 +1,96 @@
+# src/agents/concurrency.py
+
+import time
+import random
+import logging
+from concurrent.futures import as_completed
+
+from tools.metrics import ContextThreadPoolExecutor
+from tools.rate_limiter import TokenBucket
+from tools.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def is_rate_limit_error(error):
+    """True se l'eccezione corrisponde a un HTTP 429 / rate limit del provider LLM."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "rate_limit" in message
+
+
+class LLMPool:
+    """
+    Pool di thread a concorrenza limitata per le chiamate LLM (filtro, miner, sintesi).
+
+    - max_workers: chiamate contemporaneamente in volo
+    - requests_per_minute / tokens_per_minute: limiti del provider (None = nessun limite);
+      i token bucket sono condivisi da tutte le map() eseguite sullo stesso pool
+    - request_bucket / token_bucket: bucket già pronti (es. SharedTokenBucket condivisi tra
+      processi) al posto di quelli creati dai limiti per minuto
+    - i 429 vengono ripetuti con backoff esponenziale (max_retries tentativi)
+
+    I risultati tornano nell'ordine dell'input; on_progress(done, total) viene invocato
+    dal thread chiamante, quindi può aggiornare direttamente i placeholder Streamlit.
+    """
+
+    def __init__(self, max_workers=8, requests_per_minute=None, tokens_per_minute=None, max_retries=5,
+                 request_bucket=None, token_bucket=None):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.request_bucket = request_bucket or (
+            TokenBucket(requests_per_minute / 60) if requests_per_minute else None
+        )
+        self.token_bucket = token_bucket or (
+            TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute / 60)
+            if tokens_per_minute else None
+        )
+
+    def _call(self, func, item, tokens):
+        for attempt in range(1, self.max_retries + 1):
+            with TRACER.span("rate limit wait", cat="llm", sampled=True, attempt=attempt):
+                if self.request_bucket is not None:
+                    self.request_bucket.acquire()
+                if self.token_bucket is not None and tokens:
+                    self.token_bucket.acquire(tokens)
+            try:
+                with TRACER.span("llm task", cat="llm", sampled=True, attempt=attempt):
+                    return func(item)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+                logger.warning(f"⏳ [LLMPool] Rate limit (429), nuovo tentativo tra {delay:.1f}s "
+                               f"({attempt}/{self.max_retries})")
+                with TRACER.span("429 backoff", cat="llm", delay=round(delay, 2)):
+                    time.sleep(delay)
+
+    def map(self, func, items, token_cost=None, on_progress=None, default=None):
+        """
+        Applica func a ogni elemento in parallelo e restituisce i risultati in ordine.
+
+        - token_cost(item): stima dei token della chiamata, usata per il limite per minuto
+        - default: valore restituito per gli elementi falliti (l'errore viene loggato)
+        """
+        items = list(items)
+        results = [default] * len(items)
+        if not items:
+            return results
+
+        with ContextThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._call, func, item, token_cost(item) if token_cost else 0): idx
+                for idx, item in enumerate(items)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                idx = futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    logger.error(f"❌ [LLMPool] Errore sull'elemento {idx + 1}: {e}")
+                if on_progress:
+                    on_progress(done, len(items))
+
+        return results
@@ -0,0 +1,169 @@
+# src/agents/dedup.py
+
+import re
+import logging
+import unicodedata
+
+from rapidfuzz import fuzz, process
+
+from tools.article import Article
+
+logger = logging.getLogger("Dedup")
+logger.setLevel(logging.INFO)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_DOI_PREFIX = re.compile(r"^(https?://(dx\.)?doi\.org/|doi:\s*)")
+_NUMBERS = re.compile(r"\d+")
+
+
+def normalize_title(title):
+    """Titolo confrontabile: minuscolo, senza accenti, punteggiatura e spazi multipli."""
+    title = title or ""
+    if not title.isascii():
+        title = unicodedata.normalize("NFKD", title)
+        title = "".join(c for c in title if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", title.lower()).strip()
+
+
+def normalize_doi(doi):
+    return _DOI_PREFIX.sub("", (doi or "").strip().lower())
+
+
+def richness(article):
+    """Quanto è completo un record: abstract prima di tutto, poi identificativi e metadati."""
+    has_abstract = article.has_abstract
+    filled = sum(map(bool, (article.pmid, article.doi, article.journal, article.authors, article.year, article.pmcid)))
+    return has_abstract, filled, len(article.abstract) if has_abstract else 0
+
+
+class DedupIndex:
+    """
+    Indice di deduplicazione tra fonti (PubMed, Europe PMC, ...) in tempo lineare.
+
+    Ogni record viene cercato, nell'ordine, per PMID, DOI e titolo normalizzato
+    (dizionari, O(1)); se nessuno coincide si confronta con RapidFuzz solo con i titoli
+    dello stesso blocco (stesso inizio o stessa fine del titolo normalizzato, al massimo
+    max_block candidati), mai con tutti gli altri record. I titoli corti o generici
+    ("Editorial", "Correction") non vengono confrontati e i titoli simili devono avere
+    anno compatibile (±1), gli stessi numeri e non avere PMID o DOI diversi.
+
+    Per ogni articolo resta il record più ricco (richness), completato con i campi
+    mancanti degli altri duplicati (Article.merged_with); "sources" elenca le fonti in
+    cui è stato trovato. I dict in ingresso vengono convertiti in Article; i record
+    del chiamante non vengono mai modificati (l'indice ne conserva copie normalizzate).
+    """
+
+    def __init__(self, threshold=93, block_chars=20, min_title_words=4, max_block=32):
+        self.threshold = threshold
+        self.block_chars = block_chars
+        self.min_title_words = min_title_words
+        self.max_block = max_block
+        self.records = []          # un record fuso per articolo, in ordine di arrivo
+        self._by_pmid = {}
+        self._by_doi = {}
+        self._by_title = {}
+        self._blocks = {}
+        self._titles = []          # titolo normalizzato di ogni record
+        self.duplicates = 0
+        self.fuzzy_matches = 0
+
+    def _title_keys(self, title):
+        """Chiavi di blocco: inizio e fine del titolo, insieme ai numeri che contiene."""
+        if len(title.split()) < self.min_title_words:
+            return []
+        numbers = " ".join(_NUMBERS.findall(title))
+        return [("^", numbers, title[:self.block_chars]), ("$", numbers, title[-self.block_chars:])]
+
+    def _find(self, article, pmid, doi, title):
+        year = article.year
+        if pmid and pmid in self._by_pmid:
+            return self._by_pmid[pmid]
+        if doi and doi in self._by_doi:
+            return self._by_doi[doi]
+        keys = self._title_keys(title)
+        if not keys:
+            return None
+
+        def compatible(idx):
+            other = self.records[idx]
+            if year and other.year and abs(year - other.year) > 1:
+                return False
+            if pmid and other.pmid and other.pmid != pmid:
+                return False
+            if doi and other.doi and other.doi != doi:
+                return False
+            return True
+
+        idx = self._by_title.get(title)
+        if idx is not None and compatible(idx):
+            return idx
+        # Il blocco contiene solo titoli con gli stessi numeri ("Part 1"/"Part 2" restano distinti)
+        for key in keys:
+            block = self._blocks.get(key)
+            if not block:
+                continue
+            # Tutto il blocco in una sola chiamata C; i migliori candidati in ordine di punteggio
+            matches = process.extract(title, [self._titles[idx] for idx in block], scorer=fuzz.ratio,
+                                      score_cutoff=self.threshold, limit=5)
+            for _, _, position in matches:
+                if compatible(block[position]):
+                    self.fuzzy_matches += 1
+                    return block[position]
+        return None
+
+    def _register(self, idx, pmid, doi, title):
+        if pmid:
+            self._by_pmid.setdefault(pmid, idx)
+        if doi:
+            self._by_doi.setdefault(doi, idx)
+        keys = self._title_keys(title)
+        if keys:
+            self._by_title.setdefault(title, idx)
+        for key in keys:
+            block = self._blocks.setdefault(key, [])
+            if len(block) < self.max_block:
+                block.append(idx)
+
+    def add(self, article):
+        """Aggiunge un record; restituisce True se era un duplicato di uno già presente."""
+        article = Article.coerce(article)
+        pmid = article.pmid.strip()
+        doi = normalize_doi(article.doi)
+        title = normalize_title(article.title)
+        article = article.copy(doi=doi, sources=article.sources or (article.source or "?",))
+
+        idx = self._find(article, pmid, doi, title)
+        if idx is None:
+            self.records.append(article)
+            self._titles.append(title)
+            self._register(len(self.records) - 1, pmid, doi, title)
+            return False
+
+        current = self.records[idx]
+        if richness(article) > richness(current):
+            merged = article.merged_with(current)
+            # le fonti restano nell'ordine in cui l'articolo è stato trovato
+            merged.sources = current.sources + tuple(s for s in article.sources if s not in current.sources)
+        else:
+            merged = current.merged_with(article)
+        self.records[idx] = merged
+        self._register(idx, merged.pmid.strip(), merged.doi, title)
+        self.duplicates += 1
+        return True
+
+    def add_many(self, articles):
+        for article in articles:
+            self.add(article)
+        return self
+
+
+def merge_results(*result_lists, **index_options):
+    """Unisce le liste di risultati di più fonti; restituisce (articoli unici, DedupIndex)."""
+    index = DedupIndex(**index_options)
+    for results in result_lists:
+        index.add_many(results)
+    logger.info(
+        f"🔗 [Dedup] {sum(len(r) for r in result_lists)} record → {len(index.records)} articoli unici "
+        f"({index.duplicates} duplicati, {index.fuzzy_matches} per titolo simile)"
+    )
+    return index.records, index
@@ -0,0 +1,117 @@
+# src/agents/evidence.py
+
+import re
+import logging
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from agents.utils import parse_json_reply
+
+logger = logging.getLogger("Evidence")
+logger.setLevel(logging.INFO)
+
+EFFECTS = ("positivo", "negativo", "neutro", "incerto")
+
+# Tabella delle evidenze: una riga per articolo, colonne tipizzate secondo lo schema del DataMiner
+EVIDENCE_SCHEMA = pa.schema([
+    ("pmid", pa.string()),
+    ("year", pa.int32()),
+    ("numero_pazienti", pa.int64()),
+    ("tipo_studio", pa.string()),
+    ("endpoint", pa.list_(pa.string())),
+    ("effetto", pa.dictionary(pa.int8(), pa.string())),
+])
+
+_INT = re.compile(r"\d[\d.,\s]*")
+
+
+def parse_extracted(value):
+    """Converte l'output del DataMiner (testo JSON o dict) in dict; {} se non interpretabile."""
+    if isinstance(value, dict):
+        return value
+    parsed = parse_json_reply(value) if isinstance(value, str) else None
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _to_int(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _INT.search(str(value))
+    if not match:
+        return None
+    digits = re.sub(r"\D", "", match.group())
+    return int(digits) if digits else None
+
+
+def _to_list(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        items = [str(v).strip() for v in value if v is not None and str(v).strip()]
+    else:
+        items = [part.strip() for part in re.split(r"[;\n]", str(value)) if part.strip()]
+    return items or None
+
+
+def _to_effect(value):
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    return value if value in EFFECTS else "incerto"
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def build_evidence_table(mined_data):
+    """
+    Costruisce la tabella colonnare (pyarrow) delle evidenze a partire da mined_data
+    ([{"pmid", "year", "extracted"}], con "extracted" testo JSON o dict).
+    Ogni risposta del miner viene interpretata una sola volta qui.
+    """
+    columns = {name: [] for name in EVIDENCE_SCHEMA.names}
+    for item in mined_data:
+        data = parse_extracted(item.get("extracted"))
+        columns["pmid"].append(_to_str(item.get("pmid")))
+        columns["year"].append(_to_int(item.get("year")))
+        columns["numero_pazienti"].append(_to_int(data.get("numero_pazienti")))
+        columns["tipo_studio"].append(_to_str(data.get("tipo_studio")))
+        columns["endpoint"].append(_to_list(data.get("endpoint")))
+        columns["effetto"].append(_to_effect(data.get("effetto")))
+
+    table = pa.table(
+        {
+            "pmid": pa.array(columns["pmid"], pa.string()),
+            "year": pa.array(columns["year"], pa.int32()),
+            "numero_pazienti": pa.array(columns["numero_pazienti"], pa.int64()),
+            "tipo_studio": pa.array(columns["tipo_studio"], pa.string()),
+            "endpoint": pa.array(columns["endpoint"], pa.list_(pa.string())),
+            "effetto": pa.array(columns["effetto"], pa.string()).dictionary_encode(),
+        }
+    ).cast(EVIDENCE_SCHEMA)
+    logger.info(f"🧾 [Evidence] Tabella evidenze: {table.num_rows} righe")
+    return table
+
+
+def as_evidence_table(data):
+    """Accetta sia una tabella pyarrow già costruita sia mined_data."""
+    return data if isinstance(data, pa.Table) else build_evidence_table(data)
+
+
+def save_parquet(table, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, str(path), compression="zstd")
+    logger.info(f"💾 [Evidence] Tabella salvata in {path}")
+
+
+def load_parquet(path):
+    return pq.read_table(str(path)).cast(EVIDENCE_SCHEMA)
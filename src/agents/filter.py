@@ -1,29 +1,53 @@
 # src/agents/filter.py
 
-from autogen import AssistantAgent
-from agents.utils import extract_text
+from agents.llm_agent import ThreadLocalAgent
+from agents.concurrency import LLMPool, is_rate_limit_error
+from agents.utils import extract_text, count_tokens, parse_json_reply
+from tools.metrics import timed
 import logging
 
 logger = logging.getLogger("FilterAgent")
 logger.setLevel(logging.INFO)
 
+BATCH_SYSTEM_MESSAGE = (
+    "Riceverai un obiettivo di ricerca e un elenco numerato di articoli (PMID, titolo, abstract). "
+    "Per ciascun articolo valuta se è rilevante per l'obiettivo. "
+    "Rispondi SOLO con un array JSON, un elemento per articolo, nel formato: "
+    '[{"pmid": "<PMID>", "rilevante": true/false, "confidenza": <numero tra 0 e 1>}]. '
+    "Nessun altro testo."
+)
+
 class RelevanceFilter:
-    def __init__(self, api_key=None):
-        self.agent = AssistantAgent(
+    def __init__(self, api_key=None, cache=None):
+        llm_config = {
+            "temperature": 0,
+            "model": "gpt-3.5-turbo",
+            "api_key": api_key,
+        }
+        self.model = llm_config["model"]
+        self.agent = ThreadLocalAgent(
             name="Filter",
             system_message=(
                 "Leggi titolo e abstract. Rispondi solo con 'sì' o 'no': "
                 "l'articolo è rilevante per l'obiettivo?"
             ),
-            llm_config={
-                "temperature": 0,
-                "model": "gpt-3.5-turbo",
-                "api_key": api_key,
-            },
+            llm_config=llm_config,
+            cache=cache,
+            stage="screening",
+        )
+        self.batch_agent = ThreadLocalAgent(
+            name="FilterBatch",
+            system_message=BATCH_SYSTEM_MESSAGE,
+            llm_config=llm_config,
+            cache=cache,
+            stage="screening",
         )
 
-    def is_relevant(self, title, abstract):
+    @timed("screening", metric="item_seconds")
+    def is_relevant(self, title, abstract, goal=None):
         query = f"TITOLO: {title}\nABSTRACT: {abstract}"
+        if goal:
+            query = f"OBIETTIVO: {goal}\n\n{query}"
         logger.info("🧠 [Filter] Analisi rilevanza in corso...")
         reply = self.agent.generate_reply(messages=[{"role": "user", "content": query}])
         reply_text = extract_text(reply).strip().lower()
@@ -37,3 +61,158 @@ class RelevanceFilter:
         else:
             logger.warning(f"⚠️ [Filter] Risposta ambigua dal modello: {reply_text}")
             return False
+
+    # === Screening a batch ===
+
+    @staticmethod
+    def article_key(article, idx):
+        return article.pmid or f"#{idx}"
+
+    def _pack_batches(self, items, goal, token_budget, max_batch_size):
+        """
+        Raggruppa gli articoli in batch che stanno nel budget di token del prompt.
+        Gli abstract troppo lunghi per un batch da soli vengono troncati.
+        Restituisce (batch, token stimati del prompt) per ogni batch.
+        """
+        base_tokens = count_tokens(BATCH_SYSTEM_MESSAGE + goal, self.model) + 50
+        item_budget = max(token_budget - base_tokens, 200)
+        batches, current, current_tokens = [], [], 0
+
+        for key, title, abstract in items:
+            entry = f"PMID: {key}\nTITOLO: {title}\nABSTRACT: {abstract}"
+            tokens = count_tokens(entry, self.model)
+            if tokens > item_budget:
+                entry = entry[:item_budget * 4]
+                tokens = item_budget
+            if current and (current_tokens + tokens > item_budget or len(current) >= max_batch_size):
+                batches.append((current, base_tokens + current_tokens))
+                current, current_tokens = [], 0
+            current.append((key, entry))
+            current_tokens += tokens
+
+        if current:
+            batches.append((current, base_tokens + current_tokens))
+        return batches
+
+    @staticmethod
+    def _parse_decision(value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            value = value.strip().lower()
+            if value in ("sì", "si", "yes", "true"):
+                return True
+            if value in ("no", "false"):
+                return False
+        return None
+
+    def _screen_batch(self, batch, goal):
+        """Una chiamata LLM per tutto il batch. Restituisce {key: decisione} per le risposte valide."""
+        prompt = f"OBIETTIVO: {goal}\n\nARTICOLI:\n" + "\n\n".join(
+            f"[{i}] {entry}" for i, (_, entry) in enumerate(batch, 1)
+        )
+        try:
+            reply = self.batch_agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise  # gestito con backoff da LLMPool
+            logger.error(f"❌ [Filter] Errore durante lo screening a batch: {e}")
+            return {}
+
+        parsed = parse_json_reply(extract_text(reply))
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+        if not isinstance(parsed, list):
+            logger.warning("⚠️ [Filter] Risposta batch non interpretabile come JSON.")
+            return {}
+
+        expected = {key for key, _ in batch}
+        decisions = {}
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            key = str(item.get("pmid", "")).strip()
+            relevant = self._parse_decision(item.get("rilevante"))
+            if key not in expected or relevant is None:
+                continue
+            try:
+                confidence = min(max(float(item.get("confidenza")), 0.0), 1.0)
+            except (TypeError, ValueError):
+                confidence = None
+            decisions[key] = {"relevant": relevant, "confidence": confidence}
+        return decisions
+
+    def _screen_single(self, item, goal):
+        """Ripiego per un articolo senza risposta dal batch: stesso obiettivo, errori isolati."""
+        key, title, abstract = item
+        try:
+            return {"relevant": self.is_relevant(title, abstract, goal), "confidence": None}
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise  # gestito con backoff da LLMPool
+            logger.error(f"❌ [Filter] Errore nello screening di {key}: {e}")
+            return {"relevant": False, "confidence": None, "error": str(e)}
+
+    @timed("screening")
+    def is_relevant_batch(self, articles, goal, token_budget=3000, max_batch_size=20,
+                          max_retries=2, on_progress=None, pool=None):
+        """
+        Valuta la rilevanza di molti articoli impacchettando più titoli/abstract in una sola chiamata.
+
+        - token_budget: token massimi del prompt per ogni batch
+        - max_retries: quante volte ripetere (a batch) gli articoli la cui risposta non è interpretabile;
+          quelli ancora senza risposta vengono valutati uno per uno (stesso obiettivo, stesso pool)
+        - on_progress(done, total): callback opzionale per aggiornare l'interfaccia
+        - pool: LLMPool con cui eseguire i batch in parallelo (default: uno alla volta)
+
+        Restituisce {pmid: {"relevant": bool, "confidence": float | None}}; gli articoli la cui
+        valutazione singola fallisce risultano non rilevanti, con "error".
+        """
+        items = []
+        for idx, art in enumerate(articles):
+            items.append((self.article_key(art, idx), art.title or "N/D", art.abstract))
+
+        total = len(items)
+        results = {}
+        pending = items
+        pool = pool or LLMPool(max_workers=1)
+        logger.info(f"🧠 [Filter] Screening a batch di {total} articoli (budget {token_budget} token/batch)...")
+
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            batches = self._pack_batches(pending, goal, token_budget, max_batch_size)
+            already, n_pending = len(results), len(pending)
+
+            def report(done, n_batches):
+                if on_progress:
+                    on_progress(already + n_pending * done // n_batches, total)
+
+            for decisions in pool.map(
+                lambda batch: self._screen_batch(batch[0], goal),
+                batches,
+                token_cost=lambda batch: batch[1],
+                on_progress=report,
+                default={},
+            ):
+                results.update(decisions)
+            pending = [item for item in pending if item[0] not in results]
+            if pending:
+                logger.warning(f"⚠️ [Filter] {len(pending)} risposte non interpretabili "
+                               f"(tentativo {attempt + 1}/{max_retries + 1})")
+
+        if pending:
+            already = len(results)
+            failed = {"relevant": False, "confidence": None, "error": "limite di richieste LLM superato"}
+            decisions = pool.map(
+                lambda item: self._screen_single(item, goal),
+                pending,
+                token_cost=lambda item: count_tokens(f"{goal}\n{item[1]}\n{item[2]}", self.model) + 50,
+                on_progress=(lambda done, n: on_progress(already + done, total)) if on_progress else None,
+                default=failed,
+            )
+            results.update((item[0], decision) for item, decision in zip(pending, decisions))
+
+        relevant = sum(1 for r in results.values() if r["relevant"])
+        logger.info(f"✅ [Filter] Screening completato: {relevant}/{total} rilevanti.")
+        return results
@@ -0,0 +1,90 @@
+# src/agents/llm_agent.py
+
+import time
+import threading
+import logging
+from agents.utils import extract_text, count_tokens
+from agents.llm_cache import system_version
+from tools.metrics import METRICS
+from tools.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+def autogen_agent(name, system_message, llm_config):
+    """Fabbrica predefinita: un AssistantAgent di autogen (importato solo quando serve)."""
+    from autogen import AssistantAgent
+    return AssistantAgent(name=name, system_message=system_message, llm_config=llm_config)
+
+
+class ThreadLocalAgent:
+    """
+    Sostituto di AssistantAgent sicuro da usare da più thread.
+
+    Espone la stessa generate_reply(messages=...), ma ogni thread lavora sulla propria
+    istanza di AssistantAgent (creata alla prima chiamata), così gli agenti definiti
+    a livello di modulo possono essere condivisi dal pool di worker senza stato condiviso.
+
+    Con una LLMCache le risposte a temperatura 0 vengono riusate tra un'esecuzione e l'altra.
+    Ogni chiamata registra latenza, token e costo stimato nella fase `stage` del registro metriche.
+
+    agent_factory(name, system_message, llm_config) crea l'agente di ogni thread; si può
+    sostituire per istanza o per classe (es. con un LLM finto nei benchmark).
+    """
+
+    agent_factory = staticmethod(autogen_agent)
+
+    def __init__(self, name, system_message, llm_config, cache=None, version=None, stage=None,
+                 agent_factory=None):
+        self.name = name
+        self.stage = stage or name.lower()
+        self.system_message = system_message
+        self.llm_config = llm_config
+        self.cache = cache
+        self.version = version or system_version(system_message)
+        self._agent_factory = agent_factory
+        self._local = threading.local()
+
+    @property
+    def model(self):
+        return self.llm_config.get("model")
+
+    @property
+    def agent(self):
+        agent = getattr(self._local, "agent", None)
+        if agent is None:
+            factory = self._agent_factory or type(self).agent_factory
+            agent = factory(self.name, self.system_message, self.llm_config)
+            self._local.agent = agent
+        return agent
+
+    def _record(self, messages, reply, start):
+        prompt_tokens = count_tokens(
+            self.system_message + "".join(str(m.get("content", "")) for m in messages), self.model
+        )
+        METRICS.record_llm_call(
+            self.stage, self.model, time.perf_counter() - start,
+            prompt_tokens=prompt_tokens, completion_tokens=count_tokens(extract_text(reply), self.model),
+        )
+
+    @traced("llm call", cat="llm", sampled=True)
+    def generate_reply(self, messages):
+        start = time.perf_counter()
+        temperature = self.llm_config.get("temperature")
+        if self.cache is None or temperature != 0:
+            reply = self.agent.generate_reply(messages=messages)
+            self._record(messages, reply, start)
+            return reply
+
+        prompt = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        key = self.cache.make_key(self.model, temperature, self.version, prompt)
+        cached = self.cache.get(self.name, key)
+        if cached is not None:
+            METRICS.record_llm_call(self.stage, self.model, time.perf_counter() - start, cached=True)
+            return cached
+
+        reply = extract_text(self.agent.generate_reply(messages=messages))
+        if reply:
+            self.cache.set(key, reply)
+        self._record(messages, reply, start)
+        return reply
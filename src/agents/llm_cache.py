@@ -0,0 +1,79 @@
+# src/agents/llm_cache.py
+
+import re
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+import diskcache
+
+from tools.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def system_version(system_message):
+    """Versione implicita di un system message: cambia ogni volta che il testo cambia."""
+    return hashlib.sha256(system_message.encode("utf-8")).hexdigest()[:12]
+
+
+def normalize_prompt(text):
+    """Normalizza spazi e a capo, così differenze solo di formattazione colpiscono la stessa voce."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class LLMCache:
+    """
+    Cache persistente (diskcache) delle risposte LLM, indirizzata per contenuto.
+
+    La chiave copre modello, temperatura, versione del system message e hash del prompt
+    normalizzato: a temperatura 0 la stessa richiesta produce la stessa risposta, quindi
+    le ri-esecuzioni della stessa ricerca non pagano di nuovo le chiamate.
+
+    - size_limit: dimensione massima su disco (byte), oltre la quale si eliminano le voci più vecchie
+    - max_age_days: età massima di una risposta in cache (None = nessuna scadenza)
+    - stats(): hit/miss per agente dell'esecuzione corrente, dal registro di use_metrics
+      (la cache è condivisa tra sessioni ed esecuzioni, i contatori no)
+    """
+
+    def __init__(self, directory, size_limit=512 * 1024 ** 2, max_age_days=90):
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.cache = diskcache.Cache(
+            str(directory),
+            size_limit=size_limit,
+            eviction_policy="least-recently-stored",
+        )
+        self.expire = max_age_days * 86400 if max_age_days else None
+        self.cache.expire()
+
+    @staticmethod
+    def make_key(model, temperature, system_version, prompt):
+        payload = json.dumps(
+            [model, temperature, system_version, normalize_prompt(prompt)],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, agent_name, key):
+        value = self.cache.get(key)
+        METRICS.inc("response_cache_hits_total" if value is not None else "response_cache_misses_total", agent_name)
+        return value
+
+    def set(self, key, value):
+        self.cache.set(key, value, expire=self.expire)
+
+    @staticmethod
+    def stats():
+        """Contatori hit/miss e hit rate per agente nell'esecuzione corrente."""
+        hits, misses = METRICS.counters("response_cache_hits_total"), METRICS.counters("response_cache_misses_total")
+        stats = {}
+        for name in sorted(hits.keys() | misses.keys()):
+            c = {"hits": hits.get(name, 0), "misses": misses.get(name, 0)}
+            total = c["hits"] + c["misses"]
+            stats[name] = {**c, "hit_rate": round(c["hits"] / total, 3) if total else 0.0}
+        return stats
+
+    def clear(self):
+        self.cache.clear()
@@ -1,15 +1,17 @@
 # src/agents/miner.py
 
 import logging
-from autogen import AssistantAgent
+from agents.llm_agent import ThreadLocalAgent
 from agents.utils import extract_text
+from agents.concurrency import is_rate_limit_error
+from tools.metrics import timed
 
 logger = logging.getLogger("DataMiner")
 logger.setLevel(logging.INFO)
 
 class DataMiner:
-    def __init__(self, api_key=None):
-        self.agent = AssistantAgent(
+    def __init__(self, api_key=None, cache=None):
+        self.agent = ThreadLocalAgent(
             name="Miner",
             system_message=(
                 "Estrai i seguenti dati dall'abstract scientifico in formato JSON:\n"
@@ -24,11 +26,17 @@ class DataMiner:
                 "model": "gpt-3.5-turbo",
                 "api_key": api_key,
             },
+            cache=cache,
+            stage="mining",
         )
 
-    def extract_data(self, abstract):
+    @timed("mining", metric="item_seconds")
+    def extract_data(self, abstract, fulltext=None):
+        """fulltext: sezioni selezionate del testo completo (metodi, risultati, tabelle), se disponibili."""
         logger.info("⛏️ [Miner] Estrazione dati in corso...")
         query = f"ABSTRACT:\n{abstract}"
+        if fulltext:
+            query += f"\n\nSEZIONI DEL TESTO COMPLETO (preferiscile all'abstract per numeri ed effetti):\n{fulltext}"
         try:
             reply = self.agent.generate_reply(messages=[{"role": "user", "content": query}])
             content = extract_text(reply).strip()
@@ -36,5 +44,7 @@ class DataMiner:
             logger.info(f"✅ [Miner] Risposta ricevuta:\n{content[:200]}...")
             return content
         except Exception as e:
+            if is_rate_limit_error(e):
+                raise  # gestito con backoff da LLMPool
             logger.error(f"❌ [Miner] Errore durante l'estrazione: {str(e)}")
             return "{}"
@@ -0,0 +1,494 @@
+# src/agents/pipeline.py
+
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+from pathlib import Path
+
+from fpdf import FPDF
+
+from agents.utils import expand_autocomplete_terms, count_tokens
+from agents.planner import build_pubmed_query, build_europepmc_query
+from agents.evidence import parse_extracted, build_evidence_table, save_parquet
+from agents.filter import RelevanceFilter
+from agents.miner import DataMiner
+from agents.synthesizer import Synthesizer
+from agents.retriever_custom import Retriever
+from agents.concurrency import LLMPool
+from agents.llm_cache import LLMCache
+from agents.ranker import LexicalRanker
+from agents.dedup import merge_results
+from tools.europepmc_wrapper import EuropePMCWrapper
+from tools.article import Article
+from tools.article_store import ArticleStore
+from tools.local_index import LocalIndex
+from tools.query_registry import QueryRegistry
+from tools.fulltext import FullTextFetcher
+from tools.metrics import METRICS, ContextThreadPoolExecutor, MetricsRegistry, use_metrics
+from tools.tracing import TRACER
+
+logger = logging.getLogger("Pipeline")
+logger.setLevel(logging.INFO)
+
+# Parametri di una ricerca ("spec") con i valori predefiniti dell'interfaccia
+DEFAULT_SPEC = {
+    "goal": "",
+    "include_terms": "",
+    "exclude_terms": "",
+    "population": "",
+    "outcome": "",
+    "start_year": 2015,
+    "end_year": 2024,
+    "study_types": ["Randomized Controlled Trial"],
+    "use_mesh": True,
+    "broad_mode": False,
+    "prerank_top_k": 0,
+    "prerank_min_score": 0.0,
+    "living_review": False,
+    "federated": False,
+    "fulltext": False,
+    "local_search": False,
+}
+
+# Campi della spec da cui dipende ciascuna fase; ogni fase dipende anche da quelle precedenti
+STAGE_INPUTS = {
+    "plan": ("goal", "include_terms", "exclude_terms", "population", "outcome",
+             "start_year", "end_year", "study_types", "use_mesh", "broad_mode"),
+    "retrieve": ("living_review", "federated", "local_search"),
+    "prerank": ("prerank_top_k", "prerank_min_score"),
+    "screen": (),
+    "fulltext": ("fulltext",),
+    "mine": (),
+    "synthesize": (),
+}
+
+# Limiti chiamate LLM (filtro, miner): chiamate in volo e quote per minuto del provider
+LLM_MAX_WORKERS = 8
+LLM_REQUESTS_PER_MINUTE = 3500
+LLM_TOKENS_PER_MINUTE = 90000
+
+# Europe PMC (ricerca federata o ripiego): numero massimo di record scaricati per ricerca
+EUROPEPMC_MAX_RESULTS = 10000
+
+
+def normalize_spec(spec):
+    """Completa una spec con i valori predefiniti; i termini possono essere stringhe o liste."""
+    unknown = set(spec) - set(DEFAULT_SPEC) - {"id"}
+    if unknown:
+        logger.warning(f"⚠️ [Pipeline] Campi ignorati nella spec: {', '.join(sorted(unknown))}")
+    spec = {**DEFAULT_SPEC, **{k: v for k, v in spec.items() if k in DEFAULT_SPEC or k == "id"}}
+    for key in ("include_terms", "exclude_terms"):
+        if isinstance(spec[key], (list, tuple)):
+            spec[key] = ",".join(spec[key])
+    if not spec["goal"]:
+        raise ValueError("La spec deve contenere un obiettivo ('goal')")
+    return spec
+
+
+def spec_fingerprint(spec, keys=None):
+    """Impronta stabile di una spec (o di un suo sottoinsieme di campi)."""
+    keys = keys or sorted(DEFAULT_SPEC)
+    payload = json.dumps({k: spec.get(k) for k in keys}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def stage_fingerprints(spec):
+    """
+    Impronta di ogni fase: cambia solo se cambiano i campi della fase o di una precedente,
+    così si possono rieseguire solo le fasi toccate da una modifica.
+    """
+    fingerprints, keys = {}, []
+    for stage, inputs in STAGE_INPUTS.items():
+        keys.extend(inputs)
+        fingerprints[stage] = spec_fingerprint(spec, keys)
+    return fingerprints
+
+
+def slugify(text, max_length=60):
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_length].rstrip("-") or "ricerca"
+
+
+def _dump_articles(articles):
+    return [article.to_dict() for article in articles]
+
+
+def _load_articles(rows):
+    return [Article.coerce(row) for row in rows]
+
+
+def render_pdf(report, path):
+    with TRACER.span("pdf rendering"):
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        for line in report.splitlines():
+            pdf.multi_cell(0, 10, line)
+        pdf.output(str(path))
+
+
+class ResearchEngine:
+    """
+    Pipeline di ricerca indipendente dall'interfaccia: pianificazione della query,
+    recupero (PubMed, con ripiego su Europe PMC o ricerca federata su entrambi),
+    pre-ranking BM25, testo completo open access (opzionale), filtro AI,
+    estrazione dati, sintesi e salvataggio.
+
+    Ogni fase è un metodo con input e output espliciti, così l'app Streamlit può
+    mostrare i risultati intermedi e il runner a batch può eseguire run() senza UI.
+    """
+
+    def __init__(self, api_keys, data_dir, retriever_limiter=None, llm_request_bucket=None,
+                 llm_token_bucket=None, llm_max_workers=LLM_MAX_WORKERS):
+        openai_key = api_keys.get("openai_api_key")
+        data_dir = Path(data_dir)
+        cache_dir = data_dir / "cache"
+
+        self.article_store = ArticleStore(cache_dir / "articles.db", max_age_days=30)
+        self.local_index = LocalIndex(cache_dir / "local_index.db")
+        self.retriever = Retriever(api_key=api_keys.get("ncbi_api_key"), store=self.article_store,
+                                   async_mode=True, limiter=retriever_limiter)
+        self.europepmc = EuropePMCWrapper(max_results=EUROPEPMC_MAX_RESULTS)
+        self.fulltext_fetcher = FullTextFetcher(data_dir / "fulltext")
+        self.llm_cache = LLMCache(cache_dir / "llm", size_limit=512 * 1024 ** 2, max_age_days=90)
+        self.filter_agent = RelevanceFilter(api_key=openai_key, cache=self.llm_cache)
+        self.data_miner = DataMiner(api_key=openai_key, cache=self.llm_cache)
+        self.synthesizer = Synthesizer(api_key=openai_key, cache=self.llm_cache)
+        self.ranker = LexicalRanker()
+        self.query_registry = QueryRegistry(data_dir / "living_reviews.db")
+        self.llm_pool = LLMPool(
+            max_workers=llm_max_workers,
+            requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+            request_bucket=llm_request_bucket,
+            token_bucket=llm_token_bucket,
+        )
+
+    @classmethod
+    def from_project(cls, project_root, **kwargs):
+        """Motore con le chiavi di config/api_keys.json e i dati in data/."""
+        project_root = Path(project_root)
+        with open(project_root / "config" / "api_keys.json") as f:
+            api_keys = json.load(f)
+        return cls(api_keys, project_root / "data", **kwargs)
+
+    # === Fasi ===
+
+    def plan(self, spec):
+        """Espansione autocomplete dell'obiettivo e costruzione della query PubMed."""
+        with TRACER.span("planning"):
+            expanded = expand_autocomplete_terms(spec["goal"])
+            query = build_pubmed_query(
+                main_topic=expanded,
+                include_terms=spec["include_terms"].split(",") if spec["include_terms"] else None,
+                exclude_terms=spec["exclude_terms"].split(",") if spec["exclude_terms"] else None,
+                population=spec["population"],
+                outcome=spec["outcome"],
+                date_range=(spec["start_year"], spec["end_year"]),
+                study_types=spec["study_types"],
+                use_mesh=spec["use_mesh"],
+                strict_title_abstract=not spec["use_mesh"],  # forza la ricerca Title/Abstract se MeSH è off
+                broad_mode=spec["broad_mode"],
+            )
+        return {"expanded": expanded, "query": query}
+
+    def retrieve(self, spec, query):
+        """
+        Recupera gli articoli della query. In modalità living review cerca solo i record
+        inseriti dopo l'ultima esecuzione e toglie i PMID già visti.
+        Con spec["federated"] interroga in parallelo PubMed ed Europe PMC e unisce i
+        risultati eliminando i duplicati (PMID, DOI, titolo).
+        Con spec["local_search"] cerca solo nell'indice locale, senza rete (search_local).
+        Gli articoli recuperati vengono aggiunti all'indice locale.
+        In living review si aggiungono gli articoli rimasti in sospeso (esclusi dal pre-ranking)
+        nelle esecuzioni precedenti.
+        Restituisce raw_results, saved_run (o None), pending, store_stats, source, dedup e
+        run_id (identifica l'esecuzione nel registro delle living review).
+        """
+        run_id = uuid.uuid4().hex
+        if spec["local_search"]:
+            raw_results = self.search_local(query)
+            return {
+                "run_id": run_id,
+                "raw_results": raw_results,
+                "saved_run": None,
+                "pending": 0,
+                "store_stats": self.article_store.stats(),
+                "source": "local",
+                "dedup": None,
+            }
+
+        date_range = (spec["start_year"], spec["end_year"])
+        saved_run = self.query_registry.get(query) if spec["living_review"] else None
+        known_pmids = self.query_registry.known_pmids(query) if saved_run else set()
+        mindate = saved_run["last_run"] if saved_run else None
+
+        dedup = None
+        if spec["federated"]:
+            with ContextThreadPoolExecutor(max_workers=2) as executor, TRACER.span("federated retrieval"):
+                pubmed_future = executor.submit(self.retriever.search, query, date_range=date_range, mindate=mindate)
+                europepmc_future = executor.submit(self.search_europepmc, spec)
+                pubmed_results, europepmc_results = pubmed_future.result(), europepmc_future.result()
+            with TRACER.span("dedup", n=len(pubmed_results) + len(europepmc_results)):
+                raw_results, index = merge_results(pubmed_results, europepmc_results)
+            dedup = {"pubmed": len(pubmed_results), "europepmc": len(europepmc_results),
+                     "unique": len(raw_results), "duplicates": index.duplicates}
+            source = "federated"
+        else:
+            raw_results = self.retriever.search(query, date_range=date_range, mindate=mindate)
+            source = "pubmed"
+        pending = self.query_registry.pending(query) if saved_run else []
+        if pending:
+            new_pmids = {art.pmid for art in raw_results}
+            raw_results = [art for art in pending if art.pmid not in new_pmids] + raw_results
+        if known_pmids:
+            raw_results = [art for art in raw_results if art.pmid not in known_pmids]
+        store_stats = self.article_store.stats()
+
+        if not raw_results and not saved_run and not spec["federated"]:
+            logger.warning("⚠️ [Pipeline] Nessun risultato da PubMed, passo a EuropePMC...")
+            raw_results = self.search_europepmc(spec)
+            source = "europepmc"
+
+        with TRACER.span("local index", n=len(raw_results)):
+            self.local_index.add_many(raw_results)
+
+        return {
+            "run_id": run_id,
+            "raw_results": raw_results,
+            "saved_run": saved_run,
+            "pending": len(pending),
+            "store_stats": store_stats,
+            "source": source,
+            "dedup": dedup,
+        }
+
+    def search_europepmc(self, spec):
+        """
+        Ricerca Europe PMC con gli stessi vincoli della query PubMed (termini inclusi ed esclusi,
+        popolazione, esito, tipi di studio, anni), nel formato standard del Retriever.
+        """
+        query = build_europepmc_query(
+            main_topic=spec["goal"],
+            include_terms=spec["include_terms"].split(",") if spec["include_terms"] else None,
+            exclude_terms=spec["exclude_terms"].split(",") if spec["exclude_terms"] else None,
+            population=spec["population"],
+            outcome=spec["outcome"],
+            date_range=(spec["start_year"], spec["end_year"]),
+            study_types=spec["study_types"],
+            use_mesh=spec["use_mesh"],
+            broad_mode=spec["broad_mode"],
+        )
+        logger.info(f"🌍 [Pipeline] Query Europe PMC: {query}")
+        return self.europepmc.search(query)
+
+    def search_local(self, query, limit=None):
+        """
+        Ricerca nell'indice locale con la stessa query PubMed: nessuna richiesta di rete.
+        Al primo uso l'indice viene popolato con gli articoli già presenti nell'ArticleStore.
+        """
+        if not len(self.local_index) and len(self.article_store):
+            with TRACER.span("local index backfill"):
+                self.local_index.add_many(self.article_store.iter_articles())
+        with METRICS.timer("local search"), TRACER.span("local search"):
+            return self.local_index.search(query, limit=limit)
+
+    def prerank(self, spec, articles):
+        """Pre-ranking BM25 locale: solo i migliori articoli vanno al filtro AI."""
+        if not articles or not (spec["prerank_top_k"] or spec["prerank_min_score"]):
+            return articles
+        ranking_query = " ".join([spec["goal"], spec["include_terms"] or "", spec["outcome"] or ""])
+        with METRICS.timer("prerank"), TRACER.span("prerank", n=len(articles)):
+            ranked = self.ranker.rank(articles, ranking_query, top_k=spec["prerank_top_k"],
+                                      min_score=spec["prerank_min_score"])
+        return [art for art, _ in ranked]
+
+    def screen(self, spec, articles, on_progress=None):
+        """Filtro AI a batch: restituisce gli articoli rilevanti nel formato normalizzato."""
+        with TRACER.span("screening", n=len(articles)):
+            decisions = self.filter_agent.is_relevant_batch(
+                articles, spec["goal"], on_progress=on_progress, pool=self.llm_pool,
+            )
+
+        filtered = []
+        for idx, article in enumerate(articles):
+            decision = decisions.get(self.filter_agent.article_key(article, idx), {})
+            if decision.get("relevant"):
+                filtered.append({
+                    "pmid": article.pmid or "N/A",
+                    "title": article.title or "N/D",
+                    "abstract": article.abstract,
+                    "year": article.year,
+                    "journal": article.journal or "N/A",
+                    "authors": list(article.authors),
+                    "doi": article.doi,
+                    "pmcid": article.pmcid,
+                    "fulltext_urls": list(article.fulltext_urls),
+                    "confidence": decision.get("confidence"),
+                })
+        return filtered
+
+    def fetch_fulltext(self, spec, filtered):
+        """Testo completo open access (sezioni selezionate) per ogni articolo filtrato; [] se disattivato."""
+        if not spec["fulltext"] or not filtered:
+            return []
+        return self.fulltext_fetcher.fetch(filtered)
+
+    def mine(self, filtered, fulltexts=None, on_progress=None):
+        """Estrazione dati dagli abstract, e dal testo completo se disponibile (in parallelo sul pool LLM)."""
+        fulltexts = fulltexts or [None] * len(filtered)
+        with METRICS.timer("mining"), TRACER.span("mining", n=len(filtered)):
+            extractions = self.llm_pool.map(
+                lambda item: self.data_miner.extract_data(item[0]["abstract"], fulltext=item[1]),
+                list(zip(filtered, fulltexts)),
+                token_cost=lambda item: count_tokens(item[0]["abstract"] + (item[1] or "")) + 300,
+                on_progress=on_progress,
+                default="{}",
+            )
+        return [
+            {"pmid": art["pmid"], "year": art["year"], "extracted": extracted}
+            for art, extracted in zip(filtered, extractions)
+        ]
+
+    def merge_saved(self, spec, query, retrieved, screened, new_filtered, new_mined):
+        """
+        Living review: registra l'esecuzione e unisce i risultati salvati a quelli nuovi.
+        Sono "visti" solo gli articoli passati dal filtro AI (screened); gli altri recuperati
+        restano in sospeso per la prossima esecuzione.
+        Restituisce (filtered, mined_data) completi.
+
+        Si può richiamare sugli stessi risultati (fase ripetuta dall'app): gli articoli di questa
+        esecuzione già registrati non vengono ripresi dal registro e l'esecuzione, identificata
+        da retrieved["run_id"], viene contata una sola volta.
+        """
+        saved_run = retrieved["saved_run"]
+        stored_filtered, stored_mined = self.query_registry.results(query) if saved_run else ([], [])
+        current = {str(art.pmid) for art in screened if art.pmid} | {str(art["pmid"]) for art in new_filtered}
+        stored_filtered = [art for art in stored_filtered if str(art["pmid"]) not in current]
+        stored_mined = [item for item in stored_mined if str(item["pmid"]) not in current]
+        # la ricerca locale non aggiorna la living review: non è un'interrogazione completa di PubMed
+        if spec["living_review"] and retrieved["source"] != "local":
+            self.query_registry.record_run(query, [art.pmid for art in screened if art.pmid], new_filtered, new_mined,
+                                           pending=retrieved["raw_results"], run_id=retrieved.get("run_id"))
+        return stored_filtered + new_filtered, stored_mined + new_mined
+
+    def evidence(self, mined_data):
+        """Output del miner interpretato una sola volta -> tabella colonnare delle evidenze."""
+        for item in mined_data:
+            item["extracted"] = parse_extracted(item["extracted"])
+        with TRACER.span("evidence table", n=len(mined_data)):
+            return build_evidence_table(mined_data)
+
+    def synthesize(self, spec, evidence):
+        """Report finale dalla tabella delle evidenze (evidence())."""
+        with TRACER.span("synthesis", n=len(evidence)):
+            return self.synthesizer.generate_report(spec["goal"], evidence, pool=self.llm_pool)
+
+    def save(self, output_dir, filtered, mined_data, evidence, report, report_dir=None):
+        """Salva JSON, Parquet, metriche e report (md, pdf). Restituisce i percorsi scritti."""
+        output_dir = Path(output_dir)
+        report_dir = Path(report_dir or output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        report_dir.mkdir(parents=True, exist_ok=True)
+        paths = {
+            "filtered": output_dir / "filtered.json",
+            "mined": output_dir / "mined.json",
+            "parquet": output_dir / "mined.parquet",
+            "metrics": output_dir / "metrics.json",
+            "report_md": report_dir / "report.md",
+            "report_pdf": report_dir / "report.pdf",
+        }
+        with TRACER.span("save outputs"):
+            with open(paths["filtered"], "w", encoding="utf-8") as f:
+                json.dump(filtered, f, indent=2)
+            with open(paths["mined"], "w", encoding="utf-8") as f:
+                json.dump(mined_data, f, indent=2)
+            save_parquet(evidence, paths["parquet"])
+            METRICS.save(paths["metrics"], output_dir / "metrics.prom")
+            with open(paths["report_md"], "w", encoding="utf-8") as f:
+                f.write(report)
+        render_pdf(report, paths["report_pdf"])
+        return paths
+
+    # === Esecuzione completa ===
+
+    def run(self, spec, output_dir, on_stage=None, on_progress=None, checkpoints=None, on_checkpoint=None,
+            metrics=None):
+        """
+        Esegue l'intera pipeline per una spec e salva gli output in output_dir.
+
+        - on_stage(nome_fase, dettagli): invocato all'inizio di ogni fase eseguita
+        - on_progress(nome_fase, fatti, totale): avanzamento di filtro ed estrazione
+        - checkpoints: {fase: risultato} di un'esecuzione interrotta; quelle fasi non vengono rifatte
+        - on_checkpoint(nome_fase, risultato): invocato a fine fase con un risultato serializzabile in JSON
+        - metrics: MetricsRegistry in cui registrare l'esecuzione (di default uno nuovo), così
+          esecuzioni concorrenti sullo stesso motore non si mescolano né si azzerano a vicenda
+        """
+        with use_metrics(metrics or MetricsRegistry()):
+            return self._run(spec, output_dir, on_stage, on_progress, checkpoints, on_checkpoint)
+
+    def _run(self, spec, output_dir, on_stage, on_progress, checkpoints, on_checkpoint):
+        spec = normalize_spec(spec)
+        notify = on_stage or (lambda stage, info=None: None)
+        checkpoints = checkpoints or {}
+        start = time.perf_counter()
+
+        def stage(name, compute, info=None, dump=None, load=None):
+            # dump/load: conversione da/verso JSON per i risultati che contengono Article
+            if name in checkpoints:
+                logger.info(f"⏩ [Pipeline] Fase '{name}' ripresa dal checkpoint")
+                return load(checkpoints[name]) if load else checkpoints[name]
+            notify(name, info)
+            result = compute()
+            if on_checkpoint:
+                on_checkpoint(name, dump(result) if dump else result)
+            return result
+
+        def progress(name):
+            return (lambda done, total: on_progress(name, done, total)) if on_progress else None
+
+        def mine_and_merge():
+            new_mined = self.mine(new_filtered, fulltexts, on_progress=progress("mine"))
+            filtered, mined_data = self.merge_saved(spec, plan["query"], retrieved, articles, new_filtered, new_mined)
+            return {"filtered": filtered, "mined_data": mined_data}
+
+        plan = stage("plan", lambda: self.plan(spec))
+        retrieved = stage("retrieve", lambda: self.retrieve(spec, plan["query"]), {"query": plan["query"]},
+                          dump=lambda r: {**r, "raw_results": _dump_articles(r["raw_results"])},
+                          load=lambda r: {**r, "raw_results": _load_articles(r["raw_results"])})
+        articles = stage("prerank", lambda: self.prerank(spec, retrieved["raw_results"]),
+                         dump=_dump_articles, load=_load_articles)
+        new_filtered = stage("screen", lambda: self.screen(spec, articles, on_progress=progress("screen")),
+                             {"articles": len(articles)})
+        fulltexts = stage("fulltext", lambda: self.fetch_fulltext(spec, new_filtered), {"filtered": len(new_filtered)})
+        mined = stage("mine", mine_and_merge, {"filtered": len(new_filtered)})
+        filtered, mined_data = mined["filtered"], mined["mined_data"]
+        evidence = self.evidence(mined_data)
+        report = stage("synthesize", lambda: self.synthesize(spec, evidence), {"mined": len(mined_data)})
+        notify("save")
+        paths = self.save(output_dir, filtered, mined_data, evidence, report)
+
+        summary = {
+            "goal": spec["goal"],
+            "query": plan["query"],
+            "source": retrieved["source"],
+            "n_retrieved": len(retrieved["raw_results"]),
+            "n_screened": len(articles),
+            "n_relevant": len(filtered),
+            "n_mined": len(mined_data),
+            "elapsed_s": round(time.perf_counter() - start, 2),
+            "outputs": {name: str(path) for name, path in paths.items()},
+        }
+        with open(Path(output_dir) / "summary.json", "w", encoding="utf-8") as f:
+            json.dump({"spec": spec, **summary}, f, indent=2, ensure_ascii=False)
+        logger.info(f"🏁 [Pipeline] '{spec['goal']}': {summary['n_relevant']} rilevanti in {summary['elapsed_s']}s")
+        return summary
+
+
+def run_research(spec, output_dir, engine=None, project_root=None, on_stage=None):
+    """Scorciatoia: esegue una ricerca completa con un motore nuovo o esistente."""
+    engine = engine or ResearchEngine.from_project(project_root or Path.cwd())
+    return engine.run(spec, output_dir, on_stage=on_stage)
@@ -124,4 +124,61 @@ def build_pubmed_query(
                 logger.info(f"[Planner] Autocomplete exclude_term: '{term}' → '{term_exp}'")
             query_parts.append(f'NOT "{term_exp}"[Title/Abstract]')
 
-    return " AND ".join(query_parts)
\ No newline at end of file
+    return " AND ".join(query_parts)
+
+
+def build_europepmc_query(
+    main_topic,
+    include_terms=None,
+    exclude_terms=None,
+    population=None,
+    outcome=None,
+    date_range=None,
+    study_types=None,
+    use_mesh=True,
+    broad_mode=False
+):
+    """
+    Costruisce la query Europe PMC equivalente a build_pubmed_query, con la sintassi a campi
+    di Europe PMC: TITLE_ABS (titolo/abstract), MESH_HEADING, PUB_TYPE, PUB_YEAR.
+
+    - Se broad_mode=True: solo l'argomento principale e l'intervallo di anni
+    - Se use_mesh=True: popolazione ed esito si cercano anche tra i MeSH
+    """
+    main_topic_exp = expand_autocomplete_terms(main_topic).strip()
+    query_parts = [f"({main_topic_exp})"]
+
+    if not broad_mode:
+        # === INCLUDE TERMS ===
+        for term in include_terms or []:
+            if term.strip():
+                query_parts.append(f'TITLE_ABS:"{expand_autocomplete_terms(term.strip())}"')
+
+        # === POPULATION / OUTCOME ===
+        for value in (population, outcome):
+            if value:
+                value_exp = expand_autocomplete_terms(value)
+                if use_mesh:
+                    query_parts.append(f'(MESH_HEADING:"{value_exp}" OR TITLE_ABS:"{value_exp}")')
+                else:
+                    query_parts.append(f'TITLE_ABS:"{value_exp}"')
+
+        # === STUDY TYPES ===
+        if study_types:
+            type_clauses = [f'PUB_TYPE:"{expand_autocomplete_terms(stype)}"' for stype in study_types]
+            query_parts.append("(" + " OR ".join(type_clauses) + ")")
+
+    # === DATE RANGE ===
+    if date_range:
+        start, end = date_range
+        query_parts.append(f"PUB_YEAR:[{start} TO {end}]")
+
+    query = " AND ".join(query_parts)
+
+    # === EXCLUDE TERMS ===
+    if not broad_mode:
+        for term in exclude_terms or []:
+            if term.strip():
+                query += f' NOT TITLE_ABS:"{expand_autocomplete_terms(term.strip())}"'
+
+    return query
@@ -0,0 +1,140 @@
+# src/agents/ranker.py
+
+import re
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer
+
+logger = logging.getLogger("Ranker")
+logger.setLevel(logging.INFO)
+
+# Caratteri non ASCII che non fanno parte di una parola (trattini, virgolette tipografiche,
+# spazi speciali): diventano spazi, così nel corpus in byte ogni byte >= 128 è una lettera
+_NON_ASCII_PUNCTUATION = re.compile(r"[^\w\x00-\x7f]")
+# Byte ASCII che non fanno parte di una parola secondo il tokenizer di CountVectorizer (\w)
+# tradotti in spazi, maiuscole in minuscole: nel corpus restano solo spazi, lettere minuscole,
+# cifre, "_" e UTF-8 non ASCII
+_SEPARATOR_BYTES = bytes(
+    b if b >= 128 else ord(chr(b).lower()) if chr(b).isalnum() or chr(b) == "_" else ord(" ") for b in range(256)
+)
+
+
+class LexicalRanker:
+    """
+    Pre-ranking lessicale BM25, locale e senza chiamate LLM.
+
+    Costruisce in memoria una matrice sparsa documenti × termini della query
+    (titolo + abstract) e calcola i punteggi BM25 con operazioni vettoriali,
+    così anche decine di migliaia di abstract vengono ordinati in frazioni di secondo.
+    Si contano solo i termini della query, senza costruire il vocabolario completo.
+    Il titolo pesa il doppio dell'abstract; gli abstract mancanti non contribuiscono.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, title_weight=2):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+
+    def _document(self, article):
+        abstract = article.abstract if article.has_abstract else ""
+        return " ".join([article.title] * self.title_weight + [abstract])
+
+    def score(self, articles, query_text):
+        """
+        Restituisce un array numpy con il punteggio BM25 di ogni articolo rispetto alla query.
+
+        I punteggi coincidono con quelli di CountVectorizer(vocabulary=termini della query) sugli
+        stessi documenti, con la lunghezza del documento in parole \\w+; il conteggio però avviene
+        su un unico corpus di byte, per non costruire stringhe né matrici per documento:
+
+        1. codifica: i documenti ASCII (quasi tutti) restano come sono; negli altri il
+           testo va in minuscolo e la punteggiatura non ASCII diventa spazio. Dopo
+           translate(_SEPARATOR_BYTES) ogni byte è uno spazio (separatore) oppure parte di
+           una parola: lettere ASCII minuscole, cifre, "_" o byte UTF-8 >= 128 di una lettera
+        2. il corpus è b" " + doc_1 + b" " + doc_2 + ... + 16 spazi di margine (le letture
+           di 8 byte non escono mai dal buffer); doc_starts
+           sono gli offset dei documenti, e searchsorted(doc_starts, offset) dà il documento
+           di qualsiasi byte
+        3. inizio di parola = byte non spazio preceduto da uno spazio (word_starts); la
+           lunghezza di ogni documento è il numero di inizi tra due doc_starts
+        4. un termine compare a un inizio di parola se i byte da lì coincidono con
+           termine + b" " (lo spazio finale esclude le parole più lunghe, es. "insulina" per
+           "insulin"). windows legge gli 8 byte da ogni offset come un intero little-endian:
+           il confronto si fa 8 byte alla volta, con una maschera sull'ultimo blocco
+        5. le occorrenze, mappate a (documento, termine), formano la matrice sparsa tf
+        """
+        n_docs = len(articles)
+        if not n_docs:
+            return np.zeros(0)
+
+        analyzer = CountVectorizer(stop_words="english").build_analyzer()
+        query_terms = sorted(set(analyzer(query_text)))
+        if not query_terms:
+            logger.warning("⚠️ [Ranker] Nessun termine utile nella query: punteggi nulli.")
+            return np.zeros(n_docs)
+
+        # 1-3: corpus unico in byte e inizi di parola; nessun ciclo Python sulle singole occorrenze
+        docs = [self._document(art) for art in articles]
+        encoded = [(doc if doc.isascii() else _NON_ASCII_PUNCTUATION.sub(" ", doc.lower())).encode() for doc in docs]
+        doc_starts = np.cumsum([0] + [len(doc) + 1 for doc in encoded])[:-1] + 1
+        text = b" ".join([b"", *encoded, b" " * 16]).translate(_SEPARATOR_BYTES)
+        corpus = np.frombuffer(text, dtype=np.uint8)
+        # vista (non allineata) che legge 8 byte consecutivi da ogni offset come un solo intero
+        windows = np.ndarray(shape=(len(text) - 7,), dtype="<u8", buffer=text, strides=(1,))
+        in_word = corpus != 32
+        word_starts = np.flatnonzero(in_word[1:] & ~in_word[:-1]) + 1
+
+        # lunghezza dei documenti in parole; poi, con una tabella sul primo byte, restano in un
+        # solo passaggio le parole che iniziano come un termine della query
+        doc_len = np.diff(np.searchsorted(word_starts, np.append(doc_starts, len(text)))).astype(float)
+        needles = [term.encode() + b" " for term in query_terms]
+        wanted = np.zeros(256, dtype=bool)
+        wanted[[needle[0] for needle in needles]] = True
+        initials = corpus[word_starts]
+        candidates = wanted[initials]
+        word_starts, initials = word_starts[candidates], initials[candidates]
+
+        rows, cols = [], []
+        for idx, needle in enumerate(needles):
+            # il termine seguito dal separatore, confrontato 8 byte alla volta
+            pos = word_starts[initials == needle[0]]
+            for offset in range(0, len(needle), 8):
+                chunk = needle[offset:offset + 8]
+                mask = (1 << (8 * len(chunk))) - 1
+                pos = pos[(windows[pos + offset] & mask) == int.from_bytes(chunk, "little")]
+            rows.append(np.searchsorted(doc_starts, pos, side="right") - 1)
+            cols.append(np.full(len(pos), idx))
+
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        tf = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_docs, len(query_terms)))
+        tf.sum_duplicates()
+
+        df = np.bincount(tf.indices, minlength=len(query_terms))
+        idf = np.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+        avgdl = doc_len.mean() or 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+        rows = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        tf.data = tf.data * (self.k1 + 1) / (tf.data + norm[rows])
+
+        return tf @ idf
+
+    def rank(self, articles, query_text, top_k=None, min_score=None):
+        """
+        Ordina gli articoli per punteggio BM25 decrescente.
+
+        - top_k: tiene solo i primi K articoli (None o 0 = tutti)
+        - min_score: scarta gli articoli con punteggio inferiore alla soglia
+
+        Restituisce una lista di (articolo, punteggio).
+        """
+        scores = self.score(articles, query_text)
+        order = np.argsort(-scores, kind="stable")
+        if min_score is not None:
+            order = order[scores[order] >= min_score]
+        if top_k:
+            order = order[:top_k]
+
+        logger.info(f"📊 [Ranker] BM25: {len(order)}/{len(articles)} articoli selezionati per il filtro AI")
+        return [(articles[i], float(scores[i])) for i in order]
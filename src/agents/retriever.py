@@ -3,6 +3,8 @@
 from pymed import PubMed
 import time
 
+from tools.article import Article
+
 class Retriever:
     def __init__(self, email="you@example.com", tool="DrChiccoTool", rate_limit=3):
         self.pubmed = PubMed(tool=tool, email=email)
@@ -13,15 +15,17 @@ class Retriever:
         output = []
 
         for article in results:
-            data = {
-                "pmid": article.pubmed_id,
-                "title": article.title,
-                "abstract": article.abstract,
-                "keywords": article.keywords,
-                "publication_date": str(article.publication_date),
-                "authors": [a["lastname"] for a in article.authors if "lastname" in a],
-                "journal": article.journal
-            }
+            data = Article(
+                # pymed restituisce "pmid\naltri id" per alcuni record
+                pmid=(article.pubmed_id or "").split("\n")[0],
+                title=article.title,
+                abstract=article.abstract,
+                year=str(article.publication_date),
+                authors=[a["lastname"] for a in article.authors if a.get("lastname")],
+                journal=getattr(article, "journal", ""),
+                doi=getattr(article, "doi", None),
+                source="pubmed",
+            )
             output.append(data)
             time.sleep(1 / self.rate_limit)
 
@@ -1,131 +1,566 @@
 # src/agents/retriever_custom.py
 
+import io
+import asyncio
 import requests
-import time
+import aiohttp
 import logging
 import json
-import xml.etree.ElementTree as ET
+import math
+import time
+from datetime import date, timedelta
+from lxml import etree
+
+from tools.article import Article
+from tools.dates import date_from_xml, dp_ranges
+from tools.rate_limiter import TokenBucket
+from tools.metrics import METRICS, ContextThreadPoolExecutor, timed
+from tools.tracing import TRACER, traced
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# PubMed non restituisce PMID oltre retstart 9.999: le query più ampie vanno divise per data
+ESEARCH_LIMIT = 9999
+# I frammenti vengono pianificati un po' sotto il limite, la densità nel tempo non è uniforme
+SHARD_FILL = 0.8
+
+
+class HistorySessionExpired(Exception):
+    """La sessione WebEnv/query_key del History server NCBI è scaduta o non valida."""
+
+
 class Retriever:
-    def __init__(self, api_key=None, tool="DrChiccoTool", email="you@example.com", rate_limit=3):
+    fetch_batch = 100  # PMID per richiesta EFetch
+    esearch_batch = ESEARCH_LIMIT  # PMID per richiesta ESearch (massimo consentito 10.000)
+
+    def __init__(self, api_key=None, tool="DrChiccoTool", email="you@example.com", rate_limit=None, store=None,
+                 async_mode=False, concurrency=4, use_history=False,
+                 base_url="https://eutils.ncbi.nlm.nih.gov/entrez/eutils/", limiter=None):
         self.api_key = api_key
         self.tool = tool
         self.email = email
-        self.rate_limit = rate_limit
-        self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+        # NCBI: 3 req/s senza chiave, 10 req/s con api_key
+        self.rate_limit = rate_limit or (10 if api_key else 3)
+        # limiter esterno (es. SharedTokenBucket) per condividere il limite tra più processi
+        self.limiter = limiter or TokenBucket(self.rate_limit)
+        self.store = store  # ArticleStore opzionale: evita di riscaricare PMID già noti
+        self.async_mode = async_mode  # EFetch concorrente (aiohttp) con più batch in volo
+        self.concurrency = concurrency
+        self.use_history = use_history  # ESearch usehistory=y + EFetch da WebEnv/query_key
+        self.base_url = base_url
+        self.session = requests.Session()  # connessioni keep-alive riusate tra le richieste
 
-    def search(self, query, date_range=None):
-        logger.info("🔍 [Retriever] Avvio ricerca su PubMed...")
+    def _base_params(self):
+        params = {"db": "pubmed", "tool": self.tool, "email": self.email}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
 
-        esearch_url = self.base_url + "esearch.fcgi"
-        efetch_url = self.base_url + "efetch.fcgi"
+    def _esearch_request(self, params, label="esearch", **span_args):
+        """Una richiesta ESearch (JSON) sotto il rate limit; restituisce esearchresult."""
+        self.limiter.acquire()
+        start = time.perf_counter()
+        with TRACER.span(label, cat="http", **span_args):
+            response = self.session.get(self.base_url + "esearch.fcgi", params=params)
+        METRICS.record_http("esearch", time.perf_counter() - start, len(response.content), response.status_code)
+        response.raise_for_status()
+        result = response.json().get("esearchresult", {})
+        if "ERROR" in result:
+            raise RuntimeError(result["ERROR"])
+        return result
 
-        # if date_range:
-        #     start, end = date_range
-        #     query = f"{query} AND ({start}:{end}[dp])"
-        #     logger.info(f"📅 [Retriever] Filtro temporale attivo: {start}–{end}")
+    def _esearch_count(self, query, extra_params=None):
+        """Numero di risultati della query (rettype=count, nessun PMID trasferito); None se fallisce."""
+        params = {**self._base_params(), "term": query, "rettype": "count", "retmode": "json", **(extra_params or {})}
+        try:
+            return int(self._esearch_request(params, "esearch count").get("count", 0))
+        except Exception as e:
+            logger.error(f"❌ [Retriever] Errore durante ESearch (count): {e}")
+            return None
 
-        logger.info(f"📡 [Retriever] Query finale inviata: {query}")
+    def _esearch_ids(self, query, extra_params=None, count=None):
+        """
+        PMID di una query con al massimo ESEARCH_LIMIT risultati, a pagine da esearch_batch.
+        Con count noto si ferma all'ultima pagina utile, senza richieste vuote.
+        """
         all_pmids = []
         retstart = 0
-        batch_size = 500
+        limit = min(count, ESEARCH_LIMIT) if count is not None else ESEARCH_LIMIT
 
-        while True:
+        while retstart < limit:
             params = {
-                "db": "pubmed",
+                **self._base_params(),
                 "term": query,
                 "retstart": retstart,
-                "retmax": batch_size,
+                "retmax": min(self.esearch_batch, limit - retstart),
                 "retmode": "json",
-                "tool": self.tool,
-                "email": self.email
+                **(extra_params or {}),
             }
-            if self.api_key:
-                params["api_key"] = self.api_key
 
             try:
-                response = requests.get(esearch_url, params=params)
-                response.raise_for_status()
-                ids = response.json().get("esearchresult", {}).get("idlist", [])
+                result = self._esearch_request(params, retstart=retstart)
+                ids = result.get("idlist", [])
                 if not ids:
-                    logger.warning("⚠️ [Retriever] Nessun ID trovato. Dump della risposta:")
-                    logger.warning(json.dumps(response.json(), indent=2))
+                    if retstart == 0 and count is None:
+                        logger.warning("⚠️ [Retriever] Nessun ID trovato. Dump della risposta:")
+                        logger.warning(json.dumps(result, indent=2))
                     break
 
                 all_pmids.extend(ids)
                 logger.info(f"🔹 PMIDs {retstart}–{retstart + len(ids)}: {len(ids)} trovati")
-                retstart += batch_size
-                if len(ids) < batch_size:
-                    break
-                time.sleep(1 / self.rate_limit)
+                retstart += len(ids)
+                if count is None:
+                    limit = min(int(result.get("count", 0)), ESEARCH_LIMIT)
 
             except Exception as e:
                 logger.error(f"❌ [Retriever] Errore durante ESearch: {e}")
                 break
 
-        logger.info(f"✅ [Retriever] Totale PMIDs raccolti: {len(all_pmids)}")
+        return all_pmids
 
-        if not all_pmids:
-            logger.warning("⚠️ [Retriever] Nessun articolo trovato.")
-            return []
+    @staticmethod
+    def _shard_query(query, start, end):
+        return f'({query}) AND ("{start:%Y/%m/%d}"[dp] : "{end:%Y/%m/%d}"[dp])'
 
-        # === EFetch XML ===
-        output = []
-        fetch_batch = 100
-        total_batches = (len(all_pmids) + fetch_batch - 1) // fetch_batch
-        logger.info(f"📦 [Retriever] Scarico dettagli in {total_batches} batch da {fetch_batch}...")
-
-        for i in range(0, len(all_pmids), fetch_batch):
-            batch_ids = all_pmids[i:i + fetch_batch]
-            fetch_params = {
-                "db": "pubmed",
-                "id": ",".join(batch_ids),
-                "retmode": "xml",
-                "tool": self.tool,
-                "email": self.email
-            }
-            if self.api_key:
-                fetch_params["api_key"] = self.api_key
+    @staticmethod
+    def _initial_range(query, date_range=None):
+        """Intervallo di date da dividere: i filtri [dp] della query e date_range (anni), se presenti."""
+        start, end = date(1800, 1, 1), date(date.today().year + 1, 12, 31)
+        ranges = dp_ranges(query)
+        if date_range:
+            ranges.append((date(int(date_range[0]), 1, 1), date(int(date_range[1]), 12, 31)))
+        for range_start, range_end in ranges:
+            start, end = max(start, range_start), min(end, range_end)
+        return start, end
 
-            logger.info(f"🔄 [Retriever] Batch {i // fetch_batch + 1}/{total_batches} (PMID {i + 1}–{i + len(batch_ids)})")
+    def _plan_shards(self, query, extra_params, start, end, count):
+        """
+        Divide [start, end] in intervalli di data di pubblicazione con meno di ESEARCH_LIMIT
+        risultati ciascuno. Ogni livello di suddivisione conta i suoi intervalli in parallelo
+        (rettype=count); gli intervalli ancora troppo grandi vengono divisi di nuovo.
+        Restituisce [(inizio, fine, count)] dal più recente; un singolo giorno oltre il limite
+        resta troncato (con avviso).
+        """
+        shards = []
+        pending = [(start, end, count)]
+        with ContextThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while pending:
+                spans = []
+                for span_start, span_end, span_count in pending:
+                    days = (span_end - span_start).days + 1
+                    if span_count <= ESEARCH_LIMIT or days == 1:
+                        if span_count > ESEARCH_LIMIT:
+                            logger.warning(f"⚠️ [Retriever] {span_start}: {span_count} risultati in un solo giorno, "
+                                           f"recuperati solo i primi {ESEARCH_LIMIT}")
+                        if span_count:
+                            shards.append((span_start, span_end, span_count))
+                        continue
+                    parts = min(days, math.ceil(span_count / (ESEARCH_LIMIT * SHARD_FILL)))
+                    bounds = [span_start + timedelta(days=days * i // parts) for i in range(parts + 1)]
+                    spans.extend((bounds[i], bounds[i + 1] - timedelta(days=1)) for i in range(parts))
+                if not spans:
+                    break
+                counts = executor.map(
+                    lambda span: self._esearch_count(self._shard_query(query, *span), extra_params), spans,
+                )
+                pending = []
+                for (span_start, span_end), span_count in zip(spans, counts):
+                    if span_count is None:
+                        logger.error(f"❌ [Retriever] Intervallo {span_start}–{span_end} non conteggiato, saltato")
+                        continue
+                    pending.append((span_start, span_end, span_count))
+        return sorted(shards, reverse=True)
 
+    def _esearch(self, query, extra_params=None, date_range=None):
+        """
+        Lista completa dei PMID della query. Prima chiede il conteggio (rettype=count): fino a
+        ESEARCH_LIMIT risultati basta una pagina; oltre, la query viene divisa per data di
+        pubblicazione ([dp]) in frammenti sotto il limite, scaricati in parallelo (sempre sotto
+        il rate limit condiviso) e uniti senza duplicati.
+        """
+        count = self._esearch_count(query, extra_params)
+        if count is None or count <= ESEARCH_LIMIT:
+            return self._esearch_ids(query, extra_params, count)
+
+        start, end = self._initial_range(query, date_range)
+        with TRACER.span("esearch sharding", count=count):
+            shards = self._plan_shards(query, extra_params, start, end, count)
+        logger.info(f"🧩 [Retriever] {count} risultati oltre il limite di {ESEARCH_LIMIT}: "
+                    f"{len(shards)} intervalli di date ({start} – {end})")
+
+        with ContextThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = executor.map(
+                lambda shard: self._esearch_ids(self._shard_query(query, shard[0], shard[1]), extra_params, shard[2]),
+                shards,
+            )
+            all_pmids = list(dict.fromkeys(pmid for ids in results for pmid in ids))
+
+        if len(all_pmids) < count:
+            logger.warning(f"⚠️ [Retriever] Recuperati {len(all_pmids)} PMID su {count}: alcuni record "
+                           f"hanno una data di pubblicazione fuori da {start} – {end} o non frazionabile")
+        return all_pmids
+
+    def _parse_article(self, article):
+        """Converte un elemento <PubmedArticle> in un Article."""
+        pmid = article.findtext(".//PMID")
+        title = article.findtext(".//ArticleTitle") or ""
+        journal = article.findtext(".//Journal/Title") or ""
+        pub_year, pub_month = date_from_xml(article)
+        abstract_text = " ".join([abst.text for abst in article.findall(".//AbstractText") if abst.text])
+        if not abstract_text.strip():
+            logger.warning(f"⚠️ [Retriever] Articolo senza abstract. PMID: {pmid}")
+
+        authors = [
+            f"{a.findtext('LastName', '')} {a.findtext('Initials', '')}".strip()
+            for a in article.findall(".//Author") if a.find("LastName") is not None
+        ]
+        # Solo gli identificativi dell'articolo, non quelli della ReferenceList
+        doi = (article.findtext("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+               or article.findtext(".//ELocationID[@EIdType='doi']") or "")
+        pmcid = article.findtext("PubmedData/ArticleIdList/ArticleId[@IdType='pmc']") or ""
+
+        return Article(
+            pmid=pmid,
+            title=title,
+            abstract=abstract_text,
+            journal=journal,
+            authors=authors,
+            year=pub_year,
+            month=pub_month,
+            doi=doi,
+            pmcid=pmcid.strip(),
+            source="pubmed",
+        )
+
+    def _iter_parse(self, source):
+        """
+        Parsing incrementale di una risposta EFetch (file-like): produce un articolo
+        per volta e libera subito gli elementi già letti, così la memoria resta costante.
+        """
+        for _, article in etree.iterparse(source, events=("end",), tag="PubmedArticle"):
+            yield self._parse_article(article)
+            article.clear(keep_tail=True)
+            while article.getprevious() is not None:
+                del article.getparent()[0]
+
+    def _id_batches(self, pmids):
+        """Parametri EFetch per batch di PMID espliciti (id=...)."""
+        return [
+            {**self._base_params(), "id": ",".join(pmids[i:i + self.fetch_batch]), "retmode": "xml"}
+            for i in range(0, len(pmids), self.fetch_batch)
+        ]
+
+    def _history_batches(self, webenv, query_key, count):
+        """Parametri EFetch per finestre retstart/retmax sul risultato salvato nel History server."""
+        return [
+            {**self._base_params(), "WebEnv": webenv, "query_key": query_key,
+             "retstart": retstart, "retmax": self.fetch_batch, "retmode": "xml"}
+            for retstart in range(0, count, self.fetch_batch)
+        ]
+
+    def _esearch_history(self, query, extra_params=None):
+        """
+        ESearch con usehistory=y: una sola chiamata, il risultato resta sul server NCBI.
+        Restituisce (count, webenv, query_key) oppure None se la sessione non è disponibile.
+        """
+        params = {
+            **self._base_params(),
+            "term": query,
+            "usehistory": "y",
+            "retmax": 0,
+            "retmode": "json",
+            **(extra_params or {}),
+        }
+        try:
+            self.limiter.acquire()
+            start = time.perf_counter()
+            with TRACER.span("esearch (history)", cat="http"):
+                response = self.session.get(self.base_url + "esearch.fcgi", params=params)
+            METRICS.record_http("esearch", time.perf_counter() - start, len(response.content), response.status_code)
+            response.raise_for_status()
+            result = response.json().get("esearchresult", {})
+            count, webenv, query_key = int(result.get("count", 0)), result.get("webenv"), result.get("querykey")
+        except Exception as e:
+            logger.error(f"❌ [Retriever] Errore durante ESearch (history): {e}")
+            return None
+
+        if not webenv or not query_key:
+            logger.warning("⚠️ [Retriever] History server non disponibile per questa query.")
+            return None
+
+        logger.info(f"🗂️ [Retriever] History server: {count} risultati (WebEnv salvato, query_key={query_key})")
+        return count, webenv, query_key
+
+    def _fetch_batch_iter(self, params, history=False):
+        """Esegue una singola richiesta EFetch in streaming e ne produce gli articoli."""
+        with TRACER.span("rate limit wait", cat="http"):
+            self.limiter.acquire()
+        start = time.perf_counter()
+        count = 0
+        span = TRACER.span("efetch batch", cat="http", retstart=params.get("retstart"))
+        with span, self.session.get(self.base_url + "efetch.fcgi", params=params, stream=True) as fetch_response:
             try:
-                fetch_response = requests.get(efetch_url, params=fetch_params)
+                if history and fetch_response.status_code == 400:
+                    raise HistorySessionExpired("EFetch ha rifiutato WebEnv/query_key")
                 fetch_response.raise_for_status()
-                root = ET.fromstring(fetch_response.content)
-
-                for article in root.findall(".//PubmedArticle"):
-                    pmid = article.findtext(".//PMID")
-                    title = article.findtext(".//ArticleTitle") or ""
-                    journal = article.findtext(".//Journal/Title") or ""
-                    pubdate_elem = article.find(".//PubDate")
-                    pub_year = pubdate_elem.findtext("Year") if pubdate_elem is not None else ""
-                    abstract_text = " ".join([abst.text for abst in article.findall(".//AbstractText") if abst.text])
-                    if not abstract_text.strip():
-                        logger.warning(f"⚠️ [Retriever] Articolo senza abstract. PMID: {pmid}")
-
-                    authors = [
-                        f"{a.findtext('LastName', '')} {a.findtext('Initials', '')}".strip()
-                        for a in article.findall(".//Author") if a.find("LastName") is not None
-                    ]
-
-                    output.append({
-                        "pmid": pmid,
-                        "title": title,
-                        "abstract": abstract_text or "[abstract mancante]",
-                        "journal": journal,
-                        "authors": authors,
-                        "pubdate": pub_year,
-                        "source": "pubmed"
-                    })
-
-                time.sleep(1 / self.rate_limit)
+                fetch_response.raw.decode_content = True
+                for article in self._iter_parse(fetch_response.raw):
+                    count += 1
+                    yield article
+            finally:
+                # tempo e byte misurati a stream consumato (il parsing avviene durante il download)
+                METRICS.record_http("efetch", time.perf_counter() - start,
+                                    fetch_response.raw.tell(), fetch_response.status_code)
+
+        # NCBI risponde con <ERROR> (e nessun articolo) quando la sessione è scaduta
+        if history and count == 0:
+            raise HistorySessionExpired("Nessun record per la finestra richiesta")
 
+    def _efetch_iter(self, pmids):
+        """Scarica i record EFetch (XML) a batch da 100 PMID e li produce man mano che arrivano."""
+        batches = self._id_batches(pmids)
+        logger.info(f"📦 [Retriever] Scarico dettagli in {len(batches)} batch da {self.fetch_batch}...")
+
+        for idx, params in enumerate(batches):
+            first = idx * self.fetch_batch
+            logger.info(f"🔄 [Retriever] Batch {idx + 1}/{len(batches)} "
+                        f"(PMID {first + 1}–{min(first + self.fetch_batch, len(pmids))})")
+            try:
+                yield from self._fetch_batch_iter(params)
             except Exception as e:
-                logger.error(f"❌ [Retriever] Errore batch {i // fetch_batch + 1}: {e}")
+                logger.error(f"❌ [Retriever] Errore batch {idx + 1}: {e}")
+
+    def _efetch_history_iter(self, query, extra_params=None):
+        """
+        Scarica tutti i record della query direttamente dal History server (WebEnv/query_key).
+        Se la sessione scade, riprende dalla finestra corrente con il percorso classico per PMID.
+        """
+        session = self._esearch_history(query, extra_params)
+        if session is None:
+            yield from self._efetch_iter(self._esearch(query, extra_params))
+            return
+
+        count, webenv, query_key = session
+        batches = self._history_batches(webenv, query_key, count)
+        logger.info(f"📦 [Retriever] Scarico dal History server in {len(batches)} finestre da {self.fetch_batch}...")
+
+        for idx, params in enumerate(batches):
+            logger.info(f"🔄 [Retriever] Finestra {idx + 1}/{len(batches)} (retstart={params['retstart']})")
+            try:
+                yield from self._fetch_batch_iter(params, history=True)
+            except HistorySessionExpired as e:
+                logger.warning(f"⚠️ [Retriever] Sessione History scaduta ({e}): ripiego su ESearch + EFetch per PMID")
+                yield from self._efetch_iter(self._esearch(query, extra_params)[params["retstart"]:])
+                return
+            except Exception as e:
+                logger.error(f"❌ [Retriever] Errore finestra {idx + 1}: {e}")
+
+    def _efetch(self, pmids):
+        """Scarica e parsa tutti i record EFetch dei PMID indicati."""
+        return list(self._efetch_iter(pmids))
+
+    async def _efetch_async(self, batches, history=False, max_retries=3):
+        """
+        Esegue le richieste EFetch indicate tenendo fino a `concurrency` batch in volo.
+        Il token bucket mantiene il rate complessivo entro il limite NCBI.
+        Restituisce una lista di articoli per batch, nello stesso ordine dell'input;
+        in modalità history le finestre con sessione scaduta valgono None.
+        """
+        efetch_url = self.base_url + "efetch.fcgi"
+        results = [[] for _ in batches]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        logger.info(f"📦 [Retriever] Scarico dettagli in {len(batches)} batch da {self.fetch_batch} "
+                    f"({self.concurrency} in parallelo, {self.rate_limit} req/s)...")
+
+        async def fetch(session, idx, fetch_params):
+            fetch_params = {k: str(v) for k, v in fetch_params.items()}
+            with TRACER.async_span("efetch queued", cat="http", batch=idx + 1):
+                await semaphore.acquire()
+            try:
+                for attempt in range(1, max_retries + 1):
+                    try:
+                        with TRACER.async_span("rate limit wait", cat="http", batch=idx + 1):
+                            await self.limiter.acquire_async()
+                        start = time.perf_counter()
+                        with TRACER.async_span("efetch batch", cat="http", batch=idx + 1, attempt=attempt):
+                            async with session.get(efetch_url, params=fetch_params) as response:
+                                if response.status >= 400:
+                                    METRICS.record_http("efetch", time.perf_counter() - start, 0, response.status)
+                                if response.status == 429 and attempt < max_retries:
+                                    logger.warning(f"⏳ [Retriever] 429 sul batch {idx + 1}, nuovo tentativo...")
+                                    await asyncio.sleep(attempt)
+                                    continue
+                                if history and response.status == 400:
+                                    results[idx] = None
+                                    return
+                                response.raise_for_status()
+                                content = await response.read()
+                                METRICS.record_http("efetch", time.perf_counter() - start, len(content), response.status)
+                        with TRACER.async_span("parse batch", cat="parse", batch=idx + 1):
+                            articles = list(self._iter_parse(io.BytesIO(content)))
+                        results[idx] = None if history and not articles else articles
+                        logger.info(f"🔄 [Retriever] Batch {idx + 1}/{len(batches)} completato")
+                        return
+                    except Exception as e:
+                        if attempt == max_retries:
+                            logger.error(f"❌ [Retriever] Errore batch {idx + 1}: {e}")
+            finally:
+                semaphore.release()
+
+        timeout = aiohttp.ClientTimeout(total=120)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await asyncio.gather(*(fetch(session, idx, params) for idx, params in enumerate(batches)))
+
+        return results
+
+    def _fetch_by_ids(self, pmids):
+        if self.async_mode:
+            return [art for batch in asyncio.run(self._efetch_async(self._id_batches(pmids))) for art in batch]
+        return self._efetch(pmids)
+
+    def _fetch_history(self, query, extra_params=None):
+        """Recupero completo via History server, con fallback per PMID sulle finestre scadute."""
+        if not self.async_mode:
+            return list(self._efetch_history_iter(query, extra_params))
+
+        session = self._esearch_history(query, extra_params)
+        if session is None:
+            return self._fetch_by_ids(self._esearch(query, extra_params))
+
+        count, webenv, query_key = session
+        results = asyncio.run(self._efetch_async(self._history_batches(webenv, query_key, count), history=True))
+        expired = [idx for idx, batch in enumerate(results) if batch is None]
+        if expired:
+            logger.warning(f"⚠️ [Retriever] Sessione History scaduta su {len(expired)} finestre: "
+                           f"ripiego su ESearch + EFetch per PMID")
+            pmids = self._esearch(query, extra_params)
+            windows = {idx: pmids[idx * self.fetch_batch:(idx + 1) * self.fetch_batch] for idx in expired}
+            windows = {idx: ids for idx, ids in windows.items() if ids}
+            recovered = asyncio.run(self._efetch_async([self._id_batches(ids)[0] for ids in windows.values()]))
+            for idx, batch in zip(windows, recovered):
+                results[idx] = batch
+
+        return [art for batch in results if batch for art in batch]
+
+    def _stream_to_store(self, articles, store_batch):
+        """Produce gli articoli scrivendoli nell'archivio locale a blocchi."""
+        pending = []
+        count = 0
+        for article in articles:
+            count += 1
+            if self.store is not None:
+                pending.append(article)
+                if len(pending) >= store_batch:
+                    self.store.put_many(pending)
+                    pending = []
+            yield article
+
+        if pending:
+            self.store.put_many(pending)
+        logger.info(f"🏁 [Retriever] Articoli scaricati in streaming: {count}")
+
+    @staticmethod
+    def _entry_date_params(mindate=None, maxdate=None, datetype="edat"):
+        """
+        Parametri ESearch per limitare i risultati per data (default: data di inserimento in PubMed).
+        Le date sono nel formato YYYY/MM/DD (o YYYY, YYYY/MM); NCBI le richiede entrambe.
+        """
+        if not mindate and not maxdate:
+            return {}
+        return {
+            "datetype": datetype,
+            "mindate": mindate or "1800/01/01",
+            "maxdate": maxdate or date.today().strftime("%Y/%m/%d"),
+        }
+
+    def search_iter(self, query, date_range=None, store_batch=100, mindate=None, maxdate=None):
+        """
+        Variante a generatore di search(): produce gli articoli normalizzati man mano
+        che ogni batch EFetch viene parsato, senza accumulare l'intero risultato.
+        Gli articoli già presenti nell'archivio locale vengono prodotti per primi.
+        """
+        logger.info("🔍 [Retriever] Avvio ricerca su PubMed (streaming)...")
+        logger.info(f"📡 [Retriever] Query finale inviata: {query}")
+        extra_params = self._entry_date_params(mindate, maxdate)
+
+        if self.use_history:
+            yield from self._stream_to_store(self._efetch_history_iter(query, extra_params), store_batch)
+            return
+
+        all_pmids = self._esearch(query, extra_params, date_range)
+        logger.info(f"✅ [Retriever] Totale PMIDs raccolti: {len(all_pmids)}")
+
+        if not all_pmids:
+            logger.warning("⚠️ [Retriever] Nessun articolo trovato.")
+            return
+
+        to_fetch = all_pmids
+        if self.store is not None:
+            known = self.store.get_many(all_pmids)
+            to_fetch = [pmid for pmid in all_pmids if pmid not in known]
+            logger.info(f"💾 [Retriever] Archivio locale: {len(known)} hit, {len(to_fetch)} da scaricare")
+            for pmid in dict.fromkeys(all_pmids):
+                if pmid in known:
+                    yield known.pop(pmid)
+
+        yield from self._stream_to_store(self._efetch_iter(to_fetch), store_batch)
+
+    @timed("pubmed")
+    @traced("retriever.search", cat="retrieval")
+    def search(self, query, date_range=None, mindate=None, maxdate=None):
+        """
+        Cerca su PubMed e restituisce la lista di articoli normalizzati.
+        mindate/maxdate (YYYY/MM/DD) limitano la ricerca ai record inseriti in PubMed
+        in quell'intervallo, per gli aggiornamenti incrementali.
+        """
+        logger.info("🔍 [Retriever] Avvio ricerca su PubMed...")
+
+        # if date_range:
+        #     start, end = date_range
+        #     query = f"{query} AND ({start}:{end}[dp])"
+        #     logger.info(f"📅 [Retriever] Filtro temporale attivo: {start}–{end}")
+
+        logger.info(f"📡 [Retriever] Query finale inviata: {query}")
+        extra_params = self._entry_date_params(mindate, maxdate)
+        if extra_params:
+            logger.info(f"📅 [Retriever] Solo record inseriti tra {extra_params['mindate']} e {extra_params['maxdate']}")
+
+        # === History server: niente liste di PMID avanti e indietro ===
+        # (l'archivio locale non può filtrare le finestre WebEnv, ma viene comunque aggiornato)
+        if self.use_history:
+            output = self._fetch_history(query, extra_params)
+            if self.store is not None and output:
+                self.store.put_many(output)
+            logger.info(f"🏁 [Retriever] Articoli totali recuperati: {len(output)}")
+            return output
+
+        all_pmids = self._esearch(query, extra_params, date_range)
+
+        logger.info(f"✅ [Retriever] Totale PMIDs raccolti: {len(all_pmids)}")
+
+        if not all_pmids:
+            logger.warning("⚠️ [Retriever] Nessun articolo trovato.")
+            return []
+
+        # === Archivio locale: scarica solo i PMID mancanti o scaduti ===
+        known = {}
+        to_fetch = all_pmids
+        if self.store is not None:
+            known = self.store.get_many(all_pmids)
+            to_fetch = [pmid for pmid in all_pmids if pmid not in known]
+            logger.info(f"💾 [Retriever] Archivio locale: {len(known)} hit, {len(to_fetch)} da scaricare")
+
+        # === EFetch XML ===
+        fetched = self._fetch_by_ids(to_fetch) if to_fetch else []
+        if self.store is not None and fetched:
+            self.store.put_many(fetched)
+
+        if not known:
+            output = fetched
+        else:
+            by_pmid = {**known, **{art["pmid"]: art for art in fetched}}
+            output = [by_pmid[pmid] for pmid in dict.fromkeys(all_pmids) if pmid in by_pmid]
 
         logger.info(f"🏁 [Retriever] Articoli totali recuperati: {len(output)}")
         return output
@@ -2,18 +2,53 @@
 
 import json
 import logging
-from autogen import AssistantAgent
-from agents.utils import extract_text
+from agents.llm_agent import ThreadLocalAgent
+from agents.concurrency import LLMPool
+from agents.evidence import as_evidence_table
+from agents.utils import extract_text, count_tokens
+from tools.metrics import timed
 
 logger = logging.getLogger("Synthesizer")
 logger.setLevel(logging.INFO)
 
+# Chiavi brevi usate nel JSON compatto inviato al modello (colonne della tabella delle evidenze)
+COMPACT_KEYS = {
+    "pmid": "id",
+    "year": "y",
+    "numero_pazienti": "n",
+    "tipo_studio": "t",
+    "endpoint": "e",
+    "effetto": "fx",
+}
+LEGEND = "Legenda campi: id=PMID, y=anno, n=numero pazienti, t=tipo studio, e=endpoint, fx=effetto."
+
+
+def compact_records(evidence):
+    """
+    Righe della tabella delle evidenze (o di mined_data, convertito una volta) come dict con
+    chiavi brevi, senza campi vuoti: le risposte del miner non vengono rilette.
+    """
+    table = as_evidence_table(evidence).select(list(COMPACT_KEYS)).rename_columns(list(COMPACT_KEYS.values()))
+    return [{k: v for k, v in row.items() if v not in (None, "", [])} for row in table.to_pylist()]
+
+
+def compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
 class Synthesizer:
-    def __init__(self, api_key=None):
-        self.agent = AssistantAgent(
+    def __init__(self, api_key=None, cache=None):
+        llm_config = {
+            "temperature": 0,
+            "model": "gpt-3.5-turbo",
+            "api_key": api_key,
+        }
+        self.model = llm_config["model"]
+        self.agent = ThreadLocalAgent(
             name="Synth",
             system_message=(
-                "Riceverai un obiettivo di ricerca scientifica e una serie di dati JSON estratti dagli abstract.\n"
+                "Riceverai un obiettivo di ricerca scientifica e una serie di dati JSON estratti dagli abstract "
+                "oppure le sintesi parziali di gruppi di studi.\n"
                 "Scrivi un report tecnico e sintetico per ricercatori e professionisti. Includi:\n"
                 "- Introduzione all’obiettivo\n"
                 "- Metodologia (come sono stati scelti e analizzati gli studi)\n"
@@ -21,27 +56,107 @@ class Synthesizer:
                 "- Conclusioni con vantaggi/limiti\n"
                 "Stile chiaro, tecnico e ordinato. Niente invenzioni, solo ciò che emerge dai dati."
             ),
-            llm_config={
-                "temperature": 0,
-                "model": "gpt-3.5-turbo",
-                "api_key": api_key,
-            },
+            llm_config=llm_config,
+            cache=cache,
+            stage="synthesis",
         )
+        self.map_agent = ThreadLocalAgent(
+            name="SynthMap",
+            system_message=(
+                "Riceverai un obiettivo di ricerca e un gruppo di studi (dati JSON compatti) "
+                "oppure più sintesi parziali da unire.\n"
+                "Scrivi una sintesi parziale compatta e fattuale: numero di studi, pazienti totali, "
+                "tipi di studio, endpoint principali e direzione degli effetti, citando i PMID. "
+                "Niente introduzioni né conclusioni, niente invenzioni."
+            ),
+            llm_config=llm_config,
+            cache=cache,
+            stage="synthesis",
+        )
+
+    def _ask(self, agent, content):
+        reply = agent.generate_reply(messages=[{"role": "user", "content": content}])
+        return extract_text(reply).strip()
 
-    def generate_report(self, goal, mined_data):
+    def _group(self, chunks, budget):
+        """Raggruppa testi consecutivi in gruppi che stanno nel budget di token."""
+        groups, current, current_tokens = [], [], 0
+        for chunk in chunks:
+            tokens = count_tokens(chunk, self.model)
+            if current and current_tokens + tokens > budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(chunk)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _map_reduce(self, goal, records, chunk_tokens, token_budget, pool):
+        """
+        Map: sintesi parziali di gruppi di studi (in parallelo).
+        Reduce: unisce le sintesi parziali, a più livelli se non stanno nel budget.
+        """
+        groups = self._group(records, chunk_tokens)
+        logger.info(f"🗺️ [Synthesizer] Map su {len(groups)} gruppi di studi...")
+        partials = pool.map(
+            lambda group: self._ask(
+                self.map_agent,
+                f"OBIETTIVO: {goal}\n{LEGEND}\n\nSTUDI:\n[{','.join(group)}]",
+            ),
+            groups,
+            default="",
+        )
+        partials = [p for p in partials if p]
+
+        level = 1
+        while len(partials) > 1 and count_tokens("\n\n".join(partials), self.model) > token_budget:
+            groups = self._group(partials, chunk_tokens)
+            if len(groups) == len(partials):
+                break  # sintesi parziali già troppo lunghe singolarmente: non si può ridurre oltre
+            logger.info(f"🔁 [Synthesizer] Reduce livello {level}: {len(partials)} sintesi in {len(groups)} gruppi...")
+            partials = [p for p in pool.map(
+                lambda group: self._ask(
+                    self.map_agent,
+                    f"OBIETTIVO: {goal}\n\nSINTESI PARZIALI DA UNIRE:\n" + "\n\n---\n\n".join(group),
+                ),
+                groups,
+                default="",
+            ) if p]
+            level += 1
+
+        return partials
+
+    @timed("synthesis")
+    def generate_report(self, goal, evidence, token_budget=6000, chunk_tokens=3000, pool=None):
+        """
+        Genera il report finale dalla tabella delle evidenze (o da mined_data).
+
+        I dati vengono inviati in JSON compatto (chiavi brevi, senza indentazione). Se non
+        stanno nel budget di token del prompt si passa alla sintesi gerarchica map-reduce:
+        gruppi da chunk_tokens riassunti in parallelo (pool), poi uniti nel report.
+        """
         logger.info("📝 [Synthesizer] Generazione report iniziata...")
-        if not mined_data:
+        if not len(evidence):
             logger.warning("⚠️ [Synthesizer] Nessun dato da sintetizzare.")
             return "Nessun dato disponibile per il report."
 
-        input_text = (
-            f"OBIETTIVO: {goal}\n\n"
-            f"DATI:\n{json.dumps(mined_data, indent=2)}"
-        )
+        records = [compact_json(record) for record in compact_records(evidence)]
+        data_tokens = sum(count_tokens(r, self.model) for r in records)
 
         try:
-            reply = self.agent.generate_reply(messages=[{"role": "user", "content": input_text}])
-            report = extract_text(reply).strip()
+            if data_tokens <= token_budget:
+                input_text = f"OBIETTIVO: {goal}\n{LEGEND}\n\nDATI:\n[{','.join(records)}]"
+            else:
+                logger.info(f"📚 [Synthesizer] {len(records)} studi (~{data_tokens} token): sintesi map-reduce")
+                partials = self._map_reduce(goal, records, chunk_tokens, token_budget, pool or LLMPool())
+                input_text = (
+                    f"OBIETTIVO: {goal}\n\n"
+                    f"SINTESI PARZIALI ({len(records)} studi in {len(partials)} gruppi):\n"
+                    + "\n\n---\n\n".join(partials)
+                )
+
+            report = self._ask(self.agent, input_text)
             logger.info("✅ [Synthesizer] Report generato correttamente.")
             return report
         except Exception as e:
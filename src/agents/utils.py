@@ -1,8 +1,9 @@
 import re
 import json
 import logging
-from pathlib import Path
-from dateutil.parser import parse
+from functools import lru_cache
+from agents.autocomplete import DEFAULT_DICT_PATH, get_expander
+from tools.dates import publication_year
 
 logger = logging.getLogger(__name__)
 
@@ -13,10 +14,52 @@ def extract_text(reply):
     """
     return reply if isinstance(reply, str) else getattr(reply, "content", "")
 
+@lru_cache(maxsize=8)
+def _get_encoding(model):
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        logger.debug("tiktoken non disponibile: uso una stima di ~4 caratteri per token.")
+        return None
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Conta i token di un testo per il modello indicato.
+    Se tiktoken non è disponibile stima circa 4 caratteri per token.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def parse_json_reply(text):
+    """
+    Estrae il primo oggetto/array JSON da una risposta LLM
+    (anche se racchiuso in blocchi ```json ... ``` o preceduto da testo).
+    Restituisce None se non c'è JSON valido.
+    """
+    if not text:
+        return None
+    cleaned = re.sub(r"```(?:json)?", "", text).strip()
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        pass
+    for open_char, close_char in (("[", "]"), ("{", "}")):
+        start, end = cleaned.find(open_char), cleaned.rfind(close_char)
+        if start != -1 and end > start:
+            try:
+                return json.loads(cleaned[start:end + 1])
+            except ValueError:
+                continue
+    return None
+
 def filter_by_year_range(articles, year_range):
     """
     Filtra gli articoli in base a un range di anni, es. (1980, 2020).
-    Aggiorna anche art["year"] con l'anno estratto se valido.
+    Gli Article hanno già l'anno risolto; per i dict aggiorna anche art["year"] con
+    l'anno estratto (tools.dates, senza parsing fuzzy) se valido.
     """
     if not year_range:
         return articles
@@ -25,40 +68,31 @@ def filter_by_year_range(articles, year_range):
     filtered = []
 
     for art in articles:
-        pubdate = art.get("pubdate", "")
-        try:
-            dt = parse(pubdate, fuzzy=True)
-            year = dt.year
+        year = publication_year(art)
+        if not year:
+            continue  # data assente o non riconosciuta
+        if isinstance(art, dict):
             art["year"] = year  # Salva l'anno utile
-            if start_year <= year <= end_year:
-                filtered.append(art)
-        except Exception:
-            continue  # salta se non riesce a fare il parse
+        if start_year <= year <= end_year:
+            filtered.append(art)
 
     return filtered
 
-def expand_autocomplete_terms(text, log=False):
+def expand_autocomplete_terms(text, log=False, dict_path=DEFAULT_DICT_PATH):
     """
     Espande abbreviazioni usando un dizionario JSON.
     Restituisce la stringa espansa. Se log=True, logga i cambiamenti.
+    Il dizionario è caricato una sola volta (e ricaricato se il file cambia);
+    l'espansione è idempotente.
     """
-    dict_path = Path("data") / "autocomplete_dict.json"
-    if not dict_path.exists():
+    expander = get_expander(dict_path)
+    if expander is None:
         if log:
             logger.warning("⚠️ Nessun dizionario di autocomplete trovato.")
         return text
 
-    with open(dict_path, "r", encoding="utf-8") as f:
-        abbrev_map = json.load(f)
-
-    substitutions = 0
     original = text
-
-    for abbrev, full_term in abbrev_map.items():
-        pattern = r'\b' + re.escape(abbrev) + r'\b'
-        if re.search(pattern, text):
-            text = re.sub(pattern, f"{full_term} ({abbrev})", text)
-            substitutions += 1
+    text, substitutions = expander.expand(text)
 
     if log:
         logger.info(f"🔤 Autocomplete: {substitutions} abbreviazioni espanse.")
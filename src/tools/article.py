@@ -0,0 +1,170 @@
+# src/tools/article.py
+
+import sys
+
+from tools.dates import parse_date, parse_month
+
+MISSING_ABSTRACT = "[abstract mancante]"
+
+
+def _authors(value):
+    if not value:
+        return ()
+    if isinstance(value, str):  # authorString di Europe PMC: "Rossi M, Bianchi L."
+        return tuple(a.strip() for a in value.rstrip(".").split(",") if a.strip())
+    return tuple(value)
+
+
+class Article:
+    """
+    Record normalizzato di un articolo, creato una sola volta dagli adattatori delle
+    fonti (Retriever, PubMedClient, EuropePMCWrapper) al momento del parsing.
+
+    Anno e mese (int, 0 se ignoti; da una stringa di data come "2019 Nov-Dec" o
+    "2019-03-01" si ricavano entrambi), autori e identificativi sono già risolti: i consumatori
+    leggono gli attributi senza indovinare i nomi dei campi. Con __slots__ e tuple il
+    contenitore occupa ~220 byte contro ~650 di un dict con gli stessi campi (testi
+    esclusi); journal e source sono internati perché si ripetono su migliaia di record.
+
+    Per compatibilità con il codice che tratta gli articoli come dict supporta
+    article["title"], article.get("title") e "title" in article; to_dict()/from_dict()
+    e to_row()/from_row() (lista compatta, usata dall'ArticleStore) per la serializzazione.
+    """
+
+    FIELDS = ("pmid", "title", "abstract", "journal", "authors", "year",
+              "doi", "pmcid", "fulltext_urls", "source", "sources", "month")
+    __slots__ = FIELDS
+
+    # Nomi usati dalle diverse fonti (e dai vecchi dict) per gli stessi campi
+    ALIASES = {
+        "id": "pmid",
+        "abstractText": "abstract",
+        "journalTitle": "journal",
+        "authorString": "authors",
+        "pubdate": "year",
+        "pubYear": "year",
+        "publicationYear": "year",
+        "publication_date": "year",
+    }
+
+    def __init__(self, pmid="", title="", abstract="", journal="", authors=(), year=0,
+                 doi="", pmcid="", fulltext_urls=(), source="", sources=(), month=0):
+        self.pmid = str(pmid or "")
+        self.title = title or ""
+        self.abstract = abstract or MISSING_ABSTRACT
+        self.journal = sys.intern(journal or "")
+        self.authors = _authors(authors)
+        if isinstance(year, int):
+            self.year = year
+        else:
+            self.year, parsed_month = parse_date(year)
+            month = month or parsed_month
+        self.month = parse_month(month)
+        self.doi = (doi or "").strip().lower()
+        self.pmcid = pmcid or ""
+        self.fulltext_urls = tuple(fulltext_urls or ())
+        self.source = sys.intern(source or "")
+        self.sources = tuple(sources) if sources else ((self.source,) if self.source else ())
+
+    # === Accesso stile dict ===
+
+    def __getitem__(self, key):
+        field = self.ALIASES.get(key, key)
+        if field not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, field)
+
+    def get(self, key, default=None):
+        field = self.ALIASES.get(key, key)
+        if field not in self.FIELDS:
+            return default
+        return getattr(self, field)
+
+    def __contains__(self, key):
+        return self.ALIASES.get(key, key) in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def __eq__(self, other):
+        return isinstance(other, Article) and self.to_row() == other.to_row()
+
+    def __hash__(self):
+        # coerente con __eq__ (record uguali hanno lo stesso pmid e titolo): utilizzabile in set e dict
+        return hash(self.pmid or ("", self.title))
+
+    def __repr__(self):
+        return f"Article(pmid={self.pmid!r}, year={self.year}, title={self.title[:60]!r})"
+
+    @property
+    def has_abstract(self):
+        return bool(self.abstract.strip()) and self.abstract != MISSING_ABSTRACT
+
+    @property
+    def link(self):
+        return f"https://pubmed.ncbi.nlm.nih.gov/{self.pmid}/" if self.pmid else ""
+
+    # === Serializzazione ===
+
+    def to_dict(self):
+        return {
+            "pmid": self.pmid, "title": self.title, "abstract": self.abstract, "journal": self.journal,
+            "authors": list(self.authors), "year": self.year, "doi": self.doi, "pmcid": self.pmcid,
+            "fulltext_urls": list(self.fulltext_urls), "source": self.source, "sources": list(self.sources),
+            "month": self.month,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Da un dict (anche nei formati delle fonti o dei vecchi record: abstractText, pubYear, id...)."""
+        fields = {}
+        for key, value in data.items():
+            field = cls.ALIASES.get(key, key)
+            if field in cls.FIELDS and (value or field not in fields):
+                fields[field] = value
+        return cls(**fields)
+
+    def to_row(self):
+        """Lista compatta nell'ordine di FIELDS (month è in fondo: le righe salvate senza restano valide)."""
+        return [self.pmid, self.title, self.abstract, self.journal, list(self.authors), self.year,
+                self.doi, self.pmcid, list(self.fulltext_urls), self.source, list(self.sources), self.month]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    def coerce(cls, value):
+        """Article così com'è, oppure convertito da dict o riga."""
+        if isinstance(value, cls):
+            return value
+        return cls.from_row(value) if isinstance(value, list) else cls.from_dict(value)
+
+    def __reduce__(self):
+        # pickle (pool di processi, st.session_state) come riga compatta
+        return Article, tuple(self.to_row())
+
+    def copy(self, **changes):
+        """Copia del record con i campi indicati sostituiti (valori già normalizzati)."""
+        copied = object.__new__(Article)
+        for field in self.FIELDS:
+            setattr(copied, field, changes[field] if field in changes else getattr(self, field))
+        return copied
+
+    # === Fusione dei duplicati ===
+
+    def merged_with(self, other):
+        """Copia di questo record con i campi vuoti completati da other e le fonti unite."""
+        # i campi sono già normalizzati (e immutabili): si copiano senza ripassare da __init__
+        merged = object.__new__(Article)
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if not value:
+                value = getattr(other, field)
+            setattr(merged, field, value)
+        if not self.has_abstract and other.has_abstract:
+            merged.abstract = other.abstract
+        if not self.month and merged.year != other.year:
+            merged.month = 0  # il mese dell'altro record vale solo per lo stesso anno
+        merged.sources = self.sources + tuple(s for s in other.sources if s not in self.sources)
+        return merged
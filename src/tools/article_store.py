@@ -0,0 +1,137 @@
+# src/tools/article_store.py
+
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+
+from tools.article import Article
+from tools.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# SQLite accetta un numero limitato di parametri "?" per statement
+_LOOKUP_CHUNK = 900
+
+
+class ArticleStore:
+    """
+    Archivio locale su disco (SQLite) degli articoli già scaricati, indicizzato per PMID.
+
+    - get_many(pmids): lookup in blocco, restituisce {pmid: Article} solo per i record validi
+    - put_many(articles): salva/aggiorna i record parsati da EFetch (come riga JSON compatta,
+      Article.to_row(); i vecchi record salvati come dict restano leggibili)
+    - iter_articles(): scorre l'intero archivio (es. per popolare l'indice locale)
+    - max_age_days: i record più vecchi vengono considerati scaduti e riscaricati
+      (PubMed rivede periodicamente i record); None = non scadono mai
+    - stats(): hit/miss dell'esecuzione corrente; i contatori stanno nel registro delle
+      metriche (use_metrics), non nell'archivio condiviso tra sessioni ed esecuzioni
+    """
+
+    def __init__(self, db_path, max_age_days=30):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " pmid TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _is_fresh(self, fetched_at, now):
+        if self.max_age_days is None:
+            return True
+        return now - fetched_at <= self.max_age_days * 86400
+
+    def get_many(self, pmids):
+        """Restituisce {pmid: articolo} per i PMID presenti e non scaduti."""
+        pmids = list(dict.fromkeys(str(p) for p in pmids))
+        found = {}
+        now = time.time()
+        stale = 0
+
+        with self._lock:
+            for i in range(0, len(pmids), _LOOKUP_CHUNK):
+                chunk = pmids[i:i + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT pmid, data, fetched_at FROM articles WHERE pmid IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for pmid, data, fetched_at in rows:
+                    if self._is_fresh(fetched_at, now):
+                        found[pmid] = Article.coerce(json.loads(data))
+                    else:
+                        stale += 1
+
+        METRICS.inc("article_store_hits_total", "article_store", len(found))
+        METRICS.inc("article_store_misses_total", "article_store", len(pmids) - len(found))
+        METRICS.inc("article_store_stale_total", "article_store", stale)
+
+        logger.info(f"💾 [ArticleStore] Lookup {len(pmids)} PMID: {len(found)} hit, "
+                    f"{len(pmids) - len(found)} miss ({stale} scaduti)")
+        return found
+
+    def put_many(self, articles):
+        """Salva (o aggiorna) gli articoli parsati. Ignora i record senza PMID."""
+        now = time.time()
+        rows = [
+            (art.pmid, json.dumps(art.to_row(), ensure_ascii=False), now)
+            for art in map(Article.coerce, articles) if art.pmid
+        ]
+        if not rows:
+            return 0
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles (pmid, data, fetched_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+        logger.info(f"💾 [ArticleStore] Salvati {len(rows)} articoli")
+        return len(rows)
+
+    def iter_articles(self, batch_size=1000):
+        """Tutti gli articoli dell'archivio, anche quelli scaduti, a blocchi."""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT pmid, data FROM articles WHERE pmid > ? ORDER BY pmid LIMIT ?", (last, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for pmid, data in rows:
+                yield Article.coerce(json.loads(data))
+            last = rows[-1][0]
+
+    @staticmethod
+    def stats():
+        """Contatori hit/miss dell'esecuzione corrente (registro di use_metrics)."""
+        hits, misses, stale = (METRICS.counters(f"article_store_{name}_total").get("article_store", 0)
+                               for name in ("hits", "misses", "stale"))
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "stale": stale,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
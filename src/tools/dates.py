@@ -0,0 +1,136 @@
+# src/tools/dates.py
+
+import re
+import calendar
+from datetime import date
+from functools import lru_cache
+
+# Mesi (e stagioni, usate da MEDLINE per i fascicoli trimestrali) in inglese, come nei record PubMed/Europe PMC
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+    "spr": 3, "sum": 6, "fal": 9, "aut": 9, "win": 12,
+}
+
+_YEAR_ONLY = re.compile(r"^\d{4}$")
+# "2019-03-01", "2019/3", "2019-03-01T00:00:00Z" (Europe PMC firstPublicationDate, pymed)
+_ISO = re.compile(r"^(\d{4})[-/](\d{1,2})(?:[-/]\d{1,2})?\b")
+# "2019 Nov-Dec", "2019 Nov 12", "2019 Spring", "1998 Dec-1999 Jan" (PubDate/MedlineDate)
+_YEAR_MONTH = re.compile(r"^(\d{4})\s+([A-Za-z]{3})")
+# "12/2019", "03-2019"
+_MONTH_YEAR = re.compile(r"^(\d{1,2})[-/](\d{4})$")
+# Ripiego per le forme rimanenti ("Nov 2019", "Summer 2018", "c2019"): primo anno plausibile
+_ANY_YEAR = re.compile(r"(?<!\d)(1[89]\d{2}|2[01]\d{2})(?!\d)")
+_ANY_MONTH = re.compile(r"\b([A-Za-z]{3})[a-z]*\.?\b")
+# Intervalli di pubblicazione nella sintassi PubMed: 2015:2024[dp], "2015/01/01"[dp] : "2015/06/30"[dp]
+_PARTIAL_DATE = r'"?(\d{4})(?:/(\d{1,2})(?:/(\d{1,2}))?)?"?'
+_DP_RANGE = re.compile(_PARTIAL_DATE + r"(?:\[(?:dp|pdat)\])?\s*:\s*" + _PARTIAL_DATE + r"\[(?:dp|pdat)\]", re.I)
+
+
+def parse_month(value):
+    """Mese 1-12 da numero o nome ("11", "Nov", "November", "Spring"); 0 se non riconosciuto."""
+    if isinstance(value, int):
+        return value if 1 <= value <= 12 else 0
+    value = str(value or "").strip()
+    if value.isdigit():
+        month = int(value)
+        return month if 1 <= month <= 12 else 0
+    return MONTHS.get(value[:3].lower(), 0)
+
+
+@lru_cache(maxsize=16384)
+def _parse(text):
+    if _YEAR_ONLY.match(text):
+        return int(text), 0
+    match = _ISO.match(text) or _YEAR_MONTH.match(text)
+    if match:
+        return int(match.group(1)), parse_month(match.group(2))
+    match = _MONTH_YEAR.match(text)
+    if match:
+        return int(match.group(2)), parse_month(match.group(1))
+    match = _ANY_YEAR.search(text)
+    if not match:
+        return 0, 0
+    month = 0
+    for word in _ANY_MONTH.findall(text):
+        month = parse_month(word)
+        if month:
+            break
+    return int(match.group(1)), month
+
+
+def parse_date(value):
+    """
+    (anno, mese) da una data di pubblicazione nei formati di PubMed ed Europe PMC;
+    0 per le parti mancanti. Le stringhe ripetute (migliaia di "2019", "2020 Jan")
+    vengono risolte una volta sola.
+    """
+    if isinstance(value, int):
+        return value, 0
+    if not value:
+        return 0, 0
+    return _parse(str(value).strip())
+
+
+def parse_dates(values):
+    """Versione batch di parse_date: ogni stringa distinta viene analizzata una volta."""
+    resolved = {}
+    return [resolved[v] if v in resolved else resolved.setdefault(v, parse_date(v)) for v in values]
+
+
+def date_from_xml(article):
+    """
+    Miglior (anno, mese) di un <PubmedArticle> (lxml o ElementTree): PubDate (Year/Month
+    o MedlineDate), altrimenti ArticleDate, la data della pubblicazione elettronica.
+    Il mese mancante della PubDate viene preso dall'ArticleDate dello stesso anno.
+    """
+    year = month = 0
+    pubdate = article.find(".//JournalIssue/PubDate")
+    if pubdate is not None:
+        raw_year = pubdate.findtext("Year")
+        if raw_year:
+            year, month = parse_date(raw_year)[0], parse_month(pubdate.findtext("Month"))
+        else:
+            year, month = parse_date(pubdate.findtext("MedlineDate"))
+
+    if not year or not month:
+        article_date = article.find(".//ArticleDate")
+        if article_date is not None:
+            e_year = parse_date(article_date.findtext("Year"))[0]
+            if not year:
+                year, month = e_year, parse_month(article_date.findtext("Month"))
+            elif e_year == year:
+                month = parse_month(article_date.findtext("Month"))
+    return year, month
+
+
+def publication_year(article):
+    """Anno di un Article o di un dict nei formati delle fonti (year, pubYear, pubdate...)."""
+    if not isinstance(article, dict):
+        return article.year
+    for key in ("year", "pubYear", "publicationYear", "pubdate", "publication_date"):
+        value = article.get(key)
+        if value:
+            return value if isinstance(value, int) else _parse(str(value).strip())[0]
+    return 0
+
+
+def filter_years(articles, start_year, end_year):
+    """Articoli con anno compreso in [start_year, end_year]; quelli senza anno vengono scartati."""
+    return [article for article in articles if start_year <= publication_year(article) <= end_year]
+
+
+def _bound(year, month, day, end):
+    """Data completa da una data parziale: primo giorno del periodo, o l'ultimo se end=True."""
+    year = int(year)
+    if not month:
+        return date(year, 12, 31) if end else date(year, 1, 1)
+    month = min(max(int(month), 1), 12)
+    if not day:
+        return date(year, month, calendar.monthrange(year, month)[1]) if end else date(year, month, 1)
+    return date(year, month, min(max(int(day), 1), calendar.monthrange(year, month)[1]))
+
+
+def dp_ranges(query):
+    """Intervalli [dp] di una query PubMed come lista di (data iniziale, data finale)."""
+    return [(_bound(*m.groups()[:3], end=False), _bound(*m.groups()[3:], end=True)) for m in _DP_RANGE.finditer(query)]
@@ -1,32 +1,169 @@
 # src/tools/europepmc_wrapper.py
 
+import time
+import logging
+
 import requests
 
+from tools.article import Article
+from tools.dates import parse_date
+from tools.metrics import METRICS, ContextThreadPoolExecutor, timed
+from tools.tracing import TRACER, traced
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Risposte per cui ha senso ritentare (limite di richieste, errori temporanei del server)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
 class EuropePMCWrapper:
-    def __init__(self, page_size=20):
-        self.base_url = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
-        self.page_size = page_size
+    """
+    Client della REST API di Europe PMC.
+
+    - iter_search(query, max_results): scorre l'intero risultato con la paginazione a
+      cursore (cursorMark), scaricando la pagina successiva in un thread mentre si
+      consuma quella corrente; produce Article (to_article), o i record JSON con raw=True
+    - search(query, max_results): lo stesso risultato come lista
+    - result_type="core" restituisce i record completi (abstract, DOI, autori);
+      "lite" è più leggero ma senza abstract
+    - le richieste fallite per 429/5xx, errori di rete o di trasferimento o corpo non JSON
+      vengono ritentate con backoff esponenziale (rispettando Retry-After)
+    """
 
-    def search(self, query):
-        """Cerca articoli su Europe PMC e restituisce una lista di dict"""
+    def __init__(self, page_size=1000, max_results=None, result_type="core",
+                 base_url="https://www.ebi.ac.uk/europepmc/webservices/rest/search",
+                 max_retries=4, backoff=1.0, timeout=60):
+        self.base_url = base_url
+        self.page_size = min(page_size, 1000)  # massimo consentito dall'API
+        self.max_results = max_results
+        self.result_type = result_type
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _get_page(self, params):
+        """Una richiesta con retry/backoff; restituisce il JSON della pagina o None se fallisce."""
+        for attempt in range(1, self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                with TRACER.span("europepmc page", cat="http", attempt=attempt):
+                    response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+                METRICS.record_http("europepmc", time.perf_counter() - start, len(response.content),
+                                    response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except requests.JSONDecodeError as e:
+                # corpo non JSON (pagina HTML di errore di un proxy, risposta troncata): si ritenta
+                error, retry_after = f"risposta non valida ({e})", None
+            except requests.HTTPError as e:
+                # 4xx diversi da 429: la richiesta è sbagliata, ritentare non serve
+                logger.error(f"❌ [EuropePMC] Errore: {e}")
+                return None
+            except requests.RequestException as e:
+                # rete, timeout, corpo troncato o mal codificato, troppi redirect: si ritenta
+                METRICS.record_http("europepmc", time.perf_counter() - start)
+                error, retry_after = str(e), None
+
+            if attempt == self.max_retries:
+                logger.error(f"❌ [EuropePMC] Errore dopo {attempt} tentativi: {error}")
+                return None
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** (attempt - 1)
+            logger.warning(f"⏳ [EuropePMC] {error}, nuovo tentativo tra {delay:.1f}s ({attempt}/{self.max_retries})")
+            time.sleep(delay)
+        return None
+
+    def iter_search(self, query, max_results=None, raw=False):
+        """Generatore degli articoli di tutte le pagine (fino a max_results, None = nessun limite)."""
+        max_results = max_results if max_results is not None else self.max_results
         params = {
             "query": query,
             "format": "json",
-            "pageSize": self.page_size
+            "resultType": self.result_type,
+            "pageSize": self.page_size if max_results is None else min(self.page_size, max_results),
+            "cursorMark": "*",
         }
-        response = requests.get(self.base_url, params=params)
-        if response.status_code != 200:
-            print(f"[EuropePMC] Errore: {response.status_code}")
-            return []
+        returned = 0
+        with ContextThreadPoolExecutor(max_workers=1) as prefetcher:
+            pending = prefetcher.submit(self._get_page, dict(params))
+            while pending is not None:
+                data = pending.result()
+                pending = None
+                if not data:
+                    return
+                results = data.get("resultList", {}).get("result", [])
+                if returned == 0:
+                    logger.info(f"🌍 [EuropePMC] {data.get('hitCount', 0)} risultati per la query")
+
+                # Pagina successiva già in download mentre si consumano i record di questa
+                next_cursor = data.get("nextCursorMark")
+                remaining = None if max_results is None else max_results - returned - len(results)
+                if results and next_cursor and next_cursor != params["cursorMark"] and (remaining is None or remaining > 0):
+                    params["cursorMark"] = next_cursor
+                    if remaining is not None:
+                        params["pageSize"] = min(self.page_size, remaining)
+                    pending = prefetcher.submit(self._get_page, dict(params))
+
+                for result in results:
+                    if max_results is not None and returned >= max_results:
+                        return
+                    returned += 1
+                    yield result if raw else self.to_article(result)
+
+    @timed("europepmc")
+    @traced("europepmc.search", cat="retrieval")
+    def search(self, query, max_results=None, raw=False):
+        """Cerca articoli su Europe PMC e restituisce una lista di Article (di dict con raw=True)"""
+        return list(self.iter_search(query, max_results=max_results, raw=raw))
 
-        return response.json().get("resultList", {}).get("result", [])
+    @staticmethod
+    def to_article(result):
+        """Converte un record Europe PMC in un Article."""
+        authors = result.get("authorList", {}).get("author")
+        if authors:
+            authors = [a.get("fullName") or a.get("lastName", "") for a in authors]
+        else:
+            authors = result.get("authorString")
+        journal_info = result.get("journalInfo", {})
+        journal = result.get("journalTitle") or journal_info.get("journal", {}).get("title", "")
+        year = parse_date(result.get("pubYear") or journal_info.get("yearOfPublication"))[0]
+        # Mese del fascicolo; altrimenti quello della prima pubblicazione, se dello stesso anno
+        month = journal_info.get("monthOfPublication") or 0
+        if not month:
+            first_year, first_month = parse_date(result.get("firstPublicationDate"))
+            month = first_month if first_year == year else 0
+        return Article(
+            pmid=result.get("pmid"),
+            title=result.get("title"),
+            abstract=result.get("abstractText"),
+            journal=journal,
+            authors=authors,
+            year=year,
+            month=month,
+            doi=result.get("doi"),
+            pmcid=result.get("pmcid"),
+            fulltext_urls=EuropePMCWrapper.get_fulltext_links(result, open_access_only=True),
+            source="europepmc",
+        )
 
-    def get_fulltext_links(self, result):
-        """Estrae i link al full-text (se disponibili) da un record EuropePMC"""
+    @staticmethod
+    def get_fulltext_links(result, open_access_only=False):
+        """
+        Estrae i link al full-text (se disponibili) da un record EuropePMC.
+        open_access_only=True tiene solo i documenti liberi (OA/Free) in PDF o XML, scaricabili
+        senza abbonamento; le pagine HTML degli editori vengono escluse.
+        """
         links = []
         fulltext_data = result.get("fullTextUrlList", {}).get("fullTextUrl", [])
         for item in fulltext_data:
             url = item.get("url")
+            if open_access_only and (item.get("availabilityCode") not in ("OA", "F")
+                                     or item.get("documentStyle") not in ("pdf", "xml")):
+                continue
             if url:
                 links.append(url)
         return links
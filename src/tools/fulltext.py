@@ -0,0 +1,358 @@
+# src/tools/fulltext.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import requests
+
+from tools.metrics import METRICS, ContextThreadPoolExecutor
+from tools.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+EUROPEPMC_REST = "https://www.ebi.ac.uk/europepmc/webservices/rest"
+
+# Sezioni utili all'estrazione dati (numerosità, disegno, effetti) e sezioni da scartare
+RELEVANT_SECTIONS = re.compile(
+    r"method|patient|participant|population|subject|design|material|intervention|"
+    r"result|outcome|finding|statistic|table|conclusion", re.I)
+SKIP_SECTIONS = re.compile(
+    r"introduc|background|discussion|reference|bibliograph|acknowledg|funding|conflict|"
+    r"competing|supplement|author contrib|abbreviation|data availab", re.I)
+# Priorità quando il testo va troncato: prima i risultati, poi metodi e popolazione
+SECTION_PRIORITY = (re.compile(r"result|finding|outcome|table", re.I),
+                    re.compile(r"method|patient|participant|population|subject|design|material|intervention", re.I))
+
+# Titoli di sezione nei PDF: riga breve, eventualmente numerata ("2. Methods", "RESULTS")
+_PDF_HEADING = re.compile(
+    r"^\s*(?:\d+(?:\.\d+)*\.?\s+)?(abstract|introduction|background|methods?|materials and methods|"
+    r"patients and methods|study design|participants|results|discussion|conclusions?|references|"
+    r"acknowledge?ments|funding|statistical analysis)\s*:?\s*$", re.I | re.M)
+
+
+# === Estrazione (funzioni di modulo: vengono eseguite nei processi del pool) ===
+
+def _sections_from_pdf_text(text):
+    """Divide il testo di un PDF in sezioni usando le righe che sembrano titoli."""
+    matches = list(_PDF_HEADING.finditer(text))
+    if not matches:
+        return [["", text.strip()]]
+    sections = [["", text[:matches[0].start()].strip()]] if matches[0].start() else []
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        sections.append([match.group(1).strip().title(), text[match.end():end].strip()])
+    return sections
+
+
+def extract_pdf(path):
+    """Testo di un PDF diviso in sezioni: PyMuPDF, con ripiego su pdfplumber."""
+    try:
+        import pymupdf
+        with pymupdf.open(path) as doc:
+            text = "\n".join(page.get_text() for page in doc)
+    except Exception as e:
+        logger.warning(f"⚠️ [FullText] PyMuPDF non riesce a leggere {path}: {e}; provo pdfplumber")
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    return _sections_from_pdf_text(text)
+
+
+def extract_jats(path):
+    """Sezioni di primo livello di un articolo JATS (PMC/Europe PMC), con le tabelle."""
+    from lxml import etree
+
+    root = etree.parse(str(path), etree.XMLParser(recover=True, resolve_entities=False, no_network=True)).getroot()
+    sections = []
+    for sec in root.iterfind(".//body/sec"):
+        title = " ".join(sec.findtext("title", default="").split())
+        text = " ".join(" ".join(sec.itertext()).split())
+        if title and text.startswith(title):
+            text = text[len(title):].strip()
+        sections.append([title, text])
+    if not sections:
+        body = root.find(".//body")
+        if body is not None:
+            sections.append(["", " ".join(" ".join(body.itertext()).split())])
+    # Le tabelle fluttuanti (fuori da <sec>) spesso contengono numerosità ed effetti
+    for table in root.iterfind(".//floats-group/table-wrap"):
+        sections.append(["Table", " ".join(" ".join(table.itertext()).split())])
+    return sections
+
+
+def extract_document(path, kind):
+    """Estrae [[titolo, testo], ...] da un file del deposito; eseguita nel pool di processi."""
+    return extract_pdf(path) if kind == "pdf" else extract_jats(path)
+
+
+def select_sections(sections, max_chars=12000):
+    """
+    Solo le sezioni utili all'estrazione dati, in ordine di priorità (risultati, metodi,
+    altre pertinenti) e troncate a max_chars. Senza titoli riconoscibili si usa l'inizio
+    del testo.
+    """
+    chosen = [(t, x) for t, x in sections if t and x and RELEVANT_SECTIONS.search(t) and not SKIP_SECTIONS.search(t)]
+    if not chosen:
+        chosen = [(t, x) for t, x in sections if x and not (t and SKIP_SECTIONS.search(t))]
+
+    def priority(item):
+        for rank, pattern in enumerate(SECTION_PRIORITY):
+            if pattern.search(item[1][0]):
+                return rank, item[0]
+        return len(SECTION_PRIORITY), item[0]
+
+    parts, used = [], 0
+    for _, (title, text) in sorted(enumerate(chosen), key=priority):
+        if used >= max_chars:
+            break
+        chunk = f"## {title}\n{text}" if title else text
+        parts.append(chunk[:max_chars - used])
+        used += len(parts[-1])
+    return "\n\n".join(parts)
+
+
+# === Deposito ===
+
+class FullTextStore:
+    """
+    Deposito locale dei testi completi, indirizzato per contenuto.
+
+    - objects/ab/<sha256>.<pdf|xml>: un file per documento, identificato dall'hash del
+      contenuto (lo stesso PDF raggiunto da URL diversi viene salvato una volta sola)
+    - index.db: URL → hash (o errore, per non riprovare ogni volta gli URL non scaricabili)
+      e hash → sezioni estratte, così né il download né il parsing vengono ripetuti
+    """
+
+    def __init__(self, root, retry_failed_days=7):
+        self.root = Path(root)
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        self.retry_failed_days = retry_failed_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY, sha256 TEXT, kind TEXT, error TEXT, fetched_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS texts (
+                sha256 TEXT PRIMARY KEY, sections TEXT NOT NULL, extracted_at REAL NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+    def path(self, sha256, kind):
+        return self.root / "objects" / sha256[:2] / f"{sha256}.{kind}"
+
+    def lookup(self, url):
+        """(sha256, kind) se l'URL è già stato scaricato, ("", None) se è fallito di recente, None se è da scaricare."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256, kind, error, fetched_at FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        sha256, kind, error, fetched_at = row
+        if error:
+            return ("", None) if time.time() - fetched_at < self.retry_failed_days * 86400 else None
+        return (sha256, kind) if self.path(sha256, kind).exists() else None
+
+    def put(self, url, content, kind):
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.path(sha256, kind)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, NULL, ?)", (url, sha256, kind, time.time()))
+            self._conn.commit()
+        return sha256
+
+    def put_error(self, url, error):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO urls VALUES (?, NULL, NULL, ?, ?)", (url, error, time.time()))
+            self._conn.commit()
+
+    def get_sections(self, sha256):
+        with self._lock:
+            row = self._conn.execute("SELECT sections FROM texts WHERE sha256 = ?", (sha256,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_sections(self, sha256, sections):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO texts VALUES (?, ?, ?)",
+                               (sha256, json.dumps(sections, ensure_ascii=False), time.time()))
+            self._conn.commit()
+
+
+# === Pipeline ===
+
+class FullTextFetcher:
+    """
+    Fase "testo completo" per gli articoli rilevanti:
+    1. URL candidati: JATS di Europe PMC per gli articoli con PMCID, poi i PDF/XML open
+       access di fullTextUrlList (EuropePMCWrapper.get_fulltext_links)
+    2. download concorrente (thread) nel FullTextStore, saltando gli URL già noti
+    3. estrazione PDF/XML in un pool di processi, solo per i documenti mai analizzati
+    4. select_sections(): al DataMiner arrivano solo metodi, risultati e tabelle
+
+    fetch(articles) restituisce il testo selezionato di ogni articolo (None se non disponibile).
+    """
+
+    def __init__(self, store_dir, max_downloads=8, max_processes=None, max_chars=12000,
+                 europepmc_rest=EUROPEPMC_REST, timeout=60, max_bytes=50 * 1024 ** 2):
+        self.store = FullTextStore(store_dir)
+        self.max_downloads = max_downloads
+        self.max_processes = max_processes or min(4, os.cpu_count() or 1)
+        self.max_chars = max_chars
+        self.europepmc_rest = europepmc_rest.rstrip("/")
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.stats = {"downloaded": 0, "cached": 0, "extracted": 0, "failed": 0}
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def candidate_urls(self, article):
+        urls = []
+        if article.get("pmcid"):
+            urls.append(f"{self.europepmc_rest}/{article['pmcid']}/fullTextXML")
+        urls.extend(article.get("fulltext_urls") or [])
+        return urls
+
+    @staticmethod
+    def _kind(content, content_type):
+        if content[:5] == b"%PDF-":
+            return "pdf"
+        head = content[:512].lstrip().lower()
+        if "xml" in content_type and b"<html" not in head or head.startswith(b"<?xml") or b"<article" in head:
+            return "xml"
+        return None  # pagine HTML, login degli editori, ecc.
+
+    def _download(self, url):
+        start = time.perf_counter()
+        try:
+            with TRACER.span("fulltext download", cat="http", sampled=True):
+                response = self._session().get(url, timeout=self.timeout)
+            METRICS.record_http("fulltext", time.perf_counter() - start, len(response.content), response.status_code)
+            response.raise_for_status()
+            if len(response.content) > self.max_bytes:
+                raise ValueError(f"documento troppo grande ({len(response.content) // 1024 ** 2} MB)")
+            kind = self._kind(response.content, response.headers.get("Content-Type", ""))
+            if kind is None:
+                raise ValueError(f"formato non supportato ({response.headers.get('Content-Type')})")
+            return self.store.put(url, response.content, kind), kind
+        except Exception as e:
+            logger.warning(f"⚠️ [FullText] Download fallito {url}: {e}")
+            self.store.put_error(url, str(e))
+            return None
+
+    def download(self, articles):
+        """[(sha256, kind) o None] allineata ad articles: il primo URL scaricabile di ciascuno."""
+        documents, pending = [None] * len(articles), {}
+        for idx, article in enumerate(articles):
+            urls = self.candidate_urls(article)
+            for url in urls:
+                found = self.store.lookup(url)
+                if found is None:
+                    pending[idx] = [u for u in urls[urls.index(url):] if self.store.lookup(u) is None]
+                    break
+                if found[0]:
+                    documents[idx] = found
+                    self.stats["cached"] += 1
+                    break
+
+        def first_available(urls):
+            for url in urls:
+                result = self._download(url)
+                if result:
+                    return result
+            return None
+
+        if pending:
+            logger.info(f"📥 [FullText] Download di {len(pending)} testi completi "
+                        f"({self.stats['cached']} già nel deposito)...")
+            with ContextThreadPoolExecutor(max_workers=self.max_downloads) as executor:
+                futures = {executor.submit(first_available, urls): idx for idx, urls in pending.items()}
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result:
+                        documents[futures[future]] = result
+                        self.stats["downloaded"] += 1
+                    else:
+                        self.stats["failed"] += 1
+        return documents
+
+    def extract(self, documents):
+        """{sha256: sezioni} per i documenti, analizzando nel pool solo quelli nuovi."""
+        sections, todo = {}, {}
+        for sha256, kind in {doc for doc in documents if doc}:
+            cached = self.store.get_sections(sha256)
+            if cached is not None:
+                sections[sha256] = cached
+            else:
+                todo[sha256] = kind
+        if not todo:
+            return sections
+
+        logger.info(f"📄 [FullText] Estrazione del testo da {len(todo)} documenti...")
+        jobs = {sha256: (str(self.store.path(sha256, kind)), kind) for sha256, kind in todo.items()}
+        results = None
+        if len(jobs) > 1 and self.max_processes > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=min(self.max_processes, len(jobs))) as executor:
+                    futures = {executor.submit(extract_document, *job): sha256 for sha256, job in jobs.items()}
+                    results = [(futures[f], self._result_safe(f)) for f in as_completed(futures)]
+            except (OSError, AssertionError) as e:
+                # es. processi daemon che non possono avere figli: si estrae nel processo corrente
+                logger.warning(f"⚠️ [FullText] Pool di processi non disponibile ({e}), estrazione sequenziale")
+        if results is None:
+            results = [(sha256, self._extract_safe(*job)) for sha256, job in jobs.items()]
+
+        for sha256, extracted in results:
+            if extracted is None:
+                continue
+            self.store.put_sections(sha256, extracted)
+            sections[sha256] = extracted
+            self.stats["extracted"] += 1
+        return sections
+
+    @staticmethod
+    def _extract_safe(path, kind):
+        try:
+            return extract_document(path, kind)
+        except Exception as e:
+            logger.warning(f"⚠️ [FullText] Estrazione fallita {path}: {e}")
+            return None
+
+    @staticmethod
+    def _result_safe(future):
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(f"⚠️ [FullText] Estrazione fallita: {e}")
+            return None
+
+    def fetch(self, articles):
+        """Testo selezionato per ogni articolo (lista allineata ad articles, None senza testo completo)."""
+        self.stats = dict.fromkeys(self.stats, 0)
+        with METRICS.timer("fulltext"), TRACER.span("fulltext", n=len(articles)):
+            documents = self.download(articles)
+            sections = self.extract(documents)
+            texts = [select_sections(sections.get(doc[0]) or [], self.max_chars) or None if doc else None
+                     for doc in documents]
+        logger.info(f"✅ [FullText] Testo completo per {sum(1 for t in texts if t)}/{len(articles)} articoli "
+                    f"({self.stats['downloaded']} scaricati, {self.stats['cached']} dal deposito)")
+        return texts
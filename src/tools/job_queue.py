@@ -0,0 +1,219 @@
+# src/tools/job_queue.py
+
+import json
+import time
+import sqlite3
+import threading
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobQueue:
+    """
+    Coda locale di ricerche (SQLite) condivisa tra l'app e i processi worker.
+
+    - submit(spec): accoda una ricerca e restituisce l'id del job
+    - claim(worker): assegna in modo atomico il job in coda più vecchio a un worker
+    - progress()/heartbeat(): stato, fase e avanzamento, aggiornati dal worker
+    - save_checkpoint()/checkpoints(): risultato di ogni fase completata, per riprendere
+      un job interrotto senza rifare le fasi già eseguite
+    - requeue_stale(): rimette in coda i job "running" il cui worker non dà segni di vita
+      da più di stale_after secondi (worker terminato o riavviato), o li segna come
+      falliti se hanno già esaurito i max_attempts tentativi
+
+    Ogni thread usa una propria connessione, quindi l'oggetto si può condividere tra
+    thread; ogni processo crea il proprio JobQueue sullo stesso file.
+    """
+
+    def __init__(self, db_path, stale_after=300, max_attempts=3):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                job_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (job_id, stage)
+            );
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transazioni esplicite (BEGIN IMMEDIATE per il claim)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["spec"] = json.loads(job["spec"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # === Lato app ===
+
+    def submit(self, spec):
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO jobs (spec, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (json.dumps(spec, ensure_ascii=False), QUEUED, now, now),
+        )
+        logger.info(f"📥 [JobQueue] Job {cursor.lastrowid} accodato: {spec.get('goal')}")
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        return self._to_dict(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, job_ids=None, limit=50):
+        if job_ids is not None:
+            if not job_ids:
+                return []
+            marks = ",".join("?" * len(job_ids))
+            rows = self._conn().execute(f"SELECT * FROM jobs WHERE id IN ({marks}) ORDER BY id DESC",
+                                        list(job_ids)).fetchall()
+        else:
+            rows = self._conn().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def position(self, job_id):
+        """Numero di job in coda prima di questo (0 = il prossimo)."""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?", (QUEUED, job_id)
+        ).fetchone()[0]
+
+    def cancel(self, job_id):
+        """Annulla un job ancora in coda; restituisce True se è stato annullato."""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, updated_at = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), time.time(), job_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    # === Lato worker ===
+
+    def claim(self, worker):
+        """Assegna atomicamente il job in coda più vecchio al worker; None se la coda è vuota."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                "started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                (RUNNING, worker, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id):
+        self._conn().execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                             (time.time(), job_id, RUNNING))
+
+    def progress(self, job_id, stage=None, progress=None, message=None):
+        self._conn().execute(
+            "UPDATE jobs SET stage = COALESCE(?, stage), progress = COALESCE(?, progress), "
+            "message = COALESCE(?, message), updated_at = ? WHERE id = ?",
+            (stage, progress, message, time.time(), job_id),
+        )
+
+    def save_checkpoint(self, job_id, stage, data):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO checkpoints (job_id, stage, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, stage, json.dumps(data, ensure_ascii=False), time.time()),
+        )
+
+    def checkpoints(self, job_id):
+        """{fase: risultato} delle fasi già completate del job."""
+        rows = self._conn().execute("SELECT stage, data FROM checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["stage"]: json.loads(row["data"]) for row in rows}
+
+    def complete(self, job_id, result):
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, progress = 1, stage = 'done', result = ?, error = NULL, "
+            "updated_at = ?, finished_at = ? WHERE id = ?",
+            (DONE, json.dumps(result, ensure_ascii=False), now, now, job_id),
+        )
+        self._conn().execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    def fail(self, job_id, error):
+        """Errore del job: torna in coda (riprendendo dai checkpoint) finché restano tentativi."""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, error = ?, "
+            "updated_at = ?, finished_at = CASE WHEN attempts < ? THEN NULL ELSE ? END WHERE id = ?",
+            (self.max_attempts, QUEUED, FAILED, error, now, self.max_attempts, now, job_id),
+        )
+
+    def requeue_stale(self):
+        """
+        Rimette in coda i job abbandonati da un worker; quelli che hanno già esaurito i
+        max_attempts tentativi vengono segnati come falliti. Restituisce quanti job sono
+        stati rimessi in coda.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, error = 'worker interrotto: tentativi esauriti', "
+                "updated_at = ?, finished_at = ? WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (FAILED, now, now, RUNNING, now - self.stale_after, self.max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, message = 'ripreso dopo interruzione del worker' "
+                "WHERE status = ? AND updated_at < ?",
+                (QUEUED, RUNNING, now - self.stale_after),
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if failed:
+            logger.error(f"❌ [JobQueue] {failed} job interrotti senza tentativi rimasti: segnati come falliti")
+        if requeued:
+            logger.warning(f"♻️ [JobQueue] {requeued} job interrotti rimessi in coda")
+        return requeued
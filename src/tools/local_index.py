@@ -0,0 +1,323 @@
+# src/tools/local_index.py
+
+import re
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+
+from tools.article import Article
+from tools.dates import parse_date
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Campi PubMed cercati solo nel titolo
+TITLE_FIELDS = {"title", "ti"}
+# Campi cercati nel testo (titolo + abstract). I MeSH non sono indicizzati: il descrittore
+# viene cercato come frase nel testo, che è l'approssimazione locale più vicina.
+TEXT_FIELDS = {"", "title/abstract", "tiab", "all fields", "all", "text word", "tw",
+               "mesh terms", "mesh", "mh", "mesh major topic", "majr"}
+MESH_FIELDS = {"mesh terms", "mesh", "mh", "mesh major topic", "majr"}
+# Check tag MeSH assegnati dagli indicizzatori, quasi mai scritti nell'abstract: ignorati
+MESH_CHECK_TAGS = {"humans", "animals", "male", "female", "adult", "aged", "child", "adolescent", "middle aged"}
+# Campi della data di pubblicazione, tradotti in un filtro sull'anno
+DATE_FIELDS = {"dp", "pdat", "publication date"}
+
+_TOKEN = re.compile(r'\s*(?:(?P<paren>[()])|(?P<term>"[^"]*"|[^\s()"\[]+)(?:\s*\[(?P<field>[^\]]*)\])?)')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+def _tokenize(query):
+    tokens, pos = [], 0
+    query = query.strip()
+    while pos < len(query):
+        match = _TOKEN.match(query, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Query non interpretabile vicino a: {query[pos:pos + 20]!r}")
+        pos = match.end()
+        if match.group("paren"):
+            tokens.append(("paren", match.group("paren")))
+        elif match.group("term") in _OPERATORS and match.group("field") is None:
+            tokens.append(("op", match.group("term")))
+        else:
+            tokens.append(("term", match.group("term").strip('"'), (match.group("field") or "").strip().lower()))
+    return tokens
+
+
+def _parse(tokens):
+    """
+    Albero della query: PubMed valuta gli operatori da sinistra a destra senza precedenze;
+    termini affiancati senza operatore sono in AND.
+    """
+    pos = 0
+
+    def unit():
+        nonlocal pos
+        token = tokens[pos]
+        pos += 1
+        if token == ("paren", "("):
+            node = expression()
+            if pos < len(tokens) and tokens[pos] == ("paren", ")"):
+                pos += 1
+            return node
+        if token[0] == "op" and token[1] == "NOT":  # NOT iniziale: "tutto tranne"
+            return ("NOT", None, unit())
+        if token[0] != "term":
+            raise ValueError(f"Token inatteso: {token[1]!r}")
+        return ("TERM", token[1], token[2])
+
+    def expression():
+        nonlocal pos
+        node = unit()
+        while pos < len(tokens) and tokens[pos] != ("paren", ")"):
+            operator = "AND"
+            if tokens[pos][0] == "op":
+                operator = tokens[pos][1]
+                pos += 1
+                # "A AND NOT B" equivale ad "A NOT B"
+                if operator == "AND" and pos < len(tokens) and tokens[pos] == ("op", "NOT"):
+                    operator = "NOT"
+                    pos += 1
+            if pos >= len(tokens):
+                break
+            node = (operator, node, unit())
+        return node
+
+    if not tokens:
+        return None
+    return expression()
+
+
+def _phrase(text):
+    prefix = text.endswith("*")
+    text = text.rstrip("*").strip()
+    if not text:
+        return None
+    phrase = '"' + text.replace('"', '""') + '"'
+    return phrase + " *" if prefix else phrase
+
+
+def _year_range(text):
+    start, _, end = text.partition(":")
+    start_year = parse_date(start)[0]
+    end_year = parse_date(end)[0] if end else start_year
+    return (start_year or 0, end_year or 9999)
+
+
+def translate_query(query):
+    """
+    Traduce una query nella sintassi di build_pubmed_query in un'espressione FTS5.
+
+    Restituisce {"match", "exclude", "year_range", "ignored"}:
+    - match: espressione MATCH (None = nessun vincolo sul testo)
+    - exclude: espressione da escludere quando la query è solo negativa ("NOT x")
+    - year_range: (inizio, fine) dai filtri [dp], oppure None
+    - ignored: clausole non valutabili in locale (es. [Publication Type]), tolte dalla query
+    """
+    year_range = None
+    ignored = []
+
+    def fold(positive, negatives):
+        if not negatives or positive is None:
+            return positive
+        return f"{positive} NOT ({' OR '.join(negatives)})"
+
+    def emit(node):
+        """(espressione positiva o None, lista di espressioni escluse)."""
+        nonlocal year_range
+        kind = node[0]
+        if kind == "TERM":
+            _, text, field = node
+            if field in DATE_FIELDS:
+                start, end = _year_range(text)
+                if year_range:
+                    start, end = max(start, year_range[0]), min(end, year_range[1])
+                year_range = (start, end)
+                return None, []
+            if field in MESH_FIELDS and text.lower() in MESH_CHECK_TAGS:
+                ignored.append(f'"{text}"[{field}]')
+                return None, []
+            if field in TITLE_FIELDS:
+                phrase = _phrase(text)
+                return (f"title : {phrase}" if phrase else None), []
+            if field in TEXT_FIELDS:
+                return _phrase(text), []
+            ignored.append(f'"{text}"[{field}]')
+            return None, []
+
+        _, left, right = node
+        if kind == "NOT":
+            positive, negatives = emit(left) if left is not None else (None, [])
+            excluded = fold(*emit(right))
+            return positive, negatives + ([excluded] if excluded else [])
+        (left_pos, left_neg), (right_pos, right_neg) = emit(left), emit(right)
+        if kind == "AND":
+            parts = [p for p in (left_pos, right_pos) if p]
+            return (f"({' AND '.join(parts)})" if len(parts) > 1 else (parts[0] if parts else None)), left_neg + right_neg
+        # OR: se un ramo non ha vincoli sul testo anche l'unione non ne ha
+        left_expr, right_expr = fold(left_pos, left_neg), fold(right_pos, right_neg)
+        if left_expr is None or right_expr is None:
+            return None, []
+        return f"({left_expr} OR {right_expr})", []
+
+    tree = _parse(_tokenize(query))
+    positive, negatives = emit(tree) if tree else (None, [])
+    return {
+        "match": fold(positive, negatives),
+        "exclude": " OR ".join(negatives) if positive is None and negatives else None,
+        "year_range": year_range,
+        "ignored": ignored,
+    }
+
+
+class LocalIndex:
+    """
+    Indice full-text locale (SQLite FTS5, ranking bm25) di tutti gli articoli recuperati.
+
+    - add_many(articles): inserisce/aggiorna gli Article restituiti dai retriever (chiave
+      PMID, o DOI per i record senza PMID); un abstract già indicizzato non viene
+      sostituito da un record che ne è privo
+    - search(query, limit, year_range): accetta la sintassi di build_pubmed_query
+      (translate_query) e restituisce gli Article ordinati per bm25, titolo con peso doppio
+    - il tokenizer porter/unicode61 rende la ricerca insensibile a maiuscole, accenti
+      e flessioni ("trials" trova "trial")
+    """
+
+    def __init__(self, db_path, title_weight=2.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.title_weight = title_weight
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                abstract TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                indexed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_year ON docs (year);
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+                title, abstract, content='docs', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            );
+            -- L'indice FTS (external content) segue la tabella docs
+            CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+                INSERT INTO docs_fts (rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+                INSERT INTO docs_fts (docs_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN
+                INSERT INTO docs_fts (docs_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+                INSERT INTO docs_fts (rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+            END;
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _key(article):
+        if article.pmid:
+            return article.pmid
+        return f"doi:{article.doi}" if article.doi else None
+
+    @staticmethod
+    def _row(article, now):
+        # titolo e abstract stanno nelle loro colonne, non anche nel JSON
+        data = {k: v for k, v in article.to_dict().items() if k not in ("title", "abstract")}
+        abstract = article.abstract if article.has_abstract else ""
+        return (LocalIndex._key(article), article.title, abstract, article.year,
+                json.dumps(data, ensure_ascii=False), now)
+
+    def add_many(self, articles, batch_size=1000):
+        """Indicizza (o aggiorna) gli articoli; restituisce quanti ne sono stati scritti."""
+        now = time.time()
+        written = 0
+        batch = []
+        for article in map(Article.coerce, articles):
+            if self._key(article):
+                batch.append(self._row(article, now))
+            if len(batch) >= batch_size:
+                written += self._write(batch)
+                batch = []
+        if batch:
+            written += self._write(batch)
+        if written:
+            logger.info(f"🗂️ [LocalIndex] Indicizzati {written} articoli")
+        return written
+
+    def _write(self, rows):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO docs (key, title, abstract, year, data, indexed_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET title = excluded.title, "
+                " abstract = CASE WHEN excluded.abstract != '' THEN excluded.abstract ELSE docs.abstract END, "
+                " year = CASE WHEN excluded.year != 0 THEN excluded.year ELSE docs.year END, "
+                " data = excluded.data, indexed_at = excluded.indexed_at",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def search(self, query, limit=None, year_range=None):
+        """
+        Articoli dell'indice che soddisfano la query (sintassi PubMed), i più pertinenti per primi.
+        year_range, se indicato, prevale sui filtri [dp] della query.
+        """
+        start = time.perf_counter()
+        try:
+            local = translate_query(query)
+        except ValueError as e:
+            logger.error(f"❌ [LocalIndex] {e}")
+            return []
+        if local["ignored"]:
+            logger.info(f"🗂️ [LocalIndex] Clausole non valutabili in locale, ignorate: {', '.join(local['ignored'])}")
+        year_range = year_range or local["year_range"]
+
+        where, params = [], []
+        if local["match"]:
+            where.append("docs_fts MATCH ?")
+            params.append(local["match"])
+        if local["exclude"]:
+            where.append("d.id NOT IN (SELECT rowid FROM docs_fts WHERE docs_fts MATCH ?)")
+            params.append(local["exclude"])
+        if year_range:
+            where.append("d.year BETWEEN ? AND ?")
+            params.extend(year_range)
+        sql = "SELECT d.title, d.abstract, d.data FROM docs d"
+        if local["match"]:
+            sql += " JOIN docs_fts ON docs_fts.rowid = d.id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY bm25(docs_fts, {float(self.title_weight)}, 1.0)" if local["match"] else " ORDER BY d.year DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.error(f"❌ [LocalIndex] Query FTS non valida ({local['match']}): {e}")
+            return []
+        results = [Article.from_dict({**json.loads(data), "title": title, "abstract": abstract})
+                   for title, abstract, data in rows]
+        logger.info(f"🗂️ [LocalIndex] {len(results)} articoli in {(time.perf_counter() - start) * 1000:.1f} ms "
+                    f"(MATCH {local['match']})")
+        return results
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,259 @@
+# src/tools/metrics.py
+
+import json
+import time
+import bisect
+import threading
+import functools
+import contextvars
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Bucket (secondi) degli istogrammi di latenza
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Prezzi indicativi USD per 1k token (prompt, completion)
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+}
+
+
+class _Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Stima del quantile dai bucket (limite superiore del bucket che lo contiene)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return LATENCY_BUCKETS[idx] if idx < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Registro delle metriche per fase della pipeline (esearch, efetch, europepmc,
+    screening, mining, synthesis, ...): istogrammi dei tempi, richieste HTTP, byte
+    trasferiti, token di prompt/completion e costo stimato.
+
+    Esportabile come riepilogo JSON per esecuzione o in formato testo Prometheus.
+    """
+
+    def __init__(self, namespace="drchicco"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self.started_at = time.time()
+
+    # === Primitive ===
+
+    def observe(self, metric, stage, seconds):
+        with self._lock:
+            hist = self._histograms.get((metric, stage))
+            if hist is None:
+                hist = self._histograms[(metric, stage)] = _Histogram()
+            hist.observe(seconds)
+
+    def inc(self, metric, stage, value=1):
+        with self._lock:
+            self._counters[(metric, stage)] = self._counters.get((metric, stage), 0) + value
+
+    def counters(self, metric):
+        """{fase: valore} di un contatore."""
+        with self._lock:
+            return {stage: value for (m, stage), value in self._counters.items() if m == metric}
+
+    @contextmanager
+    def timer(self, stage, metric="stage_seconds"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, stage, time.perf_counter() - start)
+
+    # === Registrazioni di alto livello ===
+
+    def record_http(self, stage, seconds, nbytes=0, status=None):
+        self.observe("http_request_seconds", stage, seconds)
+        self.inc("http_requests_total", stage)
+        self.inc("http_bytes_total", stage, nbytes)
+        if status is not None and status >= 400:
+            self.inc("http_errors_total", stage)
+
+    def record_llm_call(self, stage, model, seconds, prompt_tokens=0, completion_tokens=0, cached=False):
+        self.observe("llm_call_seconds", stage, seconds)
+        self.inc("llm_calls_total", stage)
+        if cached:
+            self.inc("llm_cache_hits_total", stage)
+            return
+        self.inc("prompt_tokens_total", stage, prompt_tokens)
+        self.inc("completion_tokens_total", stage, completion_tokens)
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        cost = prompt_tokens / 1000 * prompt_price + completion_tokens / 1000 * completion_price
+        self.inc("cost_usd_total", stage, cost)
+
+    # === Export ===
+
+    def summary(self):
+        """Riepilogo per fase: tempi (count, sum, p50, p95, max) e contatori."""
+        with self._lock:
+            stages = {}
+            for (metric, stage), hist in self._histograms.items():
+                stages.setdefault(stage, {})[metric] = {
+                    "count": hist.count,
+                    "sum": round(hist.sum, 4),
+                    "p50": hist.quantile(0.5),
+                    "p95": hist.quantile(0.95),
+                    "max": round(hist.max, 4),
+                }
+            for (metric, stage), value in self._counters.items():
+                stages.setdefault(stage, {})[metric] = round(value, 6) if isinstance(value, float) else value
+            return {"started_at": self.started_at, "elapsed_seconds": round(time.time() - self.started_at, 3),
+                    "stages": stages}
+
+    def table(self):
+        """
+        Una riga per fase con le colonne principali, comoda da mostrare in Streamlit; le voci
+        con soli contatori non mostrati (es. hit delle cache) vengono omesse.
+        """
+        rows = []
+        for stage, data in sorted(self.summary()["stages"].items()):
+            wall = data.get("stage_seconds") or data.get("http_request_seconds") or data.get("llm_call_seconds") or {}
+            item = data.get("item_seconds") or data.get("llm_call_seconds") or data.get("http_request_seconds") or {}
+            rows.append({
+                "fase": stage,
+                "tempo (s)": wall.get("sum", 0),
+                "p50 (s)": item.get("p50", 0),
+                "p95 (s)": item.get("p95", 0),
+                "richieste HTTP": data.get("http_requests_total", 0),
+                "KB": round(data.get("http_bytes_total", 0) / 1024, 1),
+                "chiamate LLM": data.get("llm_calls_total", 0),
+                "token prompt": data.get("prompt_tokens_total", 0),
+                "token output": data.get("completion_tokens_total", 0),
+                "costo ($)": round(data.get("cost_usd_total", 0), 4),
+            })
+            if not any(value for key, value in rows[-1].items() if key != "fase"):
+                rows.pop()
+        return rows
+
+    def to_prometheus(self):
+        """Metriche in formato testo Prometheus (exposition format 0.0.4)."""
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            for metric in sorted({m for m, _ in self._histograms}):
+                name = f"{ns}_{metric}"
+                lines.append(f"# TYPE {name} histogram")
+                for (m, stage), hist in sorted(self._histograms.items()):
+                    if m != metric:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(LATENCY_BUCKETS, hist.counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+            for metric in sorted({m for m, _ in self._counters}):
+                name = f"{ns}_{metric}"
+                lines.append(f"# TYPE {name} counter")
+                for (m, stage), value in sorted(self._counters.items()):
+                    if m == metric:
+                        lines.append(f'{name}{{stage="{stage}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def save(self, json_path=None, prometheus_path=None):
+        if json_path:
+            Path(json_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(self.summary(), f, indent=2)
+        if prometheus_path:
+            Path(prometheus_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(prometheus_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+
+# Registro dell'esecuzione corrente (use_metrics); fuori da un'esecuzione quello di processo
+_PROCESS_METRICS = MetricsRegistry()
+_CURRENT_METRICS = contextvars.ContextVar("metrics_registry")
+
+
+def current_metrics():
+    return _CURRENT_METRICS.get(_PROCESS_METRICS)
+
+
+@contextmanager
+def use_metrics(registry):
+    """
+    Registra le metriche del blocco (e dei thread avviati con ContextThreadPoolExecutor)
+    in registry: ogni esecuzione ha il suo registro e non azzera quello delle altre.
+    """
+    token = _CURRENT_METRICS.set(registry)
+    try:
+        yield registry
+    finally:
+        _CURRENT_METRICS.reset(token)
+
+
+class _CurrentMetrics:
+    """Rinvia ogni chiamata al registro dell'esecuzione corrente."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(current_metrics(), name)
+
+
+# Punto di accesso usato da tutti i moduli: METRICS.timer(...), METRICS.record_http(...)
+METRICS = _CurrentMetrics()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor i cui task vedono il contesto del thread che li ha inviati: metriche
+    e tracer dell'esecuzione corrente (use_metrics/use_tracer) valgono anche nel pool.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def timed(stage, metric="stage_seconds"):
+    """
+    Decoratore: misura il tempo della funzione nella fase indicata del registro corrente.
+    Con metric="item_seconds" si misura la latenza per singolo articolo invece che per fase.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(stage, metric):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,10 +1,14 @@
 # src/tools/pubmed_api.py
 import requests
 import time
+import json
 import logging
 import xml.etree.ElementTree as ET
 import re
 
+from tools.article import Article
+from tools.dates import date_from_xml
+
 # Configura logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -67,18 +71,26 @@ class PubMedClient:
             
             title = article.findtext(".//ArticleTitle", default="N/D")
             abstract_element = article.find(".//AbstractText")
-            abstract = abstract_element.text if abstract_element is not None else "N/D"
-            
-            pmid = article.findtext(".//PMID", default="N/D")
-            return {
-                "pmid": pmid,
-                "title": title,
-                "abstract": abstract,
-                "link": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-            }
+            abstract = abstract_element.text if abstract_element is not None else None
+            authors = [
+                f"{a.findtext('LastName', '')} {a.findtext('Initials', '')}".strip()
+                for a in article.findall(".//AuthorList/Author") if a.findtext("LastName")
+            ]
+            year, month = date_from_xml(article)
+            return Article(
+                pmid=article.findtext(".//PMID", default="N/D"),
+                title=title,
+                abstract=abstract,
+                journal=article.findtext(".//Journal/Title", default=""),
+                authors=authors,
+                year=year,
+                month=month,
+                doi=article.findtext(".//PubmedData/ArticleIdList/ArticleId[@IdType='doi']", default=""),
+                source="pubmed",
+            )
         except Exception as e:
             logger.warning(f"Errore nel parsing XML: {str(e)}")
-            return {"pmid": "N/D", "title": "N/D", "abstract": "N/D", "link": "N/D"}
+            return Article(pmid="N/D", title="N/D", source="pubmed")
 
     def search(self, query, max_results=5):
         """Cerca articoli su PubMed usando E-Utilities direttamente"""
@@ -107,6 +119,7 @@ class PubMedClient:
         """Salva risultati in CSV e JSON"""
         try:
             import pandas as pd
+            results = [{**art.to_dict(), "link": art.link} for art in map(Article.coerce, results)]
             df = pd.DataFrame(results)
             
             # Assicurati che le colonne essenziali siano presenti
@@ -0,0 +1,177 @@
+# src/tools/query_registry.py
+
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+from datetime import date
+from pathlib import Path
+
+from tools.article import Article
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def canonical_query(query):
+    """Forma canonica di una query PubMed: spazi normalizzati e minuscole."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class QueryRegistry:
+    """
+    Registro delle query salvate per le "living review" (SQLite).
+
+    Per ogni query canonica conserva la data dell'ultima esecuzione, l'insieme dei PMID
+    già visti e, per quelli rilevanti, l'articolo filtrato e i dati estratti dal miner.
+    Alla riesecuzione basta cercare i record inseriti in PubMed dopo l'ultima data,
+    togliere i PMID già visti e processare solo il delta.
+
+    "Visti" sono solo gli articoli passati dal filtro AI: quelli recuperati ma esclusi dal
+    pre-ranking restano in sospeso (pending) e vengono riproposti all'esecuzione successiva,
+    perché la ricerca per data di inserimento non li restituirebbe più.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS queries (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                last_run TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                last_run_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS query_articles (
+                key TEXT NOT NULL,
+                pmid TEXT NOT NULL,
+                relevant INTEGER NOT NULL DEFAULT 0,
+                article TEXT,
+                extracted TEXT,
+                PRIMARY KEY (key, pmid)
+            );
+            CREATE TABLE IF NOT EXISTS query_pending (
+                key TEXT NOT NULL,
+                pmid TEXT NOT NULL,
+                article TEXT NOT NULL,
+                PRIMARY KEY (key, pmid)
+            );
+            """
+        )
+        # registri creati prima di last_run_id
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(queries)")}
+        if "last_run_id" not in columns:
+            self._conn.execute("ALTER TABLE queries ADD COLUMN last_run_id TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def key(query):
+        return hashlib.sha1(canonical_query(query).encode("utf-8")).hexdigest()
+
+    def get(self, query):
+        """Metadati della query salvata (query, last_run, runs, n_seen, n_relevant, n_pending) o None."""
+        key = self.key(query)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT query, last_run, runs FROM queries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            n_seen, n_relevant = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(relevant), 0) FROM query_articles WHERE key = ?", (key,)
+            ).fetchone()
+            n_pending = self._conn.execute("SELECT COUNT(*) FROM query_pending WHERE key = ?", (key,)).fetchone()[0]
+        return {"query": row[0], "last_run": row[1], "runs": row[2],
+                "n_seen": n_seen, "n_relevant": n_relevant, "n_pending": n_pending}
+
+    def known_pmids(self, query):
+        """Insieme dei PMID già visti per la query."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pmid FROM query_articles WHERE key = ?", (self.key(query),)
+            ).fetchall()
+        return {pmid for (pmid,) in rows}
+
+    def pending(self, query):
+        """Articoli recuperati nelle esecuzioni precedenti ma non ancora passati dal filtro AI."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT article FROM query_pending WHERE key = ? ORDER BY rowid", (self.key(query),)
+            ).fetchall()
+        return [Article.from_row(json.loads(article)) for (article,) in rows]
+
+    def results(self, query):
+        """Risultati salvati: (articoli filtrati, dati estratti) nel formato usato da app.py."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pmid, article, extracted FROM query_articles "
+                "WHERE key = ? AND relevant = 1 ORDER BY rowid",
+                (self.key(query),),
+            ).fetchall()
+        filtered, mined = [], []
+        for pmid, article, extracted in rows:
+            art = json.loads(article) if article else {"pmid": pmid}
+            filtered.append(art)
+            if extracted is not None:
+                mined.append({"pmid": pmid, "year": art.get("year"), "extracted": json.loads(extracted)})
+        return filtered, mined
+
+    def record_run(self, query, seen_pmids, filtered, mined_data, pending=(), run_date=None, run_id=None):
+        """
+        Registra un'esecuzione: i PMID passati dal filtro AI (anche i non rilevanti, per non
+        riprocessarli), gli articoli rilevanti e i relativi dati estratti. pending sono gli
+        Article recuperati ma non filtrati, da riproporre alla prossima esecuzione.
+        Con run_id la registrazione è idempotente: rieseguire la stessa esecuzione (es. una
+        fase ripetuta dall'app) aggiorna gli articoli ma non conta una nuova esecuzione.
+        """
+        seen = {str(pmid) for pmid in seen_pmids}
+        pending = [art for art in pending if art.pmid and art.pmid not in seen]
+        key = self.key(query)
+        run_date = run_date or date.today().strftime("%Y/%m/%d")
+        extracted_by_pmid = {item["pmid"]: item.get("extracted") for item in mined_data}
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO queries (key, query, created_at, last_run, runs, last_run_id) VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET last_run = excluded.last_run, "
+                "runs = runs + (excluded.last_run_id IS NULL OR last_run_id IS NOT excluded.last_run_id), "
+                "last_run_id = excluded.last_run_id",
+                (key, query, run_date, run_date, run_id),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO query_articles (key, pmid) VALUES (?, ?)",
+                [(key, pmid) for pmid in seen],
+            )
+            self._conn.executemany("DELETE FROM query_pending WHERE key = ? AND pmid = ?",
+                                   [(key, pmid) for pmid in seen])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO query_pending (key, pmid, article) VALUES (?, ?, ?)",
+                [(key, art.pmid, json.dumps(art.to_row(), ensure_ascii=False)) for art in pending],
+            )
+            self._conn.executemany(
+                "INSERT INTO query_articles (key, pmid, relevant, article, extracted) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(key, pmid) DO UPDATE SET relevant = 1, "
+                "article = excluded.article, extracted = excluded.extracted",
+                [
+                    (key, str(art["pmid"]), json.dumps(art, ensure_ascii=False),
+                     json.dumps(extracted_by_pmid.get(art["pmid"]), ensure_ascii=False)
+                     if art["pmid"] in extracted_by_pmid else None)
+                    for art in filtered
+                ],
+            )
+            self._conn.commit()
+
+        logger.info(f"🗂️ [QueryRegistry] Esecuzione registrata ({run_date}): "
+                    f"{len(seen)} PMID visti, {len(filtered)} nuovi rilevanti, {len(pending)} in sospeso")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,72 @@
+# src/tools/rate_limiter.py
+
+import asyncio
+import threading
+import time
+import multiprocessing
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe, utilizzabile sia in codice sincrono che asyncio.
+
+    - rate: token rigenerati al secondo (es. 3 req/s senza chiave NCBI, 10 con api_key)
+    - capacity: burst massimo; con capacity=1 le richieste sono equidistanziate
+
+    Il tempo speso nella richiesta non consuma budget: si attende solo il necessario
+    per restare al rate configurato. Le attese vengono "prenotate" (saldo negativo),
+    così le richieste concorrenti vengono servite in ordine di arrivo.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens=1):
+        """Preleva i token e restituisce quanti secondi attendere prima di usarli."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket condiviso tra processi: saldo e ultimo aggiornamento stanno in memoria
+    condivisa (multiprocessing.Array con lock), così più worker di un ProcessPoolExecutor
+    rispettano insieme un unico limite (es. i 10 req/s di NCBI).
+
+    Va creato nel processo principale e passato ai worker all'avvio (initializer).
+    """
+
+    def __init__(self, rate, capacity=1, context=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._state = (context or multiprocessing).Array("d", [float(capacity), time.monotonic()])
+
+    def _reserve(self, tokens=1):
+        with self._state.get_lock():
+            now = time.monotonic()
+            available = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+            self._state[0] = available - tokens
+            self._state[1] = now
+            if self._state[0] >= 0:
+                return 0.0
+            return -self._state[0] / self.rate
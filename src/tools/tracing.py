@@ -0,0 +1,155 @@
+# src/tools/tracing.py
+
+import os
+import json
+import time
+import random
+import threading
+import functools
+import itertools
+import contextvars
+import logging
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    Tracing a span dell'intera pipeline, esportato nel formato Chrome Trace Event
+    (caricabile in chrome://tracing o in Perfetto).
+
+    Disattivato di default: span() restituisce un context manager vuoto condiviso,
+    quindi il costo è un solo controllo di attributo. Gli span per singolo articolo
+    (sampled=True) vengono registrati solo per una frazione sample_rate delle chiamate.
+
+    - span(): evento "X" sul thread corrente (gli span dello stesso thread si annidano)
+    - async_span(): coppia di eventi "b"/"e" per operazioni che si sovrappongono sullo
+      stesso thread (batch EFetch asyncio), ognuna sulla propria traccia
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self._lock = threading.Lock()
+        self._events = []
+        self._thread_names = {}
+        self._ids = itertools.count(1)
+        self._t0 = time.perf_counter()
+
+    def start(self, sample_rate=1.0):
+        with self._lock:
+            self._events = []
+            self._thread_names = {}
+            self._t0 = time.perf_counter()
+        self.sample_rate = sample_rate
+        self.enabled = True
+
+    def stop(self, path=None):
+        """Disattiva il tracing e, se indicato, scrive il file di trace. Restituisce gli eventi."""
+        self.enabled = False
+        with self._lock:
+            events = self._events + [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self._thread_names.items()
+            ]
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+            logger.info(f"🧵 [Tracer] {len(events)} eventi scritti in {path}")
+        return events
+
+    def _now_us(self):
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def _emit(self, event):
+        thread = threading.current_thread()
+        event["pid"] = os.getpid()
+        event["tid"] = thread.ident
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+    def _skip(self, sampled):
+        return not self.enabled or (sampled and random.random() >= self.sample_rate)
+
+    @contextmanager
+    def _span(self, name, cat, args):
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            self._emit({"name": name, "cat": cat, "ph": "X", "ts": start,
+                        "dur": self._now_us() - start, "args": args})
+
+    def span(self, name, cat="pipeline", sampled=False, **args):
+        if self._skip(sampled):
+            return _NULL_SPAN
+        return self._span(name, cat, args)
+
+    @contextmanager
+    def _async_span(self, name, cat, args):
+        span_id = next(self._ids)
+        self._emit({"name": name, "cat": cat, "ph": "b", "id": span_id, "ts": self._now_us(), "args": args})
+        try:
+            yield
+        finally:
+            self._emit({"name": name, "cat": cat, "ph": "e", "id": span_id, "ts": self._now_us()})
+
+    def async_span(self, name, cat="pipeline", sampled=False, **args):
+        if self._skip(sampled):
+            return _NULL_SPAN
+        return self._async_span(name, cat, args)
+
+    def instant(self, name, cat="pipeline", **args):
+        if self.enabled:
+            self._emit({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self._now_us(), "args": args})
+
+
+# Tracer dell'esecuzione corrente (use_tracer); fuori da un'esecuzione quello di processo
+_PROCESS_TRACER = Tracer()
+_CURRENT_TRACER = contextvars.ContextVar("tracer")
+
+
+def current_tracer():
+    return _CURRENT_TRACER.get(_PROCESS_TRACER)
+
+
+@contextmanager
+def use_tracer(tracer):
+    """Registra gli span del blocco (e dei thread del pool dell'esecuzione) in tracer."""
+    token = _CURRENT_TRACER.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _CURRENT_TRACER.reset(token)
+
+
+class _CurrentTracer:
+    """Rinvia ogni chiamata al tracer dell'esecuzione corrente."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(current_tracer(), name)
+
+
+# Punto di accesso usato da tutti i moduli: TRACER.span(...), TRACER.start()/stop()
+TRACER = _CurrentTracer()
+
+
+def traced(name, cat="pipeline", sampled=False):
+    """Decoratore: span attorno alla funzione (nessun costo aggiuntivo se il tracing è spento)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name, cat, sampled):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -18,7 +18,7 @@ output_dir.mkdir(parents=True, exist_ok=True)
 
 # --- Inizializza retriever ---
 retriever = Retriever()
-europepmc = EuropePMCWrapper(page_size=20)
+europepmc = EuropePMCWrapper(max_results=20)
 
 # --- Ricerca ---
 print("[test_inspect_articles] Cerco articoli su PubMed...")
@@ -31,7 +31,7 @@ if not raw_results:
 # --- Salva i risultati raw per ispezione manuale ---
 debug_path = output_dir / "raw_results_debug.json"
 with open(debug_path, "w", encoding="utf-8") as f:
-    json.dump(raw_results, f, indent=2)
+    json.dump(raw_results, f, indent=2, default=lambda art: art.to_dict())
 
 print(f"[test_inspect_articles] Salvato JSON di debug in: {debug_path}")
 print(f"[test_inspect_articles] Numero articoli: {len(raw_results)}")
\ No newline at end of file
@@ -0,0 +1,9 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+# doppi di test condivisi con i benchmark (EUtilsStub)
+sys.path.append(str(project_root / "benchmarks"))
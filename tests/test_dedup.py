@@ -0,0 +1,35 @@
+# tests/test_dedup.py
+
+from agents.dedup import merge_results
+from tools.article import Article
+
+
+def sources():
+    pubmed = [Article(pmid="1", title="Vitamin D supplementation in type 2 diabetes", year=2020,
+                      doi="https://doi.org/10.1000/ABC", source="pubmed"),
+              Article(pmid="2", title="Another trial on insulin resistance markers", year=2021)]
+    europepmc = [Article(pmid="1", title="Vitamin D supplementation in type 2 diabetes", year=2020,
+                         abstract="Longer abstract from Europe PMC.", pmcid="PMC1", source="europepmc")]
+    return pubmed, europepmc
+
+
+def test_merge_does_not_modify_the_input_records():
+    pubmed, europepmc = sources()
+    before = [art.to_row() for art in pubmed + europepmc]
+
+    merged, index = merge_results(pubmed, europepmc)
+
+    assert [art.to_row() for art in pubmed + europepmc] == before
+    assert all(art is not original for art in merged for original in pubmed + europepmc)
+    assert index.duplicates == 1
+    assert merged[0].doi == "10.1000/abc"
+    assert merged[0].sources == ("pubmed", "europepmc")
+    assert merged[1].sources == ("?",)
+
+
+def test_merge_twice_gives_the_same_provenance():
+    pubmed, europepmc = sources()
+    first, _ = merge_results(pubmed, europepmc)
+    second, _ = merge_results(pubmed, europepmc)
+
+    assert [art.to_row() for art in first] == [art.to_row() for art in second]
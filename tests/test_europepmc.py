@@ -0,0 +1,52 @@
+# tests/test_europepmc.py
+
+import pytest
+import requests
+
+from tools.article import Article
+from tools.europepmc_wrapper import EuropePMCWrapper
+from eutils_stub import EUtilsStub
+
+
+@pytest.fixture
+def stub():
+    with EUtilsStub(n_results=30) as server:
+        yield server
+
+
+def test_search_returns_articles(stub):
+    articles = EuropePMCWrapper(page_size=10, base_url=stub.europepmc_url).search("vitamin d")
+
+    assert len(articles) == 30
+    assert all(isinstance(art, Article) and art.source == "europepmc" for art in articles)
+    assert [art.pmid for art in articles] == stub.pmids
+
+
+def test_search_raw_keeps_the_json_records(stub):
+    records = EuropePMCWrapper(base_url=stub.europepmc_url).search("vitamin d", max_results=5, raw=True)
+
+    assert [record["pmid"] for record in records] == stub.pmids[:5]
+    assert EuropePMCWrapper.to_article(records[0]).pmid == stub.pmids[0]
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError,
+                                   requests.exceptions.TooManyRedirects])
+def test_transfer_errors_are_retried(stub, error):
+    wrapper = EuropePMCWrapper(page_size=10, base_url=stub.europepmc_url, backoff=0)
+    get, calls = wrapper.session.get, []
+
+    def flaky_get(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:  # la seconda pagina fallisce una volta
+            raise error("connessione interrotta")
+        return get(*args, **kwargs)
+
+    wrapper.session.get = flaky_get
+    assert len(wrapper.search("vitamin d")) == 30
+    assert len(calls) == 4  # 3 pagine + un nuovo tentativo
+
+
+def test_client_errors_are_not_retried(stub):
+    wrapper = EuropePMCWrapper(base_url=f"{stub.base_url}missing", backoff=0)
+    assert wrapper.search("vitamin d") == []
+    assert len(stub.requests_log) == 1
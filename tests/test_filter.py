@@ -0,0 +1,53 @@
+# tests/test_filter.py
+
+import json
+import re
+
+import pytest
+
+from agents.filter import RelevanceFilter
+from agents.llm_agent import ThreadLocalAgent
+from tools.article import Article
+
+GOAL = "vitamina D nel diabete di tipo 2"
+
+
+class ScriptedAgent:
+    """Il batch risponde solo al primo articolo; la valutazione singola fallisce per "Broken"."""
+
+    def __init__(self, name, prompts):
+        self.name = name
+        self.prompts = prompts
+
+    def generate_reply(self, messages):
+        content = messages[-1]["content"]
+        self.prompts.append((self.name, content))
+        if self.name == "FilterBatch":
+            first = re.search(r"PMID: (\S+)", content).group(1)
+            return json.dumps([{"pmid": first, "rilevante": True, "confidenza": 0.9}])
+        if "Broken" in content:
+            raise RuntimeError("risposta troncata")
+        return "sì" if "Vitamin" in content else "no"
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    sent = []
+    monkeypatch.setattr(ThreadLocalAgent, "agent_factory",
+                        staticmethod(lambda name, system_message, llm_config: ScriptedAgent(name, sent)))
+    return sent
+
+
+def test_unanswered_items_fall_back_to_goal_aware_single_prompts(prompts):
+    articles = [Article(pmid="1", title="Vitamin D trial"), Article(pmid="2", title="Vitamin D cohort"),
+                Article(pmid="3", title="Unrelated surgery"), Article(pmid="4", title="Broken record")]
+
+    results = RelevanceFilter().is_relevant_batch(articles, GOAL, max_retries=0)
+
+    assert results["1"] == {"relevant": True, "confidence": 0.9}
+    assert results["2"] == {"relevant": True, "confidence": None}
+    assert results["3"] == {"relevant": False, "confidence": None}
+    assert results["4"] == {"relevant": False, "confidence": None, "error": "risposta troncata"}
+    singles = [content for name, content in prompts if name == "Filter"]
+    assert len(singles) == 3
+    assert all(content.startswith(f"OBIETTIVO: {GOAL}") for content in singles)
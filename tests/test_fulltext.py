@@ -0,0 +1,81 @@
+# tests/test_fulltext.py
+
+import pytest
+
+from eutils_stub import EUtilsStub
+from tools.fulltext import FullTextFetcher, select_sections
+
+OA_PMID = "30000002"  # PMID pari: testo completo disponibile nello stub
+
+
+@pytest.fixture
+def stub():
+    with EUtilsStub() as server:
+        yield server
+
+
+@pytest.fixture
+def fetcher(stub, tmp_path):
+    return FullTextFetcher(tmp_path / "fulltext", max_processes=1, europepmc_rest=stub.europepmc_rest_url)
+
+
+def test_select_sections_keeps_results_and_methods_first():
+    sections = [["Introduction", "background " * 10], ["Methods", "we enrolled 120 adults"],
+                ["Results", "HbA1c decreased"], ["Discussion", "agree"], ["References", "1. Rossi M."]]
+
+    text = select_sections(sections)
+    assert text == "## Results\nHbA1c decreased\n\n## Methods\nwe enrolled 120 adults"
+    assert select_sections(sections, max_chars=20) == "## Results\nHbA1c dec"
+
+
+def test_select_sections_without_titles_uses_the_text():
+    assert select_sections([["", "plain text"], ["References", "1. Rossi M."]]) == "plain text"
+
+
+def test_fetch_jats_and_pdf(stub, fetcher):
+    articles = [
+        {"pmid": OA_PMID, "pmcid": f"PMC{OA_PMID}"},
+        {"pmid": "30000004", "fulltext_urls": [f"{stub.pdf_url}PMC30000004.pdf"]},
+        {"pmid": "30000005"},
+    ]
+
+    jats, pdf, missing = fetcher.fetch(articles)
+
+    assert jats.startswith("## Results\nHbA1c decreased")
+    assert "## Methods\nWe enrolled" in jats
+    assert "Introduction" not in jats and "Rossi" not in jats
+    assert "HbA1c decreased" in pdf and "We enrolled" in pdf
+    assert missing is None
+    assert stub.pdf_requests == 1
+    assert fetcher.stats == {"downloaded": 2, "cached": 0, "extracted": 2, "failed": 0}
+
+
+def test_second_fetch_is_served_from_the_store(stub, fetcher):
+    articles = [{"pmid": OA_PMID, "pmcid": f"PMC{OA_PMID}"},
+                {"pmid": "30000004", "fulltext_urls": [f"{stub.pdf_url}PMC30000004.pdf"]}]
+    first = fetcher.fetch(articles)
+    n_requests = len(stub.requests_log)
+
+    assert fetcher.fetch(articles) == first
+    assert len(stub.requests_log) == n_requests
+    assert fetcher.stats == {"downloaded": 0, "cached": 2, "extracted": 0, "failed": 0}
+
+
+def test_same_content_from_another_url_is_not_extracted_again(stub, fetcher):
+    fetcher.fetch([{"pmid": OA_PMID, "pmcid": f"PMC{OA_PMID}"}])
+    mirror = f"{stub.europepmc_rest_url}/PMC{OA_PMID}/fullTextXML?mirror=1"
+
+    texts = fetcher.fetch([{"pmid": OA_PMID, "fulltext_urls": [mirror]}])
+
+    assert texts[0].startswith("## Results")
+    assert fetcher.stats == {"downloaded": 1, "cached": 0, "extracted": 0, "failed": 0}
+
+
+def test_failed_download_is_remembered(stub, fetcher):
+    articles = [{"pmid": "x", "fulltext_urls": [f"{stub.base_url}missing.html"]}]
+
+    assert fetcher.fetch(articles) == [None]
+    assert fetcher.stats["failed"] == 1
+    n_requests = len(stub.requests_log)
+    assert fetcher.fetch(articles) == [None]
+    assert len(stub.requests_log) == n_requests
@@ -0,0 +1,48 @@
+# tests/test_living_review.py
+
+import pytest
+
+from agents.pipeline import ResearchEngine, normalize_spec
+from tools.article import Article
+
+QUERY = "vitamin d AND diabetes"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return ResearchEngine({}, tmp_path)
+
+
+def relevant(pmid):
+    return {"pmid": pmid, "title": f"Trial {pmid}", "year": 2020}
+
+
+def mined(pmid):
+    return {"pmid": pmid, "year": 2020, "extracted": {"n": int(pmid)}}
+
+
+def test_merge_saved_twice_on_the_same_run(engine):
+    registry = engine.query_registry
+    registry.record_run(QUERY, ["1", "2"], [relevant("1")], [mined("1")], run_id="previous")
+    spec = normalize_spec({"goal": "vitamin d", "living_review": True})
+    screened = [Article(pmid="3"), Article(pmid="4")]
+    retrieved = {"run_id": "current", "saved_run": registry.get(QUERY), "raw_results": screened + [Article(pmid="5")],
+                 "source": "pubmed"}
+
+    first = engine.merge_saved(spec, QUERY, retrieved, screened, [relevant("3")], [mined("3")])
+    second = engine.merge_saved(spec, QUERY, retrieved, screened, [relevant("3")], [mined("3")])
+
+    assert first == second
+    filtered, mined_data = second
+    assert [art["pmid"] for art in filtered] == ["1", "3"]
+    assert [item["pmid"] for item in mined_data] == ["1", "3"]
+    saved = registry.get(QUERY)
+    assert saved["runs"] == 2
+    assert (saved["n_seen"], saved["n_relevant"], saved["n_pending"]) == (4, 2, 1)
+
+
+def test_record_run_without_run_id_counts_every_call(engine):
+    registry = engine.query_registry
+    registry.record_run(QUERY, ["1"], [], [])
+    registry.record_run(QUERY, ["2"], [], [])
+    assert registry.get(QUERY)["runs"] == 2
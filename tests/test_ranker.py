@@ -0,0 +1,50 @@
+# tests/test_ranker.py
+
+import random
+import re
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from agents.ranker import LexicalRanker
+from tools.article import Article
+
+WORDS = ["Vitamin", "vitamin-D", "D3", "diabetes,", "(insulin)", "insulin_x", "Glucose.", "glücose", "Über", "über",
+         "naïve", "—insulin—", "“vitamin”", "a", "x", "metabolism;", "insulininsulin", "in", "sulin", "HUMANS",
+         "humans's", "vitamin\nd", "İnsulin", "µg", "1,25-dihydroxyvitamin", "ἀρχή", "血糖", "vitamin insulin"]
+QUERY = "vitamin D diabetes glucose glücose über insulin naïve humans metabolism"
+
+
+def reference_scores(ranker, articles, query_text):
+    """BM25 diretto: CountVectorizer sul vocabolario della query, lunghezza in parole \\w+."""
+    terms = sorted(set(CountVectorizer(stop_words="english").build_analyzer()(query_text)))
+    docs = [ranker._document(art) for art in articles]
+    tf = CountVectorizer(vocabulary=terms, dtype=np.float64).transform(docs)
+    doc_len = np.array([len(re.findall(r"\w+", doc.lower())) for doc in docs], dtype=float)
+    df = np.bincount(tf.indices, minlength=len(terms))
+    idf = np.log((len(docs) - df + 0.5) / (df + 0.5) + 1.0)
+    norm = ranker.k1 * (1 - ranker.b + ranker.b * doc_len / (doc_len.mean() or 1.0))
+    rows = np.repeat(np.arange(len(docs)), np.diff(tf.indptr))
+    tf.data = tf.data * (ranker.k1 + 1) / (tf.data + norm[rows])
+    return tf @ idf
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_scores_match_count_vectorizer_on_non_ascii_text(seed):
+    rng = random.Random(seed)
+    articles = [Article(pmid=str(i), title=" ".join(rng.choices(WORDS, k=5)),
+                        abstract=" ".join(rng.choices(WORDS, k=30))) for i in range(500)]
+    articles.append(Article(pmid="empty"))
+    ranker = LexicalRanker()
+
+    np.testing.assert_allclose(ranker.score(articles, QUERY), reference_scores(ranker, articles, QUERY), rtol=1e-12)
+
+
+def test_rank_orders_by_score():
+    articles = [Article(pmid="1", title="Surgery outcomes"),
+                Article(pmid="2", title="Vitamin D and glücose in diabetes"),
+                Article(pmid="3", title="Vitamin D status")]
+
+    ranked = LexicalRanker().rank(articles, QUERY, top_k=2)
+    assert [art.pmid for art, _ in ranked] == ["2", "3"]
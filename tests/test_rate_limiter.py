@@ -0,0 +1,64 @@
+# tests/test_rate_limiter.py
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+import requests
+
+from agents.retriever_custom import Retriever
+from eutils_stub import EUtilsStub, RATE_WINDOW
+from tools.rate_limiter import SharedTokenBucket
+
+RATE = 3
+
+
+def eutils_peak(stub):
+    """Massimo numero di richieste E-utilities arrivate allo stub in una finestra di RATE_WINDOW secondi."""
+    times = sorted(t for t, endpoint in stub.requests_log if endpoint in ("esearch.fcgi", "efetch.fcgi"))
+    return max((sum(1 for other in times[i:] if other - t < RATE_WINDOW) for i, t in enumerate(times)), default=0)
+
+
+@pytest.fixture
+def stub():
+    with EUtilsStub(n_results=250, rate_limit=RATE) as server:
+        yield server
+
+
+def test_stub_rejects_requests_over_the_limit(stub):
+    statuses = [requests.get(f"{stub.base_url}esearch.fcgi", params={"term": "vitamin d"}).status_code
+                for _ in range(RATE + 2)]
+
+    assert statuses == [200] * RATE + [429] * 2
+    assert stub.rejected == 2
+
+
+@pytest.mark.parametrize("async_mode", [False, True])
+def test_token_bucket_keeps_retriever_under_ncbi_limit(stub, async_mode):
+    retriever = Retriever(rate_limit=RATE, base_url=stub.base_url, async_mode=async_mode, concurrency=4)
+    articles = retriever.search("vitamin d")
+
+    assert len(articles) == 250
+    assert stub.rejected == 0
+    assert eutils_peak(stub) <= RATE
+
+
+_bucket = None
+
+
+def _init_worker(bucket):
+    global _bucket
+    _bucket = bucket
+
+
+def _search(base_url):
+    return len(Retriever(base_url=base_url, limiter=_bucket).search("vitamin d"))
+
+
+def test_shared_token_bucket_limits_all_processes(stub):
+    bucket = SharedTokenBucket(RATE)
+    with ProcessPoolExecutor(max_workers=3, initializer=_init_worker, initargs=(bucket,)) as executor:
+        counts = list(executor.map(_search, [stub.base_url] * 3))
+
+    assert counts == [250] * 3
+    assert stub.rejected == 0
+    assert eutils_peak(stub) <= RATE
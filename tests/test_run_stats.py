@@ -0,0 +1,31 @@
+# tests/test_run_stats.py
+
+from agents.llm_cache import LLMCache
+from tools.article import Article
+from tools.article_store import ArticleStore
+from tools.metrics import MetricsRegistry, use_metrics
+
+
+def test_store_and_cache_stats_are_scoped_per_run(tmp_path):
+    store = ArticleStore(tmp_path / "articles.db")
+    cache = LLMCache(tmp_path / "llm")
+    store.put_many([Article(pmid="1", title="Vitamin D")])
+    cache.set("key", "sì")
+    first, second = MetricsRegistry(), MetricsRegistry()
+
+    with use_metrics(first):
+        store.get_many(["1", "2"])
+        cache.get("Filter", "key")
+        cache.get("Filter", "other")
+    with use_metrics(second):
+        # un'altra sessione inizia la propria esecuzione sullo stesso motore
+        assert store.stats() == {"hits": 0, "misses": 0, "stale": 0, "hit_rate": 0.0}
+        assert cache.stats() == {}
+        store.get_many(["1"])
+
+    with use_metrics(first):
+        assert store.stats() == {"hits": 1, "misses": 1, "stale": 0, "hit_rate": 0.5}
+        assert cache.stats() == {"Filter": {"hits": 1, "misses": 1, "hit_rate": 0.5}}
+    with use_metrics(second):
+        assert store.stats()["hits"] == 1
+    assert first.table() == []  # i soli contatori delle cache non aggiungono righe alle fasi
@@ -0,0 +1,139 @@
+# worker.py
+"""
+Worker della coda di ricerche: N processi che prendono i job da data/jobs.db
+(accodati dall'app o da altri script) ed eseguono la pipeline completa.
+
+Ogni fase completata viene salvata come checkpoint: se un worker si ferma, il job
+torna in coda dopo --stale-after secondi senza heartbeat e riprende dall'ultima fase.
+I limiti di NCBI e del provider LLM sono condivisi da tutti i processi.
+
+Esempio:
+    python worker.py --processes 4
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import logging
+import threading
+import traceback
+import multiprocessing
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent
+sys.path.append(str(project_root / "src"))
+
+from agents.pipeline import ResearchEngine, slugify, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+from tools.job_queue import JobQueue
+from tools.rate_limiter import SharedTokenBucket
+
+JOBS_DB = project_root / "data" / "jobs.db"
+JOBS_DIR = project_root / "data" / "jobs"
+# Avanzamento complessivo del job all'inizio di ogni fase
+STAGE_PROGRESS = {"plan": 0.0, "retrieve": 0.05, "prerank": 0.2, "screen": 0.25,
+                  "fulltext": 0.5, "mine": 0.6, "synthesize": 0.9, "save": 0.97}
+
+logger = logging.getLogger("Worker")
+
+
+def _heartbeat(queue, job_id, stop, interval):
+    while not stop.wait(interval):
+        queue.heartbeat(job_id)
+
+
+def run_job(engine, queue, job, heartbeat_interval):
+    job_id = job["id"]
+    output_dir = JOBS_DIR / f"{job_id:05d}-{slugify(job['spec'].get('goal', ''))}"
+
+    def on_stage(stage, info=None):
+        queue.progress(job_id, stage=stage, progress=STAGE_PROGRESS.get(stage),
+                       message=json.dumps(info, ensure_ascii=False) if info else "")
+
+    def on_progress(stage, done, total):
+        low = STAGE_PROGRESS[stage]
+        high = STAGE_PROGRESS["fulltext" if stage == "screen" else "synthesize"]
+        queue.progress(job_id, progress=low + (high - low) * done / max(total, 1), message=f"{done}/{total}")
+
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, job_id, stop, heartbeat_interval), daemon=True)
+    beat.start()
+    try:
+        summary = engine.run(
+            job["spec"], output_dir,
+            on_stage=on_stage,
+            on_progress=on_progress,
+            checkpoints=queue.checkpoints(job_id),
+            on_checkpoint=lambda stage, result: queue.save_checkpoint(job_id, stage, result),
+        )
+        queue.complete(job_id, summary)
+        logger.info(f"✅ [Worker] Job {job_id} completato: {summary['n_relevant']} rilevanti")
+    except Exception as e:
+        logger.error(f"❌ [Worker] Job {job_id} fallito: {e}")
+        queue.fail(job_id, f"{e}\n{traceback.format_exc()}")
+    finally:
+        stop.set()
+
+
+def worker_loop(ncbi_bucket, llm_request_bucket, llm_token_bucket, args):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(message)s")
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(JOBS_DB, stale_after=args.stale_after)
+    engine = ResearchEngine.from_project(
+        project_root,
+        retriever_limiter=ncbi_bucket,
+        llm_request_bucket=llm_request_bucket,
+        llm_token_bucket=llm_token_bucket,
+        llm_max_workers=args.llm_workers,
+    )
+    logger.info(f"👷 [Worker] {worker_id} in attesa di job...")
+    while True:
+        queue.requeue_stale()
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(args.poll)
+            continue
+        logger.info(f"▶️ [Worker] Job {job['id']} (tentativo {job['attempts']}): {job['spec'].get('goal')}")
+        run_job(engine, queue, job, heartbeat_interval=max(args.stale_after / 5, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processi worker della coda di ricerche")
+    parser.add_argument("--processes", type=int, default=2, help="Processi worker")
+    parser.add_argument("--llm-workers", type=int, default=4, help="Chiamate LLM in volo per processo")
+    parser.add_argument("--ncbi-rate", type=float, default=None,
+                        help="Richieste NCBI al secondo per tutti i worker (default 10 con api_key, altrimenti 3)")
+    parser.add_argument("--poll", type=float, default=2.0, help="Intervallo di polling della coda (s)")
+    parser.add_argument("--stale-after", type=float, default=300,
+                        help="Secondi senza heartbeat dopo cui un job 'running' torna in coda")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with open(project_root / "config" / "api_keys.json") as f:
+        ncbi_key = json.load(f).get("ncbi_api_key")
+
+    ncbi_bucket = SharedTokenBucket(args.ncbi_rate or (10 if ncbi_key else 3))
+    llm_request_bucket = SharedTokenBucket(LLM_REQUESTS_PER_MINUTE / 60)
+    llm_token_bucket = SharedTokenBucket(LLM_TOKENS_PER_MINUTE / 60, capacity=LLM_TOKENS_PER_MINUTE / 60)
+
+    processes = [
+        multiprocessing.Process(target=worker_loop, name=f"worker-{i + 1}",
+                                args=(ncbi_bucket, llm_request_bucket, llm_token_bucket, args))
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"🚀 [Worker] {len(processes)} processi avviati (coda: {JOBS_DB})")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("🛑 [Worker] Arresto: i job in corso verranno ripresi dal prossimo avvio")
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()